@@ -0,0 +1,9 @@
+""" Names of `astropyaddons` used by `astrophys`. This is the only module of `astrophys` importing `astropyaddons`. """
+from astropyaddons.background import BackgroundMesh
+from astropyaddons.detection import detect_stars
+from astropyaddons.grid import Grid
+from astropyaddons.images.quickplot import MAX_SIZE, show
+from astropyaddons.images.wcs import LazyCoordinates
+from astropyaddons.instrumentation import instrument
+from astropyaddons.parallel import bounded_map
+from astropyaddons.statistics import image_statistics
@@ -0,0 +1,142 @@
+import glob
+import traceback
+
+import numpy as np
+
+from ._addons import bounded_map
+from .fitsimage import FITSImage
+from .photometry import PHOTOMETRY_DTYPE, photometry
+
+class FrameResult:
+    """
+    Result of the reduction of one frame by `reduce`.
+    """
+    def __init__(self, filepath: str, JD: float=None, filter: str=None, exptime: float=None, airmass: float=None,
+                 detections: np.ndarray=None, photometry: np.ndarray=None, error: str=None):
+        """
+        Parameters:
+          - `filepath`: filepath of the frame.
+          - `JD`, `filter`, `exptime`, `airmass`: values from the header of the frame.
+          - `detections`: detected stars (see `astropyaddons.detection.DETECTION_DTYPE`).
+          - `photometry`: photometry of the stars (see `astrophys.photometry.PHOTOMETRY_DTYPE`).
+          - `error`: traceback of the error, if the frame could not be reduced.
+        """
+        self.filepath = filepath
+        self.JD = JD
+        self.filter = filter
+        self.exptime = exptime
+        self.airmass = airmass
+        self.detections = detections
+        self.photometry = photometry
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        if not self.ok:
+            return f'FrameResult of {self.filepath} [failed: {self.error.strip().splitlines()[-1]}]'
+        return f'FrameResult of {self.filepath} [{self.filter}, JD {self.JD}, {len(self.photometry)} stars]'
+
+def reduce_frame(filepath: str, aperture: float, r1: float, r2: float, centers=None, threshold: float=2.5,
+                 background: bool=False, memmap: bool=False, targets=None) -> FrameResult:
+    """
+    Loads one frame, and measures it with `measure_frame`.
+    Errors are caught and returned in the result.
+
+    Parameters: see `reduce`.
+    """
+    try:
+        fits_image = FITSImage(filepath, memmap=memmap)
+        return measure_frame(fits_image, aperture, r1, r2, centers, threshold, background, targets)
+    except Exception:
+        return FrameResult(filepath, error=traceback.format_exc())
+
+def measure_frame(fits_image: FITSImage, aperture: float, r1: float, r2: float, centers=None, threshold: float=2.5,
+                  background: bool=False, targets=None) -> FrameResult:
+    """
+    Detects the stars of a frame (unless `centers` or `targets` are given) and
+    measures their photometry.
+
+    Parameters: see `reduce`.
+    """
+    detections = None
+    if targets is not None:
+        centers = sky_to_pixel(fits_image, targets)
+    elif centers is None:
+        detections = fits_image.detect_stars(threshold, background, workers=1)
+        centers = np.column_stack([detections['y_peak'], detections['x_peak']])
+
+    mesh = fits_image.background() if background else None
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+
+    # Stars outside of the frame are not measured, and their rows are left as NaN
+    inside = (centers[:, 0] >= 0) & (centers[:, 0] <= fits_image.y_max - 1) \
+        & (centers[:, 1] >= 0) & (centers[:, 1] <= fits_image.x_max - 1)
+    table = np.zeros(len(centers), dtype=PHOTOMETRY_DTYPE)
+    for name in PHOTOMETRY_DTYPE.names:
+        if PHOTOMETRY_DTYPE[name].kind == 'f':
+            table[name] = np.nan
+    table['y'], table['x'] = centers.T
+    table[inside] = photometry(fits_image, centers[inside], aperture, r1, r2, background=mesh)
+
+    return FrameResult(
+        fits_image.fp, fits_image.JD, fits_image.filter, fits_image.exptime,
+        fits_image.header.get('AIRMASS', None), detections, table,
+    )
+
+def sky_to_pixel(fits_image: FITSImage, targets) -> np.ndarray:
+    """
+    Pixel coordinates `(y, x)` of sky positions in a plate-solved frame.
+
+    Parameters:
+      - `fits_image`: `FITSImage` object with a WCS.
+      - `targets`: `(N, 2)` array of `(RA, DEC)` in degrees.
+
+    Returns: `(N, 2)` array of `(y, x)` coordinates.
+    """
+    assert fits_image.wcs is not None, f"FITS image {fits_image.fp} is not plate-solved"
+
+    targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+    x, y = fits_image.wcs.world_to_pixel_values(targets[:, 0], targets[:, 1])
+    return np.column_stack([y, x])
+
+def reduce(pattern, aperture: float, r1: float, r2: float, centers=None, threshold: float=2.5, background: bool=False,
+           memmap: bool=False, workers: int=None, max_in_flight: int=None, targets=None):
+    """
+    Reduces many frames over a pool of processes. Results are yielded as soon as each
+    frame is done, so they come in the order of completion (sort by `JD` if needed).
+    A frame which cannot be reduced (e.g. a corrupt file) gives a result with its `error`,
+    and the other frames are not affected. If a worker process dies, the frames in flight
+    give errors, and the remaining frames are reduced by a new pool of processes.
+
+    Parameters:
+      - `pattern`: glob pattern of the frames (e.g. `'night/*.fits'`), or list of filepaths.
+      - `aperture`: size of aperture for flux sampling.
+      - `r1`: inner radius of annulus for background sampling.
+      - `r2`: outer radius of annulus for background sampling.
+      - `centers`: (optional) `(N, 2)` array of `(y, x)` coordinates to measure in every frame.
+          If none specified, the stars are detected in each frame.
+      - `targets`: (optional) `(N, 2)` array of `(RA, DEC)` in degrees to measure in every
+          frame, converted to pixels with the WCS of each frame. Replaces `centers`.
+      - `threshold`: detection threshold (see `FITSImage.get_star_coords`).
+      - `background`: if `True`, uses the background map of each frame for detection and photometry.
+      - `memmap`: if `True`, frames are memory-mapped (see `FITSImage`).
+      - `workers`: number of processes. If none specified, uses
+          `os.cpu_count()`. If 1, the frames are reduced in this process.
+      - `max_in_flight`: maximum number of frames submitted at once, which bounds the
+          memory used by pending results. If none specified, twice the number of workers
+          (see `astropyaddons.parallel.bounded_map`).
+
+    Stars given by `centers` or `targets` which are outside of a frame have NaN photometry.
+
+    Yields: `FrameResult` of each frame.
+    """
+    filepaths = sorted(glob.glob(pattern)) if isinstance(pattern, str) else list(pattern)
+    arguments = (aperture, r1, r2, centers, threshold, background, memmap, targets)
+
+    jobs = ((filepath,) + arguments for filepath in filepaths)
+    for (filepath, *_), result, error in bounded_map(reduce_frame, jobs, workers, max_in_flight):
+        # An error here means that the worker itself failed (e.g. it crashed), not the reduction
+        yield result if error is None else FrameResult(filepath, error=error)
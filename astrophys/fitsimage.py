@@ -6,27 +6,44 @@ from astropy.time import Time
 from astropy.coordinates import Angle
 import astropy.units as u
 
-from scipy import ndimage
-from itertools import product
 import numpy as np
 import matplotlib.pyplot as plt
 
+from ._addons import BackgroundMesh, Grid, LazyCoordinates, detect_stars, instrument
+
 class FITSImage:
     """ Class to handle FITS images in general. """
 
-    def __init__(self, filepath):
+    @instrument()
+    def __init__(self, filepath, max_tiles: int=0, memmap: bool=False, statistics_mode: str='exact'):
         """
         `filepath`: filepath of FITS image to load.
+        `max_tiles`: number of evaluated coordinate tiles to keep cached.
+        `memmap`: if `True`, the pixel data is memory-mapped and only promoted
+            to floating point when it is needed. Use `self.cutout` to read
+            small sections of the image without loading the rest.
+        `statistics_mode`: how `median`, `std`, etc. are computed. `'exact'`,
+            `'approximate'` (subsampled) or `'clipped'` (subsampled and sigma-clipped)
+
+        The pixels are kept in `self.grid`, an `astropyaddons.grid.Grid`, which
+        handles the scaling, reading of sections and cached statistics.
         """
         self.fp = filepath
 
-        with fits.open(self.fp) as fits_image:
+        with fits.open(self.fp, memmap=memmap, do_not_scale_image_data=memmap) as fits_image:
             if len(fits_image) != 1:
                 print(f"Warning: FITS image with filepath {self.fp} has multiple images. Only the first one will be loaded.")
 
             self.header = fits_image[0].header
-            self.data: np.ndarray[np.ndarray] = fits_image[0].data * 1.0 #turn into floating point
-        
+            if memmap:
+                # Keep the raw (memory-mapped) values, scaling is applied by the grid on access
+                self.grid: Grid = Grid(fits_image[0].data, self.header.get('BSCALE', 1.0), self.header.get('BZERO', 0.0), statistics_mode)
+            else:
+                self.grid: Grid = Grid(fits_image[0].data * 1.0, statistics_mode=statistics_mode) #turn into floating point
+
+        self._background: BackgroundMesh = None
+        self._background_generation: int = None
+
         # Useful header values
         self.date, self.time = self.header['DATE-OBS'].split("T")
         self.exptime = self.header['EXPTIME']
@@ -40,27 +57,88 @@ class FITSImage:
         if all(wcs.pixel_to_world_values([0,1], [0,1])[0] != np.array([1,2])): # Detect if the image is plate-solved. Returns True if it is.
             self.wcs = wcs
 
-            # Create a "coordinate grid" that can be indexed via self.coords[y, x]
+            # Create a lazy "coordinate grid" that can be indexed via self.coords[y, x]
+            # Coordinates are only evaluated for the pixels requested.
             # For high level applications, access using self.coordinates(y, x)
-            x_pixel, y_pixel = np.array(list(product(np.arange(0, self.x_max), np.arange(0, self.y_max)))).T
-            self.coords: np.ndarray[np.ndarray[float, float]] = np.transpose(np.array(wcs.pixel_to_world_values(x_pixel, y_pixel)).T.reshape(self.x_max, self.y_max, 2),(1,0,2))
+            self.coords: LazyCoordinates = LazyCoordinates(wcs, self.y_max, self.x_max, max_tiles=max_tiles)
         else:
             self.wcs = None
             self.coords = None
 
+    @property
+    def data(self) -> np.ndarray:
+        """
+        Pixel values as floating point, read-only. A memory-mapped image is promoted on first access.
+        Write pixels with `self.grid[y, x] = value`, or assign a new array to `self.data`:
+        in-place writes such as `self.data -= bias` raise a `ValueError`, so that the cached
+        statistics and background stay valid (use `self.data = self.data - bias`).
+        """
+        return self.grid.grid
+
+    @data.setter
+    def data(self, data: np.ndarray):
+        self.grid.grid = data
+
+    @property
+    def statistics_mode(self) -> str:
+        return self.grid.statistics_mode
+
+    @statistics_mode.setter
+    def statistics_mode(self, mode: str):
+        self.grid.statistics_mode = mode
+
+    def invalidate_statistics(self) -> None:
+        """ Clears the cached statistics and background. Call after modifying the pixels outside of `self.grid`. """
+        self.grid.invalidate()
+
+    def background(self, tile_size: int=64) -> BackgroundMesh:
+        """
+        Smooth background map of the image, estimated on a mesh of tiles (see `BackgroundMesh`).
+        The mesh is computed once and cached, until the pixels change.
+
+        Parameters:
+          - `tile_size`: size of the square tiles, in pixels.
+        """
+        if self._background is None or self._background.tile_size != tile_size or self._background_generation != self.grid.generation:
+            self._background = BackgroundMesh(self.grid, tile_size)
+            self._background_generation = self.grid.generation
+        return self._background
+
+    def cutout(self, y_min: int, y_max: int, x_min: int, x_max: int) -> np.ndarray:
+        """
+        Reads the section `[y_min:y_max, x_min:x_max]` of the image as floating point.
+        For memory-mapped images, only the section is read from the file.
+        The section is clipped to the bounds of the image.
+        """
+        return self.grid.cutout(y_min, y_max, x_min, x_max)
+
+    def take(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """
+        Reads the pixels at the index arrays `y`, `x` as floating point.
+        For memory-mapped images, only those pixels are read from the file.
+        """
+        return self.grid.take(y, x)
+
     # Useful statistical quantities
 
     @property
     def median(self):
-        return np.median(self.data)
+        return self.grid.median
 
     @property
     def mean(self):
-        return np.mean(self.data)
+        return self.grid.mean
     
     @property
     def std(self):
-        return np.std(self.data)
+        return self.grid.std
+
+    @property
+    def mad(self):
+        return self.grid.mad
+
+    def percentile(self, q: float) -> float:
+        return self.grid.percentile(q)
 
     def coordinates(self, y: int, x: int, format: str='hms') -> dict:
         """
@@ -96,46 +174,45 @@ class FITSImage:
 
     def quickplot(self, lo_phi: float=-1, hi_phi: float=3) -> None:
         """
-        Displays a simple grayscale plot of the data, returning `None` 
-        
+        Displays a simple grayscale plot of the data, returning `None`.
+        Large images are downsampled to about screen resolution (see `astrophys.quickplot.quickplot`).
+
         Parameters:
           - `lo_phi`: standard deviations from median to assign to black
           - `hi_phi`: standard deviations from median to assign to white
         """
-        assert lo_phi < hi_phi, "lo_phi must be lower than hi_phi"
-
-        lo = self.median + lo_phi*self.std
-        hi = self.median + hi_phi*self.std
-
-        plt.figure(figsize=(10,10))
+        from .quickplot import quickplot
+        quickplot(self, lo_phi, hi_phi)
         plt.title(self.__repr__())
-        plt.imshow(self.data, cmap='gray', origin='lower', vmin=lo, vmax=hi)
 
-    def get_star_coords(self, threshold: float=2.5) -> list[tuple[float, float]]:
+    @instrument()
+    def get_star_coords(self, threshold: float=2.5, background: bool=False, workers: int=None) -> list[tuple[float, float]]:
         """
         Gets the coordinates of stars in the image, given a threshold.
 
         Parameters:
           - `threshold`: multiple of median for the minimum value for
               a star.
+          - `background`: if `True`, the threshold is a multiple of the local
+              background (see `self.background`) instead of the global median.
+              Better for images with gradients.
+          - `workers`: number of threads used for the detection.
 
         Returns: 2D numpy array: `[[y_1, x_1], [y_2, x_2], ...]` 
         """
-        threshold_data = (self.data > threshold*self.median) * self.data #Sets everything under the threshold to 0
-        data_max = ndimage.maximum_filter(self.data, 5) #Sets each pixel value to the brightest pixel value nearby
-
-        maxima = (threshold_data==data_max) #`True` for the local maxima
+        stars = self.detect_stars(threshold, background, workers)
+        return np.column_stack([stars['y_peak'], stars['x_peak']])
 
-        labeled, _ = ndimage.label(maxima) #Assigns different values for each local maxima
-        slices = ndimage.find_objects(labeled) #Gets positions of labels
+    @instrument()
+    def detect_stars(self, threshold: float=2.5, background: bool=False, workers: int=None) -> np.ndarray:
+        """
+        Detects the stars in the image, given a threshold. The image is processed
+        in tiles, in parallel (see `astropyaddons.detection.detect_stars`).
 
-        coords = []
-        for dy, dx in slices:
-            if dy.stop-dy.start != 1 or dx.stop-dx.start != 1:
-                print(f"Warning: Star with position y={dy}, x={dx} was not identified as a single point.")
+        Parameters: same as `get_star_coords`.
 
-            y_center = (dy.start + dy.stop - 1) // 2
-            x_center = (dx.start + dx.stop - 1) // 2
-            coords.append([y_center, x_center])
-            
-        return np.array(coords)
\ No newline at end of file
+        Returns: structured numpy array with the sub-pixel centroid (`y`, `x`),
+        peak pixel (`y_peak`, `x_peak`), `peak`, `flux` and shape of each star.
+        """
+        reference = self.background() if background else self.median
+        return detect_stars(self.grid, threshold, reference, workers=workers)
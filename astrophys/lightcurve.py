@@ -0,0 +1,194 @@
+import numpy as np
+
+from .batch import FrameResult, measure_frame, reduce
+from .fitsimage import FITSImage
+
+class LightCurves:
+    """
+    Light curves of many targets over many frames. Frames are measured one at a
+    time (or streamed from a pool of processes, see `add`) and only the photometry
+    is kept, in columnar arrays of shape `(targets, epochs)` sorted by JD:
+
+        curves = LightCurves(targets, 5, 8, 12)
+        curves.add('night/*.fits')
+        curves['flux'][0] # flux of the first target at each epoch of `curves.JD`
+    """
+    # Columns of the photometry kept for each target and epoch (see `PHOTOMETRY_DTYPE`)
+    COLUMNS = ('flux', 'flux_err', 'background', 'background_err', 'aperture_npix', 'y', 'x')
+
+    def __init__(self, targets, aperture: float, r1: float, r2: float, labels: list[str]=None, background: bool=False):
+        """
+        Parameters:
+          - `targets`: `(N, 2)` array of the `(RA, DEC)` of the targets, in degrees.
+          - `aperture`: size of aperture for flux sampling.
+          - `r1`: inner radius of annulus for background sampling.
+          - `r2`: outer radius of annulus for background sampling.
+          - `labels`: (optional) label for each target.
+          - `background`: if `True`, uses the background map of each frame instead
+              of the annulus (see `FITSImage.background`).
+        """
+        assert r1 < r2, "Inner radius must be smaller than outer radius"
+
+        self.targets = np.asarray(targets, dtype=float).reshape(-1, 2)
+        self.labels = list(labels) if labels is not None else [None] * len(self.targets)
+        assert len(self.labels) == len(self.targets), "There must be one label per target"
+
+        self.aperture, self.r1, self.r2 = aperture, r1, r2
+        self.background = background
+
+        # Arrays grow by doubling, only the first `n_epochs` columns are used
+        self.n_epochs = 0
+        self._JD = np.zeros(16)
+        self._exptime = np.zeros(16)
+        self._airmass = np.zeros(16)
+        self._columns = {name: np.zeros((len(self.targets), 16)) for name in self.COLUMNS}
+        self.filters: list[str] = []
+        self.filepaths: list[str] = []
+        self._sorted = True
+
+    def __len__(self) -> int:
+        return self.n_epochs
+
+    def __repr__(self) -> str:
+        return f'LightCurves of {len(self.targets)} targets over {self.n_epochs} epochs'
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self._JD)
+        self._JD, self._exptime, self._airmass = (np.resize(array, capacity) for array in (self._JD, self._exptime, self._airmass))
+
+        for name, column in self._columns.items():
+            grown = np.zeros((len(self.targets), capacity))
+            grown[:, :self.n_epochs] = column[:, :self.n_epochs]
+            self._columns[name] = grown
+
+    def append(self, result: FrameResult) -> None:
+        """ Adds the photometry of one frame, measured at the targets (see `astrophys.batch`). """
+        assert result.ok, f"Frame {result.filepath} could not be reduced"
+        assert len(result.photometry) == len(self.targets), "The frame was not measured at the targets"
+
+        if self.n_epochs == len(self._JD):
+            self._grow()
+
+        epoch = self.n_epochs
+        self._JD[epoch] = result.JD
+        self._exptime[epoch] = result.exptime if result.exptime is not None else np.nan
+        self._airmass[epoch] = result.airmass if result.airmass is not None else np.nan
+        for name, column in self._columns.items():
+            column[:, epoch] = result.photometry[name]
+        self.filters.append(result.filter)
+        self.filepaths.append(result.filepath)
+
+        self.n_epochs += 1
+        self._sorted = self._sorted and (epoch == 0 or self._JD[epoch-1] <= result.JD)
+
+    def add_frame(self, fits_image: FITSImage) -> None:
+        """ Measures the targets in a frame which is already loaded. """
+        self.append(measure_frame(fits_image, self.aperture, self.r1, self.r2, background=self.background, targets=self.targets))
+
+    def add(self, pattern, workers: int=None, memmap: bool=True, max_in_flight: int=None) -> int:
+        """
+        Measures the targets in many frames, streamed from a pool of processes
+        (see `astrophys.batch.reduce`). Only one result per worker is held at once.
+        Frames which cannot be reduced are skipped with a warning.
+
+        Parameters:
+          - `pattern`: glob pattern of the frames (e.g. `'night/*.fits'`), or list of filepaths.
+          - `workers`, `memmap`, `max_in_flight`: see `astrophys.batch.reduce`.
+
+        Returns: number of frames added.
+        """
+        added = 0
+        for result in reduce(pattern, self.aperture, self.r1, self.r2, background=self.background, memmap=memmap,
+                             workers=workers, max_in_flight=max_in_flight, targets=self.targets):
+            if not result.ok:
+                print(f"Warning: frame {result.filepath} was skipped. {result.error.strip().splitlines()[-1]}")
+                continue
+            self.append(result)
+            added += 1
+        return added
+
+    def _sort(self) -> None:
+        """ Sorts the epochs by JD, as frames from a pool come in the order of completion. """
+        if self._sorted:
+            return
+
+        order = np.argsort(self._JD[:self.n_epochs], kind='stable')
+        for array in (self._JD, self._exptime, self._airmass):
+            array[:self.n_epochs] = array[order]
+        for column in self._columns.values():
+            column[:, :self.n_epochs] = column[:, order]
+        self.filters = [self.filters[i] for i in order]
+        self.filepaths = [self.filepaths[i] for i in order]
+        self._sorted = True
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """ Column `name` (one of `COLUMNS`), of shape `(targets, epochs)`, sorted by JD. """
+        self._sort()
+        return self._columns[name][:, :self.n_epochs]
+
+    @property
+    def JD(self) -> np.ndarray:
+        self._sort()
+        return self._JD[:self.n_epochs]
+
+    @property
+    def exptime(self) -> np.ndarray:
+        self._sort()
+        return self._exptime[:self.n_epochs]
+
+    @property
+    def airmass(self) -> np.ndarray:
+        self._sort()
+        return self._airmass[:self.n_epochs]
+
+    @property
+    def filter(self) -> np.ndarray:
+        """ Filter of each epoch, `''` for the frames without a filter. """
+        self._sort()
+        return np.array([filter if filter is not None else '' for filter in self.filters], dtype=str)
+
+    def light_curve(self, target, filter: str=None) -> np.ndarray:
+        """
+        Light curve of one target, as a structured array with one row per epoch.
+
+        Parameters:
+          - `target`: index or label of the target.
+          - `filter`: (optional) only keep the epochs taken with this filter.
+        """
+        index = self.labels.index(target) if isinstance(target, str) else target
+        epochs = self.filter == filter if filter is not None else np.ones(self.n_epochs, dtype=bool)
+
+        curve = np.zeros(np.count_nonzero(epochs), dtype=[('JD', float)] + [(name, float) for name in self.COLUMNS])
+        curve['JD'] = self.JD[epochs]
+        for name in self.COLUMNS:
+            curve[name] = self[name][index, epochs]
+        return curve
+
+    def save(self, path: str) -> None:
+        """ Saves the light curves to a `.npz` file, which can be loaded with `LightCurves.load`. Missing labels are saved as `''`. """
+        self._sort()
+        np.savez(
+            path, targets=self.targets, labels=np.array([str(label) if label is not None else '' for label in self.labels], dtype=str),
+            aperture=self.aperture, r1=self.r1, r2=self.r2, background_map=self.background,
+            JD=self.JD, exptime=self.exptime, airmass=self.airmass, filter=self.filter,
+            filepaths=np.array(self.filepaths, dtype=str), **{name: self[name] for name in self.COLUMNS},
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'LightCurves':
+        """ Loads light curves saved with `save`, to which more frames can be added. """
+        with np.load(path) as file:
+            labels = [label if label else None for label in file['labels'].tolist()]
+            curves = cls(file['targets'], file['aperture'].item(), file['r1'].item(), file['r2'].item(), labels, bool(file['background_map']))
+
+            n_epochs = len(file['JD'])
+            while len(curves._JD) < n_epochs:
+                curves._grow()
+            curves._JD[:n_epochs], curves._exptime[:n_epochs], curves._airmass[:n_epochs] = file['JD'], file['exptime'], file['airmass']
+            for name in cls.COLUMNS:
+                curves._columns[name][:, :n_epochs] = file[name]
+            curves.filters = [filter if filter else None for filter in file['filter'].tolist()]
+            curves.filepaths = file['filepaths'].tolist()
+            curves.n_epochs = n_epochs
+
+        return curves
@@ -1,30 +1,31 @@
 import numpy as np
 from matplotlib import pyplot as plt
+from matplotlib.collections import EllipseCollection, PatchCollection
+from matplotlib.patches import Wedge
 
-from .region import Region
+from ._addons import MAX_SIZE, image_statistics, show
+from .fitsimage import FITSImage
+from .region import Region, CircleRegion, AnnulusRegion, SubAnnulusRegion
 from .star import Star
 
-def quickplot(data, lo_phi=-1, hi_phi=3, median=None, std=None, slice: list[tuple, tuple]=None) -> None:
-    """ 
-    Displays a quick plot of given data, returning `None`.
-    
-    Parameters:
-      - `data`: 2D numpy array containing data to be plotted (ideally from FITS image)
-      - `lo_phi`: standard deviations from median to assign to black
-      - `hi_phi`: standard deviations from median to assign to white
-      - `median`: median for lo_phi, hi_phi. If not provided, takes median of data.
-      - `std`: standard deviation for lo_phi, hi_phi. If not provided, takes standard deviation of data.
-      - `slice`: slice of data to plot. This is preferred compared to directly slicing the data.
-          `slice` should be expressed as [(ymin, ymax), (xmin, xmax)]
+# Outline colours of each kind of region
+REGION_COLORS = {CircleRegion: 'C1', AnnulusRegion: 'C2', SubAnnulusRegion: 'C3', Region: 'C4'}
 
-    Returns: `None`
-    """
+def _plot(data, lo_phi, hi_phi, median, std, slice, statistics_mode, max_size, method) -> plt.Axes:
+    """ Draws `data` (a 2D array or a `FITSImage`) downsampled, and returns the axes. Shared by the quickplots. """
     assert lo_phi < hi_phi, "lo_phi must be lower than hi_phi"
 
     # Defaults
-    slicey, slicex = slice if slice is not None else list(zip([0,0],np.shape(data)))
-    median = median if median is not None else np.median(data)
-    std = std if std is not None else np.std(data)
+    shape = (data.y_max, data.x_max) if isinstance(data, FITSImage) else np.shape(data)
+    slicey, slicex = slice if slice is not None else list(zip([0,0], shape))
+    if median is None or std is None:
+        if isinstance(data, FITSImage):
+            # Cached by the image, computed at most once
+            statistics = {'median': data.median, 'std': data.std}
+        else:
+            statistics = image_statistics(data, statistics_mode)
+        median = median if median is not None else statistics['median']
+        std = std if std is not None else statistics['std']
 
     assert (slicey[0] < slicey[1]) and (slicex[0] < slicex[1]), "Invalid slice"
 
@@ -32,87 +33,109 @@ def quickplot(data, lo_phi=-1, hi_phi=3, median=None, std=None, slice: list[tupl
     lo = median + lo_phi * std
     hi = median + hi_phi * std
 
-    # Plot data in grayscale
+    # Plot data in grayscale, in the pixel coordinates of the whole image.
+    # Only the slice is read, downsampled to at most `max_size` pixels per side.
     plt.figure(figsize=(10,10))
-    plt.imshow(data[slicey[0]:slicey[1], slicex[0]:slicex[1]], origin='lower', cmap='gray', vmin=lo, vmax=hi)
-
-    # Adjust axis for slice
-    if slice is not None:
-        # Get xticks and yticks from current graph
-        yticks, _ = plt.yticks()
-        xticks, _ = plt.xticks()
-
-        # Offset ticks by slice
-        plt.yticks(yticks[1:-1], yticks[1:-1] + slicey[0])   
-        plt.xticks(xticks[1:-1], xticks[1:-1] + slicex[0])
-
-        # Set limits
-        plt.xlim(0,slicex[1]-slicex[0])
-        plt.ylim(0,slicey[1]-slicey[0])
-    
-def quickplot_with_regions(data, lo_phi, hi_phi, regions: list[Region], median=None, std=None, slice: list[tuple, tuple]=None, regiondotsize=1) -> None:
-    """ 
+    ax = plt.gca()
+    show(ax, data, lo, hi, (slicey[0], slicey[1], slicex[0], slicex[1]), max_size, method)
+    return ax
+
+def region_outlines(ax: plt.Axes, regions: list[Region], linewidth: float=0.5) -> None:
+    """
+    Draws the outlines of regions on `ax`, as a few collections rather than one artist
+    (or one marker per pixel) per region. Circles and annuli are drawn as circles,
+    sub-annuli as wedges, and any other region as the contour of its pixels.
+
+    Parameters:
+      - `ax`: matplotlib `Axes` to draw on, in the pixel coordinates of the image.
+      - `regions`: list of `Region`s to draw.
+      - `linewidth`: width of the outlines.
+    """
+    circles, colors, wedges = [], [], []
+    for region in regions:
+        if isinstance(region, SubAnnulusRegion):
+            (y, x), outer = region.center, region.outer_radius
+            wedges.append(Wedge((x, y), outer, region.angle_min, region.angle_max, width=outer - region.inner_radius))
+        elif isinstance(region, AnnulusRegion):
+            circles += [(*region.center, region.inner_radius), (*region.center, region.outer_radius)]
+            colors += [REGION_COLORS[AnnulusRegion]] * 2
+        elif isinstance(region, CircleRegion):
+            circles.append((*region.center, region.radius))
+            colors.append(REGION_COLORS[CircleRegion])
+        elif region.n:
+            # Unknown shape: contour of the enclosed pixels, padded so that it is closed along the bounding box
+            y_min, y_max, x_min, x_max = region.bbox
+            ax.contour(np.arange(x_min-1, x_max+1), np.arange(y_min-1, y_max+1), np.pad(region.mask, 1).astype(float), levels=[0.5],
+                       colors=REGION_COLORS[Region], linewidths=linewidth)
+
+    if circles:
+        y, x, radius = np.array(circles, dtype=float).T
+        ax.add_collection(EllipseCollection(2 * radius, 2 * radius, np.zeros(len(radius)), units='xy',
+                                            offsets=np.column_stack([x, y]), offset_transform=ax.transData,
+                                            facecolors='none', edgecolors=colors, linewidths=linewidth))
+    if wedges:
+        ax.add_collection(PatchCollection(wedges, facecolors='none', edgecolors=REGION_COLORS[SubAnnulusRegion], linewidths=linewidth))
+
+def quickplot(data, lo_phi=-1, hi_phi=3, median=None, std=None, slice: list[tuple, tuple]=None, statistics_mode: str='exact',
+              max_size: int=MAX_SIZE, method: str='mean') -> None:
+    """
     Displays a quick plot of given data, returning `None`.
-    
+    Large images are downsampled to about screen resolution (block mean or max).
+
     Parameters:
-      - `data`: 2D numpy array containing data to be plotted (ideally from FITS image)
+      - `data`: 2D numpy array containing data to be plotted (ideally from FITS image), or a `FITSImage`.
+          For a `FITSImage`, only the slice is read (see `FITSImage.cutout`), and the median
+          and standard deviation cached by the image are reused.
       - `lo_phi`: standard deviations from median to assign to black
       - `hi_phi`: standard deviations from median to assign to white
-      - `region`: list of `Region`s to plot on data
       - `median`: median for lo_phi, hi_phi. If not provided, takes median of data.
       - `std`: standard deviation for lo_phi, hi_phi. If not provided, takes standard deviation of data.
       - `slice`: slice of data to plot. This is preferred compared to directly slicing the data.
           `slice` should be expressed as [(ymin, ymax), (xmin, xmax)]
+      - `statistics_mode`: how the median and standard deviation are computed when not provided.
+          `'exact'`, `'approximate'` (subsampled) or `'clipped'` (subsampled and sigma-clipped)
+      - `max_size`: longest side of the plotted image, in pixels.
+      - `method`: how blocks of pixels are combined when downsampling, `'mean'` or `'max'`.
 
     Returns: `None`
     """
-    assert lo_phi < hi_phi, "lo_phi must be lower than hi_phi"
+    _plot(data, lo_phi, hi_phi, median, std, slice, statistics_mode, max_size, method)
 
-    # Defaults
-    slicey, slicex = slice if slice is not None else list(zip([0,0],np.shape(data)))
-    median = median if median is not None else np.median(data)
-    std = std if std is not None else np.std(data)
-
-    assert (slicey[0] < slicey[1]) and (slicex[0] < slicex[1]), "Invalid slice"
+def quickplot_with_regions(data, lo_phi, hi_phi, regions: list[Region], median=None, std=None, slice: list[tuple, tuple]=None, regiondotsize=1, statistics_mode: str='exact',
+                           max_size: int=MAX_SIZE, method: str='mean') -> None:
+    """
+    Displays a quick plot of given data, returning `None`.
+    Large images are downsampled to about screen resolution (block mean or max).
 
-    # Get lower and upper bound for grayscale coloring
-    lo = median + lo_phi * std
-    hi = median + hi_phi * std
+    Parameters:
+      - `data`: 2D numpy array containing data to be plotted (ideally from FITS image), or a `FITSImage`.
+          For a `FITSImage`, only the slice is read (see `FITSImage.cutout`), and the median
+          and standard deviation cached by the image are reused.
+      - `lo_phi`: standard deviations from median to assign to black
+      - `hi_phi`: standard deviations from median to assign to white
+      - `region`: list of `Region`s to plot on data, drawn as outlines (see `region_outlines`)
+      - `median`: median for lo_phi, hi_phi. If not provided, takes median of data.
+      - `std`: standard deviation for lo_phi, hi_phi. If not provided, takes standard deviation of data.
+      - `slice`: slice of data to plot. This is preferred compared to directly slicing the data.
+          `slice` should be expressed as [(ymin, ymax), (xmin, xmax)]
+      - `regiondotsize`: line width of the outlines of the regions (times 0.5)
+      - `statistics_mode`: how the median and standard deviation are computed when not provided.
+          `'exact'`, `'approximate'` (subsampled) or `'clipped'` (subsampled and sigma-clipped)
+      - `max_size`: longest side of the plotted image, in pixels.
+      - `method`: how blocks of pixels are combined when downsampling, `'mean'` or `'max'`.
 
-    # Plot data in grayscale
-    plt.figure(figsize=(10,10))
-    plt.imshow(data[slicey[0]:slicey[1], slicex[0]:slicex[1]], origin='lower', cmap='gray', vmin=lo, vmax=hi)
+    Returns: `None`
+    """
+    ax = _plot(data, lo_phi, hi_phi, median, std, slice, statistics_mode, max_size, method)
+    region_outlines(ax, regions, 0.5*regiondotsize)
 
-    for region in regions:
-        # Get x and y coordinates of the edge of the region.
-        y, x = zip(*region.enclosed_pixels)
-        # Offset by slice
-        y = [i-slicey[0] for i in y]
-        x = [i-slicex[0] for i in x]
-
-        # Plot region.
-        plt.plot(x, y, ".", alpha=1, markersize=0.5*regiondotsize)
-
-    # Adjust axis for slice
-    if slice is not None:
-        # Get xticks and yticks from current graph
-        yticks, _ = plt.yticks()
-        xticks, _ = plt.xticks()
-
-        # Offset ticks by slice
-        plt.yticks(yticks[1:-1], yticks[1:-1] + slicey[0])   
-        plt.xticks(xticks[1:-1], xticks[1:-1] + slicex[0])
-        
-        # Set limits
-        plt.xlim(0,slicex[1]-slicex[0])
-        plt.ylim(0,slicey[1]-slicey[0])
-
-def quickplot_with_stars(data, lo_phi, hi_phi, stars: list[Star], median=None, std=None, slice: list[tuple, tuple]=None, regiondotsize=1) -> None:
+def quickplot_with_stars(data, lo_phi, hi_phi, stars: list[Star], median=None, std=None, slice: list[tuple, tuple]=None, regiondotsize=1, statistics_mode: str='exact',
+                         max_size: int=MAX_SIZE, method: str='mean') -> None:
     """
     Displays a quick plot of given data, returning `None`.
-    
+
     Parameters:
-      - `data`: 2D numpy array containing data to be plotted (ideally from FITS image)
+      - `data`: 2D numpy array containing data to be plotted (ideally from FITS image), or a `FITSImage`.
       - `lo_phi`: standard deviations from median to assign to black
       - `hi_phi`: standard deviations from median to assign to white
       - `stars`: list of `Star`s to plot on data
@@ -120,6 +143,11 @@ def quickplot_with_stars(data, lo_phi, hi_phi, stars: list[Star], median=None, s
       - `std`: standard deviation for lo_phi, hi_phi. If not provided, takes standard deviation of data.
       - `slice`: slice of data to plot. This is preferred compared to directly slicing the data.
           `slice` should be expressed as [(ymin, ymax), (xmin, xmax)]
+      - `regiondotsize`: line width of the outlines of the regions (times 0.5)
+      - `statistics_mode`: how the median and standard deviation are computed when not provided.
+          `'exact'`, `'approximate'` (subsampled) or `'clipped'` (subsampled and sigma-clipped)
+      - `max_size`: longest side of the plotted image, in pixels.
+      - `method`: how blocks of pixels are combined when downsampling, `'mean'` or `'max'`.
 
     Returns: `None`
     """
@@ -128,4 +156,4 @@ def quickplot_with_stars(data, lo_phi, hi_phi, stars: list[Star], median=None, s
         regions.append(star.aperture)
         regions.append(star.annulus)
 
-    quickplot_with_regions(data, lo_phi, hi_phi, regions, median, std, slice, regiondotsize)
\ No newline at end of file
+    quickplot_with_regions(data, lo_phi, hi_phi, regions, median, std, slice, regiondotsize, statistics_mode, max_size, method)
@@ -1,35 +1,74 @@
 import numpy as np
 
+from ._addons import instrument
+
 from .fitsimage import FITSImage
 
+def _distances_squared(fits_image: FITSImage, center: tuple, radius: float) -> tuple[tuple, np.ndarray]:
+    """
+    Squared distances to `center` of the pixels within `radius` of it, in one vectorised pass.
+
+    Returns: bounding box `(y_min, y_max, x_min, x_max)` clipped to the image, and
+    a 2D array of the squared distances for each pixel in the bounding box.
+    """
+    center_y, center_x = center
+
+    y_min = max(int(np.floor(center_y - radius)), 0)
+    y_max = max(min(int(np.ceil(center_y + radius)) + 1, fits_image.y_max), y_min)
+    x_min = max(int(np.floor(center_x - radius)), 0)
+    x_max = max(min(int(np.ceil(center_x + radius)) + 1, fits_image.x_max), x_min)
+
+    y = np.arange(y_min, y_max)[:, np.newaxis]
+    x = np.arange(x_min, x_max)[np.newaxis, :]
+
+    return (y_min, y_max, x_min, x_max), (y-center_y)**2 + (x-center_x)**2
+
 class Region:
     """ Overarching class to define a region. """
     def __init__(self, fits_image: FITSImage):
         self.fits_image = fits_image
-        self.enclosed_pixels: list[tuple] = [] #list of coordinates of pixels enclosed in fits_image. Form: (y, x)
+
+        # Pixels enclosed in fits_image, stored as a bounding box (y_min, y_max, x_min, x_max)
+        # and a boolean mask over that bounding box.
+        self.bbox: tuple = (0, 0, 0, 0)
+        self.mask: np.ndarray = np.zeros((0, 0), dtype=bool)
 
     @property
-    def pixel_values(self) -> list[float]:
-        return [self.fits_image.data[coords] for coords in self.enclosed_pixels]
+    def indices(self) -> tuple[np.ndarray, np.ndarray]:
+        """ Index arrays `(y, x)` of the enclosed pixels. """
+        y, x = np.nonzero(self.mask)
+        return y + self.bbox[0], x + self.bbox[2]
+    @property
+    def enclosed_pixels(self) -> list[tuple]:
+        """ List of coordinates of pixels enclosed in fits_image. Form: (y, x) """
+        y, x = self.indices
+        return list(zip(y.tolist(), x.tolist()))
+
+    @property
+    def pixel_values(self) -> np.ndarray:
+        # Only read the cutout of the image around the region
+        return self.fits_image.cutout(*self.bbox)[self.mask]
     @property
     def sum(self) -> float:
-        return sum(self.pixel_values)
+        return np.sum(self.pixel_values)
     @property
     def n(self) -> int:
-        return len(self.enclosed_pixels)
+        return np.count_nonzero(self.mask)
+    # Statistics of a region with no pixels (e.g. off the image) are `nan`
     @property
     def mean(self):
-        return np.mean(self.pixel_values)
+        return np.mean(self.pixel_values) if self.n else np.nan
     @property
     def median(self):
-        return np.median(self.pixel_values)
+        return np.median(self.pixel_values) if self.n else np.nan
     @property
     def std(self):
-        return np.std(self.pixel_values)
+        return np.std(self.pixel_values) if self.n else np.nan
     
 
 class CircleRegion(Region):
     """ Region defined as a circle """
+    @instrument()
     def __init__(self, fits_image: FITSImage, center: tuple, radius: float):
         """
         Parameters:
@@ -40,17 +79,11 @@ class CircleRegion(Region):
         super().__init__(fits_image)
 
         self.center = center
+        self.radius = radius
 
         # Defining included pixels
-        center_y, center_x = center
-        r = int(radius+1)
-
-        for y in range(int(center_y)-r, int(center_y)+r):
-            for x in range(int(center_x)-r, int(center_x)+r):
-
-                distance_squared = (y-center_y)**2 + (x-center_x)**2
-                if distance_squared <= radius**2:
-                    self.enclosed_pixels.append((y, x))
+        self.bbox, distance_squared = _distances_squared(fits_image, center, radius)
+        self.mask = distance_squared <= radius**2
 
         # Additional parameters of interest
         self.mean_err = None
@@ -58,6 +91,7 @@ class CircleRegion(Region):
 
 class AnnulusRegion(Region):
     """ Region defined as an annulus """
+    @instrument()
     def __init__(self, fits_image: FITSImage, center: tuple, inner_radius: float, outer_radius: float):
         """
         Parameters:
@@ -72,24 +106,20 @@ class AnnulusRegion(Region):
         super().__init__(fits_image)
 
         self.center = center
+        self.inner_radius = inner_radius
+        self.outer_radius = outer_radius
 
         # Defining included pixels
-        center_y, center_x = center
-        r = int(outer_radius+1)
+        self.bbox, distance_squared = _distances_squared(fits_image, center, outer_radius)
+        self.mask = (inner_radius**2 <= distance_squared) & (distance_squared <= outer_radius**2)
 
-        for y in range(int(center_y)-r, int(center_y)+r):
-            for x in range(int(center_x)-r, int(center_x)+r):
-
-                distance_squared = (y-center_y)**2 + (x-center_x)**2
-                if inner_radius**2 <= distance_squared <= outer_radius**2:
-                    self.enclosed_pixels.append((y, x))
-        
         # Additional parameters of interest
         self.mean_err = None
         self.median_err = None
 
 class SubAnnulusRegion(AnnulusRegion):
     """ Subsection of an Annulus Region """
+    @instrument()
     def __init__(self, fits_image: FITSImage, center: tuple, inner_radius: float, outer_radius: float, angle_min: float, angle_max: float):
         """
         Parameters:
@@ -100,22 +130,19 @@ class SubAnnulusRegion(AnnulusRegion):
           - `angle_min`: Minimum angle for pixels in the subsection of the annulus (in degrees)
           - `angle_max`: Maximum angle for pixels in the subsection of the annulus (in degrees)
         """
-        from math import pi, atan2 
-
         assert inner_radius < outer_radius, "Inner radius must be greater or equal to outer radius"
         assert angle_min < angle_max, "Minimum angle must be smaller than maximum angle"
 
         super().__init__(fits_image, center, inner_radius, outer_radius)
 
+        self.angle_min = angle_min
+        self.angle_max = angle_max
+
         centery, centerx = center
+        y_min, y_max, x_min, x_max = self.bbox
 
-        subsection_pixels = []
-        for pixel in self.enclosed_pixels:
-            pixely, pixelx = pixel
-            diffy, diffx = pixely-centery, pixelx-centerx
+        diffy = np.arange(y_min, y_max)[:, np.newaxis] - centery
+        diffx = np.arange(x_min, x_max)[np.newaxis, :] - centerx
 
-            angle = (atan2(diffy, diffx)/pi * 180) % 360
-            if angle_min <= angle < angle_max:
-                subsection_pixels.append(pixel)
-        
-        self.enclosed_pixels = subsection_pixels
\ No newline at end of file
+        angle = np.degrees(np.arctan2(diffy, diffx)) % 360
+        self.mask &= (angle_min <= angle) & (angle < angle_max)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import numpy as np
 
+from ._addons import BackgroundMesh, instrument
+
 from .fitsimage import FITSImage
 from .region import Region, CircleRegion, AnnulusRegion, SubAnnulusRegion
 
@@ -7,7 +9,7 @@ class Star:
     """
     Class to define a star in an image.
     """
-    def __init__(self, fits_image: FITSImage, center, aperture_size: float, annulus_r1: float, annulus_r2: float, label: str=None):
+    def __init__(self, fits_image: FITSImage, center, aperture_size: float, annulus_r1: float, annulus_r2: float, label: str=None, evaluate_errors: bool=True, background: BackgroundMesh=None):
         """
         Class to define a star given an image and parameters.
 
@@ -18,6 +20,11 @@ class Star:
           - `annulus_r1`: inner radius of annulus for background sampling.
           - `annulus_r2`: outer radius of annulus for background sampling.
           - `label`: (optional) label for the star
+          - `evaluate_errors`: (optional) if `False`, the aperture and annulus errors
+              are not evaluated (e.g. when they are already known from `photometry`)
+          - `background`: (optional) background map of the image (see `FITSImage.background`).
+              If given, the background at the center replaces the median of the annulus,
+              and its error (`BackgroundMesh.error_at`) replaces the error of the annulus.
         """
         self.fits_image = fits_image
         self.center = center
@@ -29,6 +36,7 @@ class Star:
         self.annulus = AnnulusRegion(fits_image, center, annulus_r1, annulus_r2)
 
         self.label = label
+        self.background = background
 
         # Magnitudes
         self._magnitude = None
@@ -37,15 +45,26 @@ class Star:
         self._k_err = None
 
         # Evaluate errors associated with aperture and annulus
-        self.evaluate_aperture_errors()
-        self.evaluate_annulus_errors()
+        if evaluate_errors:
+            self.evaluate_aperture_errors()
+            self.evaluate_annulus_errors()
 
     @property
+    def sky(self):
+        if self.background is not None:
+            return self.background.at(*self.center)[0]
+        return self.annulus.median
+    @property
     def flux(self):
-        return self.aperture.sum - self.annulus.median * self.aperture.n
+        return self.aperture.sum - self.sky * self.aperture.n
+    @property
+    def sky_err(self):
+        if self.background is not None:
+            return self.background.error_at(*self.center)[0]
+        return self.annulus.median_err
     @property
     def flux_err(self):
-        return np.abs(self.annulus.median_err*self.aperture.n)
+        return np.abs(self.sky_err*self.aperture.n)
 
     @property
     def magnitude(self):
@@ -86,6 +105,7 @@ class Star:
         return self._k_err
         
 
+    @instrument()
     def evaluate_aperture_errors(self) -> None:
         """
         Evaluate the errors associated with centring and size of the aperture region.
@@ -108,6 +128,7 @@ class Star:
         self.aperture.median_err = np.std(aperture_medians) / RESOLUTION
         self.aperture.mean_err = np.std(aperture_means) / RESOLUTION
 
+    @instrument()
     def evaluate_annulus_errors(self) -> None:
         """
         Evaluate the errors associated with the annulus
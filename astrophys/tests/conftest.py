@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+
+@pytest.fixture(scope='session')
+def write_image():
+    """ Writes a FITS image with the header keywords `astrophys.fitsimage.FITSImage` needs """
+    def write(filepath: str, data: np.ndarray, **keywords) -> str:
+        header = fits.Header()
+        header['DATE-OBS'], header['EXPTIME'], header['FILTER'] = '2024-01-01T00:00:00', 30.0, 'V'
+        header.update(keywords)
+        fits.PrimaryHDU(data, header=header).writeto(filepath)
+        return filepath
+    return write
+
+@pytest.fixture(scope='session')
+def star_field():
+    """ Makes an image of gaussian stars (std of 1.5 pixels) on a noisy background of 100 counts """
+    def field(size_y: int, size_x: int, n_stars: int, seed: int, margin: int=0) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        centers_y = rng.uniform(margin, size_y - margin, n_stars)
+        centers_x = rng.uniform(margin, size_x - margin, n_stars)
+        fluxes = np.exp(rng.uniform(np.log(1e3), np.log(1e5), n_stars))
+
+        y, x = np.mgrid[:size_y, :size_x]
+        image = 100.0 + np.zeros((size_y, size_x))
+        for center_y, center_x, flux in zip(centers_y, centers_x, fluxes):
+            image += flux / (2 * np.pi * 1.5**2) * np.exp(-((y - center_y)**2 + (x - center_x)**2) / (2 * 1.5**2))
+        return rng.poisson(image) + rng.normal(0, 5.0, image.shape)
+    return field
@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+from astrophys import batch
+
+def _reduce_or_crash(filepath, *arguments):
+    if 'crash' in filepath:
+        os._exit(1)
+    return batch.FrameResult(filepath, photometry=[])
+
+def test_reduce_survives_a_dead_worker(monkeypatch):
+    monkeypatch.setattr(batch, 'reduce_frame', _reduce_or_crash)
+    results = list(batch.reduce(['a.fits', 'crash.fits', 'b.fits', 'c.fits'], 4, 7, 10, workers=2, max_in_flight=1))
+
+    assert [result.filepath for result in results] == ['a.fits', 'crash.fits', 'b.fits', 'c.fits']
+    assert [result.ok for result in results] == [True, False, True, True]
+    assert 'BrokenProcessPool' in results[1].error
+
+def test_max_in_flight_must_be_positive():
+    with pytest.raises(ValueError, match="'max_in_flight' must be positive"):
+        list(batch.reduce(['a.fits'], 4, 7, 10, workers=2, max_in_flight=0))
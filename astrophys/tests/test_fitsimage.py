@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from astrophys.fitsimage import FITSImage
+
+@pytest.fixture(params=[False, True], ids=['loaded', 'memmap'])
+def fits_image(request, tmp_path, write_image, star_field):
+    filepath = write_image(str(tmp_path / 'field.fits'), star_field(96, 128, 10, seed=2))
+    return FITSImage(filepath, memmap=request.param)
+
+def test_data_is_read_only(fits_image):
+    with pytest.raises(ValueError, match=r"image\.grid\[y, x\] = value"):
+        fits_image.data[0, 0] = 0.0
+    with pytest.raises(ValueError, match=r"image\.data = array"):
+        fits_image.data -= 1.0
+
+    # Subtracting out of place replaces the data
+    data = fits_image.data
+    fits_image.data = fits_image.data - 1.0
+    np.testing.assert_array_equal(fits_image.data, data - 1.0)
+    assert type(fits_image.data - 1.0) is np.ndarray
+
+def test_writes_invalidate_statistics_and_background(fits_image):
+    median, background = fits_image.median, fits_image.background(32)
+    assert fits_image.background(32) is background
+
+    fits_image.grid[:48] = fits_image.cutout(0, 48, 0, 128) + 1000.0
+    assert fits_image.median != median
+    assert fits_image.median == np.median(fits_image.data)
+    assert fits_image.background(32) is not background
+
+def test_replacing_data_invalidates_statistics(fits_image):
+    fits_image.median
+    fits_image.data = np.full((96, 128), 7.0)
+    assert fits_image.median == 7.0 and fits_image.std == 0.0
+    assert np.all(fits_image.background(32).at(np.array([10.0]), np.array([10.0])) == 7.0)
@@ -0,0 +1,73 @@
+import numpy as np
+
+from astrophys.batch import FrameResult
+from astrophys.lightcurve import LightCurves
+from astrophys.photometry import PHOTOMETRY_DTYPE
+
+TARGETS = [(10.0, 20.0), (10.1, 20.1), (10.2, 20.2)]
+
+def _result(JD: float, filter: str='V') -> FrameResult:
+    """ Result of a frame whose photometry encodes its JD and the index of each target """
+    photometry = np.zeros(len(TARGETS), dtype=PHOTOMETRY_DTYPE)
+    photometry['flux'] = JD + np.arange(len(TARGETS)) / 10
+    photometry['flux_err'] = 1.0
+    photometry['aperture_npix'] = 50
+    return FrameResult(f'frame{JD:g}.fits', JD, filter, 30.0, 1.2, photometry=photometry)
+
+def _curves() -> LightCurves:
+    return LightCurves(TARGETS, 5, 8, 12, labels=['A', 'B', None])
+
+def test_grow():
+    curves = _curves()
+    for JD in range(40):
+        curves.append(_result(float(JD)))
+
+    assert len(curves) == 40 and len(curves._JD) == 64
+    np.testing.assert_array_equal(curves.JD, np.arange(40.0))
+    np.testing.assert_allclose(curves['flux'], np.arange(40.0) + np.array([[0.0], [0.1], [0.2]]))
+
+def test_sort():
+    curves = _curves()
+    JDs = [3.0, 1.0, 2.0, 0.0] * 5 + np.repeat(np.arange(5) * 10, 4)
+    for JD in JDs:
+        curves.append(_result(JD))
+    assert not curves._sorted
+
+    # Epochs are sorted by JD, with the columns of every target in the same order
+    np.testing.assert_array_equal(curves.JD, np.sort(JDs))
+    np.testing.assert_allclose(curves['flux'], np.sort(JDs) + np.array([[0.0], [0.1], [0.2]]))
+    assert curves.filepaths == [f'frame{JD:g}.fits' for JD in np.sort(JDs)]
+
+def test_light_curve_filters():
+    curves = _curves()
+    for JD, filter in [(2.0, 'V'), (1.0, 'B'), (3.0, None), (0.0, 'V')]:
+        curves.append(_result(JD, filter))
+
+    np.testing.assert_array_equal(curves.filter, ['V', 'B', 'V', ''])
+    np.testing.assert_array_equal(curves.light_curve('B', filter='V')['JD'], [0.0, 2.0])
+    np.testing.assert_allclose(curves.light_curve(1, filter='V')['flux'], [0.1, 2.1])
+    np.testing.assert_array_equal(curves.light_curve('A')['JD'], [0.0, 1.0, 2.0, 3.0])
+    # A frame without a filter is not taken for a filter named 'None'
+    assert len(curves.light_curve(0, filter='None')) == 0
+
+def test_save_and_load(tmp_path):
+    curves = LightCurves(TARGETS, 5, 8, 12, labels=['A', 'B', None], background=True)
+    for JD, filter in [(1.0, 'V'), (0.0, None)] * 10:
+        curves.append(_result(JD, filter))
+
+    path = str(tmp_path / 'curves.npz')
+    curves.save(path)
+    loaded = LightCurves.load(path)
+
+    assert (loaded.aperture, loaded.r1, loaded.r2, loaded.background) == (5, 8, 12, True)
+    assert loaded.labels == ['A', 'B', None] and len(loaded) == 20
+    np.testing.assert_array_equal(loaded.targets, curves.targets)
+    for name in ('JD', 'exptime', 'airmass', 'filter'):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(curves, name))
+    for name in LightCurves.COLUMNS:
+        np.testing.assert_array_equal(loaded[name], curves[name])
+    assert loaded.filters == curves.filters and loaded.filepaths == curves.filepaths
+
+    # More frames can be added to the loaded light curves
+    loaded.append(_result(0.5))
+    np.testing.assert_array_equal(loaded.light_curve('A', filter='V')['JD'], [0.5] + [1.0] * 10)
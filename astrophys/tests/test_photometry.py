@@ -0,0 +1,60 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from astrophys.fitsimage import FITSImage
+from astrophys.photometry import photometry, stars
+from astrophys.star import Star
+
+APERTURE, R1, R2 = 4, 7, 10
+
+@pytest.fixture(scope='module', params=[np.float32, np.float64])
+def fits_image(request, tmp_path_factory, write_image, star_field):
+    filepath = str(tmp_path_factory.mktemp('photometry') / 'field.fits')
+    write_image(filepath, star_field(120, 160, 15, seed=1, margin=12).astype(request.param))
+    return FITSImage(filepath)
+
+def test_photometry_matches_star(fits_image):
+    centers = np.array([[20.3, 30.7], [60.0, 80.5], [100.9, 140.2], [2.0, 3.0], [119.0, 50.0]])
+    results = photometry(fits_image, centers, APERTURE, R1, R2, chunk_size=2)
+
+    # Single precision images are summed in double precision by `photometry`
+    rtol = 1e-6 if fits_image.data.dtype == np.float32 else 1e-12
+    for row, center in zip(results, centers):
+        star = Star(fits_image, center, APERTURE, R1, R2)
+        assert row['aperture_npix'] == star.aperture.n
+        assert row['annulus_npix'] == star.annulus.n
+        np.testing.assert_allclose(row['aperture_sum'], star.aperture.sum, rtol=rtol)
+        np.testing.assert_allclose(row['background'], star.annulus.median, rtol=rtol)
+        np.testing.assert_allclose(row['flux'], star.flux, rtol=rtol, atol=rtol * abs(star.aperture.sum))
+        np.testing.assert_allclose(row['aperture_median_err'], star.aperture.median_err, rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(row['background_err'], star.annulus.median_err, rtol=1e-4, atol=1e-6)
+        np.testing.assert_allclose(row['flux_err'], star.flux_err, rtol=1e-4, atol=1e-6)
+
+def test_photometry_off_frame(fits_image):
+    results = photometry(fits_image, [[-50.0, -50.0]], APERTURE, R1, R2)
+    assert results['aperture_npix'][0] == 0 and results['annulus_npix'][0] == 0
+    assert np.isnan(results['flux'][0])
+
+    # Empty regions give `nan`, without "Mean of empty slice" warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        star, = stars(fits_image, results, APERTURE, R1, R2)
+        assert np.isnan(star.flux)
+        Star(fits_image, np.array([-50.0, -50.0]), APERTURE, R1, R2)
+
+def test_photometry_with_background_map(fits_image):
+    background = fits_image.background(32)
+    centers = np.array([[20.3, 30.7], [60.0, 80.5]])
+    results = photometry(fits_image, centers, APERTURE, R1, R2, background=background)
+
+    errors = background.error_at(centers[:, 0], centers[:, 1])
+    np.testing.assert_allclose(results['background_err'], errors)
+    np.testing.assert_allclose(results['flux_err'], errors * results['aperture_npix'])
+
+    for row, star in zip(results, stars(fits_image, results, APERTURE, R1, R2, background=background)):
+        direct = Star(fits_image, np.array([row['y'], row['x']]), APERTURE, R1, R2, background=background)
+        np.testing.assert_allclose(star.flux_err, row['flux_err'])
+        np.testing.assert_allclose(direct.flux_err, row['flux_err'])
+        np.testing.assert_allclose(direct.flux, row['flux'], rtol=1e-6, atol=1e-6 * row['aperture_sum'])
@@ -0,0 +1,63 @@
+from math import atan2, pi
+
+import numpy as np
+import pytest
+
+from astrophys.fitsimage import FITSImage
+from astrophys.region import AnnulusRegion, CircleRegion, SubAnnulusRegion
+
+SHAPE = (30, 40)
+
+@pytest.fixture(scope='module')
+def fits_image(tmp_path_factory, write_image):
+    filepath = str(tmp_path_factory.mktemp('region') / 'image.fits')
+    return FITSImage(write_image(filepath, np.random.default_rng(0).normal(100, 10, SHAPE)))
+
+def _baseline_pixels(center, inner_radius, outer_radius, angles=None):
+    """
+    Per-pixel loops of the first version of the regions, with its two bugs fixed: the loops
+    stopped one pixel short of the far edge of the region, and pixels outside of the image
+    were kept (negative indices wrapped around to the other side of the image).
+    """
+    center_y, center_x = center
+    r = int(outer_radius+1)
+
+    pixels = []
+    for y in range(int(center_y)-r, int(center_y)+r+1):
+        for x in range(int(center_x)-r, int(center_x)+r+1):
+            distance_squared = (y-center_y)**2 + (x-center_x)**2
+            if inner_radius**2 <= distance_squared <= outer_radius**2:
+                pixels.append((y, x))
+
+    if angles is not None:
+        angle_min, angle_max = angles
+        pixels = [(y, x) for y, x in pixels if angle_min <= (atan2(y-center_y, x-center_x)/pi * 180) % 360 < angle_max]
+
+    return [(y, x) for y, x in pixels if 0 <= y < SHAPE[0] and 0 <= x < SHAPE[1]]
+
+CENTERS = [(15.0, 20.0), (12.3, 25.8), (14.5, 19.5), (0.0, 0.0), (1.7, 38.2), (29.4, 3.0), (-2.5, 10.0), (28.0, 41.5)]
+
+@pytest.mark.parametrize('center', CENTERS)
+@pytest.mark.parametrize('radius', [0.5, 3.0, 4.7])
+def test_circle(fits_image, center, radius):
+    region = CircleRegion(fits_image, center, radius)
+    assert region.enclosed_pixels == _baseline_pixels(center, 0, radius)
+    assert region.n == len(region.enclosed_pixels)
+    np.testing.assert_array_equal(region.pixel_values, [fits_image.data[pixel] for pixel in region.enclosed_pixels])
+
+@pytest.mark.parametrize('center', CENTERS)
+@pytest.mark.parametrize('radii', [(2.0, 5.0), (6.3, 9.9)])
+def test_annulus(fits_image, center, radii):
+    region = AnnulusRegion(fits_image, center, *radii)
+    assert region.enclosed_pixels == _baseline_pixels(center, *radii)
+
+@pytest.mark.parametrize('center', CENTERS)
+@pytest.mark.parametrize('angles', [(0, 90), (45, 200), (270, 360), (0, 360)])
+def test_sub_annulus(fits_image, center, angles):
+    region = SubAnnulusRegion(fits_image, center, 3.0, 8.5, *angles)
+    assert region.enclosed_pixels == _baseline_pixels(center, 3.0, 8.5, angles)
+
+def test_outside_of_the_image(fits_image):
+    region = CircleRegion(fits_image, (-20.0, -20.0), 5)
+    assert region.n == 0 and region.enclosed_pixels == []
+    assert np.isnan(region.mean) and np.isnan(region.median) and np.isnan(region.std)
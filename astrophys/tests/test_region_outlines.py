@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from matplotlib.collections import EllipseCollection, PatchCollection
+from matplotlib.figure import Figure
+
+from astrophys.fitsimage import FITSImage
+from astrophys.quickplot import quickplot, region_outlines
+from astrophys.region import AnnulusRegion, CircleRegion, Region, SubAnnulusRegion
+
+@pytest.fixture(scope='module')
+def fits_image(tmp_path_factory, write_image):
+    filepath = str(tmp_path_factory.mktemp('outlines') / 'image.fits')
+    return FITSImage(write_image(filepath, np.random.default_rng(0).normal(100, 10, (40, 50))))
+
+def test_region_outlines(fits_image):
+    other = Region(fits_image)
+    other.bbox, other.mask = (5, 9, 30, 34), np.ones((4, 4), dtype=bool)
+    regions = [
+        CircleRegion(fits_image, (10.0, 20.5), 4), AnnulusRegion(fits_image, (25.0, 30.0), 6, 9),
+        SubAnnulusRegion(fits_image, (20.0, 10.0), 3, 7, 30, 120), other,
+    ]
+    ax = Figure().add_subplot()
+    region_outlines(ax, regions, linewidth=2)
+
+    circles, = [collection for collection in ax.collections if isinstance(collection, EllipseCollection)]
+    # Circles and both edges of the annulus, centred on (x, y)
+    np.testing.assert_array_equal(circles.get_offsets(), [[20.5, 10.0], [30.0, 25.0], [30.0, 25.0]])
+    np.testing.assert_array_equal(circles._widths * 2, [8, 12, 18])
+    assert circles.get_linewidth()[0] == 2
+
+    wedges, = [collection for collection in ax.collections if isinstance(collection, PatchCollection)]
+    wedge, = wedges.get_paths()
+    # Wedge between radii 3 and 7, from 30 to 120 degrees around (x, y) = (10, 20)
+    for radius, angle, inside in [(5, 75, True), (5, 35, True), (5, 115, True), (2, 75, False), (8, 75, False), (5, 150, False), (5, 0, False)]:
+        point = (10.0 + radius * np.cos(np.radians(angle)), 20.0 + radius * np.sin(np.radians(angle)))
+        assert wedge.contains_point(point) == inside
+
+    # The contour of the other region is drawn around its pixels
+    contour, = [collection for collection in ax.collections if collection not in (circles, wedges)]
+    x, y = np.concatenate([path.vertices for path in contour.get_paths()]).T
+    assert (x.min(), x.max(), y.min(), y.max()) == pytest.approx((29.5, 33.5, 4.5, 8.5))
+
+def test_inverted_phi(fits_image):
+    with pytest.raises(AssertionError, match="lo_phi must be lower than hi_phi"):
+        quickplot(fits_image, 3, -1)
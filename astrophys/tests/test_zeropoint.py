@@ -0,0 +1,74 @@
+import numpy as np
+
+from astropyaddons.PSF.psf import GaussianPSF
+from astropyaddons.synthetic import SyntheticField
+
+from astrophys.fitsimage import FITSImage
+from astrophys.star import Star
+from astrophys.zeropoint import apply_zero_points, calibrate, zero_points
+
+def _fluxes(k, magnitudes):
+    """ Fluxes of stars of known `magnitudes` at epochs of zero points `k`, shape `(stars, epochs)` """
+    return 10**((np.asarray(k)[np.newaxis, :] - np.asarray(magnitudes)[:, np.newaxis]) / 2.5)
+
+def test_matches_star(tmp_path):
+    filepath = str(tmp_path / 'field.fits')
+    field = SyntheticField(60, 60, 1, GaussianPSF(1.5, 1.0), flux_range=(5e4, 5e4), margin=20, seed=4)
+    field.write(filepath)
+    star = Star(FITSImage(filepath), (field.stars['y'][0], field.stars['x'][0]), 4, 7, 10)
+    star._magnitude, star._magnitude_err = 12.3, 0.02
+
+    k, k_err, used = zero_points([[star.flux]], [[star.flux_err]], [0], [12.3], [0.02])
+    assert used.all()
+    np.testing.assert_allclose(k, [star.k], rtol=1e-12)
+    np.testing.assert_allclose(k_err, [star.k_err], rtol=1e-12)
+
+def test_outlier_is_rejected():
+    magnitudes = np.linspace(10.0, 13.0, 12)
+    flux = _fluxes([20.0, 20.1], magnitudes)
+    # The third comparison star brightened by a magnitude at the second epoch
+    flux[2, 1] *= 10**(1 / 2.5)
+    flux_err = 0.01 * flux
+
+    k, k_err, used = zero_points(flux, flux_err, np.arange(12), magnitudes, [0.01] * 12)
+    np.testing.assert_array_equal(used, np.arange(12)[:, np.newaxis] != [[-1, 2]])
+    np.testing.assert_allclose(k, [20.0, 20.1])
+    # Estimates which agree exactly do not reduce the error below that of the weighted mean
+    np.testing.assert_allclose(k_err, [np.sqrt(2e-4 / 12), np.sqrt(2e-4 / 11)])
+
+def test_reduced_chi2_inflation():
+    # Two estimates 0.2 apart, with errors of 0.01
+    flux = _fluxes([20.0], [10.0, 10.0])
+    flux[1] *= 10**(-0.2 / 2.5)
+    k, k_err, _ = zero_points(flux, np.zeros_like(flux), [0, 1], [10.0, 10.0], [0.01, 0.01], sigma=10)
+
+    estimates, weights = np.array([20.0, 19.8]), np.array([1e4, 1e4])
+    reduced_chi2 = np.sum(weights * (estimates - 19.9)**2) / (2 - 1)
+    np.testing.assert_allclose(k, [19.9])
+    np.testing.assert_allclose(k_err, np.sqrt(reduced_chi2 / weights.sum()))
+    assert k_err[0] > np.sqrt(1 / weights.sum())
+
+def test_epoch_without_estimates():
+    magnitudes = [10.0, 11.0]
+    flux = _fluxes([20.0, 20.0, 20.0], magnitudes)
+    flux[:, 1] = [np.nan, -5.0]
+    flux_err = 0.01 * np.abs(flux)
+
+    k, k_err, used = zero_points(flux, flux_err, [True, True], magnitudes, [0.01, 0.01])
+    assert not used[:, 1].any()
+    assert np.isnan(k[1]) and np.isnan(k_err[1])
+    np.testing.assert_allclose(k[[0, 2]], 20.0)
+
+    # Every star of that epoch has a NaN magnitude
+    magnitude, magnitude_err, _, _ = calibrate(flux, flux_err, [0, 1], magnitudes, [0.01, 0.01])
+    assert np.isnan(magnitude[:, 1]).all() and np.isnan(magnitude_err[:, 1]).all()
+
+def test_calibrate():
+    magnitudes = [10.0, 11.0, 12.0]
+    flux = _fluxes([20.0, 19.5], magnitudes + [14.0])
+    flux_err = 0.01 * flux
+
+    magnitude, magnitude_err, k, k_err = calibrate(flux, flux_err, [0, 1, 2], magnitudes, [0.01] * 3)
+    np.testing.assert_allclose(magnitude, np.repeat([[10.0], [11.0], [12.0], [14.0]], 2, axis=1))
+    np.testing.assert_array_equal(magnitude_err, apply_zero_points(flux, flux_err, k, k_err)[1])
+    np.testing.assert_allclose(magnitude_err, np.tile(np.sqrt(k_err**2 + 0.01**2), (4, 1)))
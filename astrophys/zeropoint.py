@@ -0,0 +1,106 @@
+import numpy as np
+
+# Vectorised version of the calibration of `Star` (`magnitude`, `k` and their errors),
+# for arrays of fluxes of shape `(stars, epochs)`, e.g. the columns of `LightCurves`:
+#
+#     k, k_err, used = zero_points(curves['flux'], curves['flux_err'], comparison, magnitudes, magnitude_errs)
+#     magnitude, magnitude_err = apply_zero_points(curves['flux'], curves['flux_err'], k, k_err)
+#
+# The same definitions as `Star` are used:
+#  - magnitude = -2.5 log10(flux) + k
+#  - magnitude_err = sqrt(k_err^2 + (flux_err / flux)^2), and likewise for k_err.
+
+def zero_points(flux: np.ndarray, flux_err: np.ndarray, comparison, magnitudes, magnitude_errs, sigma: float=3.0, maxiters: int=5) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calibration constant `k` (zero point) of each epoch, from the comparison stars
+    of known magnitude. Each comparison star gives one estimate of `k` per epoch,
+    which are combined by their weighted mean (weights `1 / k_err^2`). Estimates
+    further than `sigma` standard deviations from the mean (e.g. variable stars,
+    cosmic rays) are iteratively rejected, separately for each epoch.
+
+    Parameters:
+      - `flux`, `flux_err`: arrays of shape `(stars, epochs)` of the fluxes and their errors.
+      - `comparison`: indices (or boolean mask) of the comparison stars in the rows of `flux`.
+      - `magnitudes`, `magnitude_errs`: known magnitudes of the comparison stars and their errors.
+      - `sigma`: number of standard deviations to reject estimates at.
+      - `maxiters`: maximum number of rejection iterations.
+
+    Returns: `k` and `k_err` of shape `(epochs,)`, and a boolean array of shape
+    `(comparison stars, epochs)` of the estimates used. Epochs without any valid
+    estimate have NaN.
+    """
+    flux, flux_err = np.atleast_2d(flux), np.atleast_2d(flux_err)
+    assert flux.shape == flux_err.shape, "flux and flux_err must have the same shape"
+
+    flux, flux_err = flux[comparison], flux_err[comparison]
+    magnitudes = np.asarray(magnitudes, dtype=float)[:, np.newaxis]
+    magnitude_errs = np.asarray(magnitude_errs, dtype=float)[:, np.newaxis]
+    assert len(magnitudes) == len(flux), "There must be one magnitude per comparison star"
+
+    # Estimates of k from each comparison star, as in `Star.k` and `Star.k_err`
+    with np.errstate(divide='ignore', invalid='ignore'):
+        estimates = 2.5*np.log10(flux) + magnitudes
+        errors = np.sqrt(magnitude_errs**2 + (flux_err/flux)**2)
+        weights = np.where(errors > 0, 1 / errors**2, 0)
+
+    used = np.isfinite(estimates) & np.isfinite(weights) & (weights > 0)
+    estimates, weights = np.where(used, estimates, 0), np.where(used, weights, 0)
+
+    for _ in range(maxiters):
+        k, std, _, _ = _weighted_mean(estimates, weights, used)
+        with np.errstate(invalid='ignore'):
+            kept = used & (np.abs(estimates - k) <= sigma * std)
+        # Never reject every estimate of an epoch (e.g. when all agree exactly)
+        kept |= used & (kept.sum(axis=0) == 0)
+
+        if np.array_equal(kept, used):
+            break
+        used = kept
+
+    k, std, total, n = _weighted_mean(estimates, weights, used)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Error of the weighted mean, inflated when the estimates scatter more than their errors
+        reduced_chi2 = np.where(n > 1, std**2 * total / np.maximum(n - 1, 1), 1)
+        k_err = np.sqrt(np.maximum(reduced_chi2, 1) / total)
+
+    invalid = n == 0
+    k[invalid], k_err[invalid] = np.nan, np.nan
+    return k, k_err, used
+
+def _weighted_mean(estimates: np.ndarray, weights: np.ndarray, used: np.ndarray) -> tuple[np.ndarray, ...]:
+    """ Weighted mean and standard deviation of the `used` estimates of each epoch, the sum of their weights and their number. """
+    total = weights.sum(axis=0, where=used)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (weights * estimates).sum(axis=0, where=used) / total
+        std = np.sqrt((weights * (estimates - mean)**2).sum(axis=0, where=used) / total)
+    return mean, std, total, used.sum(axis=0)
+
+def apply_zero_points(flux: np.ndarray, flux_err: np.ndarray, k, k_err) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calibrated magnitudes of every star at every epoch, in one step.
+
+    Parameters:
+      - `flux`, `flux_err`: arrays of shape `(stars, epochs)` of the fluxes and their errors.
+      - `k`, `k_err`: calibration constant of each epoch and its error, shape `(epochs,)`
+          (e.g. from `zero_points`), or a single value for all the epochs.
+
+    Returns: magnitudes and their errors, of shape `(stars, epochs)`.
+    """
+    flux, flux_err = np.asarray(flux, dtype=float), np.asarray(flux_err, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = -2.5*np.log10(flux) + k
+        magnitude_err = np.sqrt(np.square(k_err) + (flux_err/flux)**2)
+
+    return magnitude, magnitude_err
+
+def calibrate(flux: np.ndarray, flux_err: np.ndarray, comparison, magnitudes, magnitude_errs, sigma: float=3.0, maxiters: int=5) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Solves the zero point of each epoch (see `zero_points`) and applies it
+    to every star (see `apply_zero_points`).
+
+    Returns: magnitudes and their errors of shape `(stars, epochs)`, and `k`, `k_err` of shape `(epochs,)`.
+    """
+    k, k_err, _ = zero_points(flux, flux_err, comparison, magnitudes, magnitude_errs, sigma, maxiters)
+    magnitude, magnitude_err = apply_zero_points(flux, flux_err, k, k_err)
+    return magnitude, magnitude_err, k, k_err
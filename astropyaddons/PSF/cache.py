@@ -0,0 +1,129 @@
+from collections import OrderedDict
+import hashlib
+import os
+
+import numpy as np
+
+from .psf import PSF
+
+coord = tuple[float, float]
+
+class PSFCache:
+    """
+    Cache of precomputed PSF stamps (lookup tables). For each PSF (model and
+    parameters), stamps are rendered once for a grid of sub-pixel phases of the
+    center. Stamps for any center are then interpolated from the table, instead
+    of integrating the PSF again.
+
+    Tables are kept in memory up to `max_bytes` (least recently used are removed
+    first), and can be saved as `.npy` files in `directory` to be reused across runs.
+
+    Parameters:
+     - `shape`: shape of the stamps, `(size_y, size_x)`.
+     - `phases`: number of sub-pixel phase bins per axis. Interpolation errors
+        decrease with the square of the number of phases.
+     - `max_bytes`: memory budget of the tables kept in memory.
+     - `directory`: Optional. Directory to save and load the tables from.
+    """
+    def __init__(self, shape: tuple[int, int]=(25, 25), phases: int=8, max_bytes: int=256 * 2**20, directory: str=None):
+        if phases < 1: raise ValueError("'phases' must be positive")
+
+        self.shape = tuple(shape)
+        self.phases = phases
+        self.max_bytes = max_bytes
+        self.directory = directory
+
+        # Least recently used tables are at the start of the dictionary
+        self._tables: OrderedDict = OrderedDict()
+        self.nbytes = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _key(self, psf: PSF) -> tuple:
+        return (type(psf).__name__, tuple(sorted(psf.parameters.items())), self.shape, self.phases)
+
+    def _path(self, key: tuple) -> str:
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest()[:16] + '.npy')
+
+    def table(self, psf: PSF) -> np.ndarray:
+        """
+        Lookup table of `psf`, of shape `(phases+1, phases+1, size_y, size_x)`.
+        Entry `[i, j]` is the stamp for a center at phase `(x, y) = (j, i) / phases`
+        from the middle pixel of the stamp.
+        """
+        key = self._key(psf)
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key]
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            table = np.load(self._path(key))
+        else:
+            table = self._render_table(psf)
+            if self.directory is not None:
+                np.save(self._path(key), table)
+
+        self._tables[key] = table
+        self.nbytes += table.nbytes
+
+        # Remove the least recently used tables, always keeping the new one
+        while self.nbytes > self.max_bytes and len(self._tables) > 1:
+            _, removed = self._tables.popitem(last=False)
+            self.nbytes -= removed.nbytes
+
+        return table
+
+    def _render_table(self, psf: PSF) -> np.ndarray:
+        size_y, size_x = self.shape
+        phase = np.arange(self.phases + 1) / self.phases
+
+        # Centers (x, y) for every pair of phases, relative to the middle pixel
+        phase_y, phase_x = np.meshgrid(phase, phase, indexing='ij')
+        centers = np.column_stack([size_x // 2 + phase_x.ravel(), size_y // 2 + phase_y.ravel()])
+
+        return psf.render_batch(centers, self.shape).reshape(self.phases + 1, self.phases + 1, size_y, size_x)
+
+    def stamp(self, psf: PSF, center: coord) -> tuple[np.ndarray, tuple[int, int]]:
+        """
+        Stamp of `psf` for a point light source at `center` (x, y).
+
+        Returns: the stamp, and the pixel `(y, x)` its first pixel corresponds to.
+        """
+        stamps, origins = self.stamps(psf, [center])
+        return stamps[0], tuple(origins[0])
+
+    def stamps(self, psf: PSF, centers) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Stamps of `psf` for many point light sources at once, bilinearly
+        interpolated between the phases of the lookup table.
+         - `centers`: `(N, 2)` array of the point light sources, `(x, y)`.
+
+        Returns: array of shape `(N, size_y, size_x)` of the stamps, and `(N, 2)`
+        array of the pixels `(y, x)` the first pixel of each stamp corresponds to.
+        """
+        table = self.table(psf)
+        centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        size_y, size_x = self.shape
+
+        pixel = np.floor(centers).astype(int)
+        origins = np.column_stack([pixel[:, 1] - size_y // 2, pixel[:, 0] - size_x // 2])
+
+        # Position in the table, and weights of the neighbouring phases
+        position = (centers - pixel) * self.phases
+        lo = np.minimum(position.astype(int), self.phases - 1)
+        weight_x, weight_y = (position - lo).T
+        lo_x, lo_y = lo.T
+
+        weight_x, weight_y = weight_x[:, np.newaxis, np.newaxis], weight_y[:, np.newaxis, np.newaxis]
+        stamps = (1-weight_y) * (1-weight_x) * table[lo_y, lo_x] \
+            + (1-weight_y) * weight_x * table[lo_y, lo_x+1] \
+            + weight_y * (1-weight_x) * table[lo_y+1, lo_x] \
+            + weight_y * weight_x * table[lo_y+1, lo_x+1]
+
+        return stamps, origins
+
+    def clear(self) -> None:
+        """ Removes all the tables kept in memory. Saved tables are kept. """
+        self._tables.clear()
+        self.nbytes = 0
@@ -0,0 +1,308 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import optimize, sparse
+from scipy.sparse import csgraph
+from scipy.spatial import cKDTree
+
+from ..grid import Grid
+from .psf import PSF
+
+# Columns of the table returned by `fit_psf`, followed by one column per
+# parameter of the PSF (e.g. `std` and `max` for a `GaussianPSF`).
+#  - `y`, `x`: fitted center of the star, in pixels (pixel centers are integers).
+#  - `flux`: sum of the fitted PSF (without background) over the fitting box.
+#  - `background`: fitted background (shared by the stars of a group).
+#  - `chi2`: reduced chi-squared of the fit.
+#  - `npix`: number of pixels fitted.
+#  - `group`: id of the group of overlapping stars fitted together.
+#  - `nfev`: number of evaluations of the model of the star (or of its group),
+#     including those for the Jacobian.
+FIT_COLUMNS = [
+    ('y', float), ('x', float), ('y_err', float), ('x_err', float),
+    ('flux', float), ('flux_err', float), ('background', float),
+    ('chi2', float), ('npix', int), ('group', int), ('nfev', int),
+]
+
+def fit_psf(array, centers, psf: PSF, size: int=11, fixed: tuple[str]=(), group_radius: float=None, maxiter: int=50, workers: int=1) -> np.ndarray:
+    """
+    Fits a PSF to many stars, fitting the position, background and the parameters
+    of the PSF (amplitude and shape) of each star.
+
+    Isolated stars are fitted simultaneously with a vectorised Levenberg-Marquardt
+    (one residual and Jacobian evaluation for all the stars per iteration).
+    Stars closer than `group_radius` are grouped, and each group is fitted jointly
+    over the union of their boxes, with a shared background.
+
+    The PSF is evaluated at pixel centers. Its class must accept its `parameters`
+    as keyword arguments (as `GaussianPSF` and `MoffatPSF` do).
+
+    Parameters:
+     - `array`: 2-D numpy array or `Grid` of the image.
+     - `centers`: `(N, 2)` array of initial `(y, x)` coordinates of the stars
+        (e.g. from `FITSImage.get_star_coords`).
+     - `psf`: `PSF` whose parameters are used as the initial guess (the amplitude
+        is estimated from each star).
+     - `size`: size of the square box fitted around each star (odd).
+     - `fixed`: names of the PSF parameters which are not fitted, e.g. `('beta',)`.
+     - `group_radius`: stars closer than this are fitted together. If none
+        specified, uses `size`, i.e. stars whose boxes overlap.
+     - `maxiter`: maximum number of iterations.
+     - `workers`: number of processes used to fit the groups. If 1, the groups
+        are fitted in this process.
+
+    Returns: structured numpy array with one row per star (see `FIT_COLUMNS`).
+    """
+    # Only the boxes of the stars are read, so a `Grid` is never promoted as a whole
+    if isinstance(array, Grid):
+        shape, take, read = (array.size_y, array.size_x), array.take, array.cutout
+    elif isinstance(array, np.ndarray) and array.ndim == 2:
+        shape, take = array.shape, lambda y, x: array[y, x]
+        read = lambda y_min, y_max, x_min, x_max: array[y_min:y_max, x_min:x_max]
+    else:
+        raise TypeError("'array' must be a 2-dimensional numpy array or a Grid")
+    if size % 2 != 1: raise ValueError("'size' must be odd")
+
+    names = list(psf.parameters)
+    for name in fixed:
+        if name not in names: raise ValueError(f"{type(psf).__name__} has no parameter {name}")
+    free = [name for name in names if name not in fixed]
+
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    results = np.zeros(len(centers), dtype=FIT_COLUMNS + [(name, float) for name in names])
+
+    ### GROUPING
+    group_radius = group_radius if group_radius is not None else size
+    pairs = cKDTree(centers).query_pairs(group_radius, output_type='ndarray') if len(centers) else np.zeros((0, 2), int)
+    adjacency = sparse.coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(len(centers),)*2)
+    n_groups, labels = csgraph.connected_components(adjacency, directed=False)
+    results['group'] = labels
+
+    group_sizes = np.bincount(labels, minlength=n_groups)
+    isolated = group_sizes[labels] == 1
+
+    ### ISOLATED STARS
+    if isolated.any():
+        results[isolated] = _fit_isolated(take, shape, centers[isolated], psf, names, free, size, maxiter, results.dtype)
+        results['group'][isolated] = labels[isolated]
+
+    ### GROUPS
+    groups = [np.flatnonzero(labels == label) for label in np.flatnonzero(group_sizes > 1)]
+    jobs = [_group_job(read, shape, centers[members], psf, names, free, size, maxiter, results.dtype) for members in groups]
+
+    if workers == 1:
+        fitted = [_fit_group(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            fitted = list(executor.map(_fit_group, *zip(*jobs))) if jobs else []
+
+    for members, rows in zip(groups, fitted):
+        rows['group'] = labels[members]
+        results[members] = rows
+
+    return results
+
+def _box_indices(centers: np.ndarray, size: int, shape: tuple) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Pixel indices `(y, x)` of the fitting box of each star, shape `(N, size*size)`, and which are in the image. """
+    steps = np.arange(size) - size // 2
+    y = (np.round(centers[:, 0]).astype(int)[:, np.newaxis, np.newaxis] + steps[np.newaxis, :, np.newaxis])
+    x = (np.round(centers[:, 1]).astype(int)[:, np.newaxis, np.newaxis] + steps[np.newaxis, np.newaxis, :])
+    y, x = (a.reshape(len(centers), -1) for a in np.broadcast_arrays(y, x))
+
+    inside = (y >= 0) & (y < shape[0]) & (x >= 0) & (x < shape[1])
+    return y, x, inside
+
+def _psf_values(psf_type: type, parameters: dict, y: np.ndarray, x: np.ndarray, center_y: np.ndarray, center_x: np.ndarray) -> np.ndarray:
+    """ PSF of type `psf_type`, with (array) `parameters`, evaluated at pixels `y`, `x` for stars at `center_y`, `center_x`. """
+    return psf_type(**parameters).function(np.sqrt((y - center_y)**2 + (x - center_x)**2))
+
+def _initial_parameters(data: np.ndarray, inside: np.ndarray, psf: PSF, free: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """ Initial background and free PSF parameters of each star, from its box. """
+    values = np.where(inside, data, np.nan)
+    with np.errstate(invalid='ignore'):
+        background = np.nan_to_num(np.nanmedian(values, axis=1))
+        peak = np.nan_to_num(np.nanmax(values, axis=1)) - background
+
+    # The amplitude is estimated from the peak, scaled by the template
+    template = np.array([psf.parameters[name] for name in free], dtype=float)
+    shape = np.tile(template, (len(data), 1))
+    if 'max' in free:
+        shape[:, free.index('max')] = np.maximum(peak, 1e-12)
+
+    return background, shape
+
+def _fit_isolated(take, shape: tuple, centers: np.ndarray, psf: PSF, names: list[str], free: list[str], size: int, maxiter: int, dtype: np.dtype) -> np.ndarray:
+    """ Vectorised Levenberg-Marquardt fit of isolated stars, reading their boxes with `take(y, x)`. """
+    psf_type, fixed_values = type(psf), {name: value for name, value in psf.parameters.items() if name not in free}
+
+    y, x, inside = _box_indices(centers, size, shape)
+    data = np.zeros(y.shape)
+    data[inside] = take(y[inside], x[inside])
+    weights = inside.astype(float)
+
+    # Parameters of each star: y, x, background, free PSF parameters
+    background, shape = _initial_parameters(data, inside, psf, free)
+    params = np.column_stack([centers, background, shape])
+    n_stars, n_params = params.shape
+
+    def model(p: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """ Model of the boxes of the stars `rows`, with parameters `p` """
+        parameters = dict(fixed_values)
+        parameters.update({name: p[:, 3+i, np.newaxis] for i, name in enumerate(free)})
+        return p[:, 2, np.newaxis] + _psf_values(psf_type, parameters, y[rows], x[rows], p[:, 0, np.newaxis], p[:, 1, np.newaxis])
+
+    def jacobian(p: np.ndarray, rows: np.ndarray, current: np.ndarray) -> np.ndarray:
+        """ Forward-difference Jacobian for the stars `rows`, shape `(stars, pixels, parameters)` """
+        J = np.empty(current.shape + (n_params,))
+        for j in range(n_params):
+            step = 1e-6 * np.maximum(np.abs(p[:, j]), 1)
+            shifted = p.copy()
+            shifted[:, j] += step
+            J[..., j] = (model(shifted, rows) - current) / step[:, np.newaxis]
+        return J
+
+    all_rows = np.arange(n_stars)
+    current = model(params, all_rows)
+    chi2 = np.sum(weights * (data - current)**2, axis=1)
+    damping = np.full(n_stars, 1e-3)
+    nfev = np.ones(n_stars, dtype=int)
+    active = np.ones(n_stars, dtype=bool)
+
+    ### LEVENBERG-MARQUARDT
+    for _ in range(maxiter):
+        rows = np.flatnonzero(active)
+        if not len(rows):
+            break
+
+        p, w = params[rows], weights[rows]
+        residuals = data[rows] - current[rows]
+        J = jacobian(p, rows, current[rows])
+
+        JtW = J * w[:, :, np.newaxis]
+        A = np.einsum('npk,npl->nkl', JtW, J)
+        g = np.einsum('npk,np->nk', JtW, residuals)
+
+        diagonal = np.einsum('nkk->nk', A)
+        damped = A + (damping[rows, np.newaxis] * diagonal + 1e-12)[:, :, np.newaxis] * np.eye(n_params)
+        step = np.linalg.solve(damped, g[:, :, np.newaxis])[:, :, 0]
+
+        trial = p + step
+        trial_model = model(trial, rows)
+        trial_chi2 = np.sum(w * (data[rows] - trial_model)**2, axis=1)
+
+        better = np.isfinite(trial_chi2) & (trial_chi2 < chi2[rows])
+        converged = better & (chi2[rows] - trial_chi2 <= 1e-8 * chi2[rows])
+        converged |= ~better & (damping[rows] > 1e10)
+
+        accepted = rows[better]
+        params[accepted], current[accepted], chi2[accepted] = trial[better], trial_model[better], trial_chi2[better]
+        damping[rows] = np.where(better, damping[rows] / 10, damping[rows] * 10)
+        nfev[rows] += n_params + 1
+        active[rows[converged]] = False
+
+    ### RESULTS
+    J = jacobian(params, all_rows, current)
+    A = np.einsum('npk,npl->nkl', J * weights[:, :, np.newaxis], J)
+    npix = inside.sum(axis=1)
+    reduced_chi2 = chi2 / np.maximum(npix - n_params, 1)
+    errors = _errors(A, reduced_chi2)
+
+    results = np.zeros(n_stars, dtype=dtype)
+    results['y'], results['x'], results['background'] = params[:, 0], params[:, 1], params[:, 2]
+    results['y_err'], results['x_err'] = errors[:, 0], errors[:, 1]
+    for name, value in fixed_values.items():
+        results[name] = value
+    for i, name in enumerate(free):
+        results[name] = params[:, 3+i]
+    results['chi2'], results['npix'], results['nfev'] = reduced_chi2, npix, nfev
+
+    _fill_flux(results, psf_type, names, size, errors[:, 3+free.index('max')] if 'max' in free else None)
+    return results
+
+def _errors(A: np.ndarray, reduced_chi2: np.ndarray) -> np.ndarray:
+    """ Standard errors of the parameters, from the normal matrices `A` = J^T J. """
+    try:
+        covariance = np.linalg.inv(A)
+    except np.linalg.LinAlgError:
+        covariance = np.linalg.pinv(A)
+    with np.errstate(invalid='ignore'):
+        return np.sqrt(np.einsum('nkk->nk', covariance) * reduced_chi2[:, np.newaxis])
+
+def _fill_flux(results: np.ndarray, psf_type: type, names: list[str], size: int, amplitude_err: np.ndarray) -> None:
+    """ Flux of the fitted PSFs, summed over a box of `size` around each star. """
+    steps = np.arange(size) - size // 2
+    y = np.round(results['y'])[:, np.newaxis, np.newaxis] + steps[np.newaxis, :, np.newaxis]
+    x = np.round(results['x'])[:, np.newaxis, np.newaxis] + steps[np.newaxis, np.newaxis, :]
+    parameters = {name: results[name][:, np.newaxis, np.newaxis] for name in names}
+    values = _psf_values(psf_type, parameters, y, x, results['y'][:, np.newaxis, np.newaxis], results['x'][:, np.newaxis, np.newaxis])
+
+    results['flux'] = values.sum(axis=(1, 2))
+    if amplitude_err is not None:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            results['flux_err'] = np.abs(results['flux'] * amplitude_err / results['max'])
+    else:
+        results['flux_err'] = np.nan
+
+def _group_job(read, shape: tuple, centers: np.ndarray, psf: PSF, names: list[str], free: list[str], size: int, maxiter: int, dtype: np.dtype) -> tuple:
+    """ Arguments of `_fit_group` for a group of stars, with the section of the image they need, read with `read`. """
+    half = size // 2
+    y_min = max(int(np.round(centers[:, 0].min())) - half, 0)
+    y_max = min(int(np.round(centers[:, 0].max())) + half + 1, shape[0])
+    x_min = max(int(np.round(centers[:, 1].min())) - half, 0)
+    x_max = min(int(np.round(centers[:, 1].max())) + half + 1, shape[1])
+
+    section = np.array(read(y_min, y_max, x_min, x_max), dtype=float)
+    return section, (y_min, x_min), centers, psf, names, free, size, maxiter, dtype
+
+def _fit_group(section: np.ndarray, origin: tuple, centers: np.ndarray, psf: PSF, names: list[str], free: list[str], size: int, maxiter: int, dtype: np.dtype) -> np.ndarray:
+    """ Joint fit of a group of overlapping stars, with a shared background, over `section`. """
+    psf_type, fixed_values = type(psf), {name: value for name, value in psf.parameters.items() if name not in free}
+    n_stars, n_free = len(centers), len(free)
+
+    # Only fit the pixels within the boxes of the stars
+    y, x, inside = _box_indices(centers - origin, size, section.shape)
+    mask = np.zeros(section.shape, dtype=bool)
+    mask[y[inside], x[inside]] = True
+    pixel_y, pixel_x = np.nonzero(mask)
+    data = section[mask]
+
+    box_data = np.zeros(y.shape)
+    box_data[inside] = section[y[inside], x[inside]]
+    background, shape = _initial_parameters(box_data, inside, psf, free)
+    # Parameters: shared background, then y, x and free PSF parameters of each star
+    p0 = np.concatenate([[np.median(background)], np.column_stack([centers - origin, shape]).ravel()])
+
+    def model(p: np.ndarray) -> np.ndarray:
+        stars = p[1:].reshape(n_stars, 2 + n_free)
+        parameters = dict(fixed_values)
+        parameters.update({name: stars[:, 2+i, np.newaxis] for i, name in enumerate(free)})
+        values = _psf_values(psf_type, parameters, pixel_y, pixel_x, stars[:, 0, np.newaxis], stars[:, 1, np.newaxis])
+        return p[0] + values.sum(axis=0)
+
+    # Evaluations are counted here, as `fit.nfev` leaves out those for the Jacobian in some versions of scipy
+    nfev = 0
+    def residuals(p: np.ndarray) -> np.ndarray:
+        nonlocal nfev
+        nfev += 1
+        return model(p) - data
+
+    fit = optimize.least_squares(residuals, p0, method='lm', max_nfev=maxiter * (len(p0) + 1))
+
+    ### RESULTS
+    n_params = len(p0)
+    reduced_chi2 = np.sum(fit.fun**2) / max(len(data) - n_params, 1)
+    errors = _errors((fit.jac.T @ fit.jac)[np.newaxis], np.array([reduced_chi2]))[0]
+    stars, star_errors = fit.x[1:].reshape(n_stars, -1), errors[1:].reshape(n_stars, -1)
+
+    results = np.zeros(n_stars, dtype=dtype)
+    results['y'], results['x'] = stars[:, 0] + origin[0], stars[:, 1] + origin[1]
+    results['y_err'], results['x_err'] = star_errors[:, 0], star_errors[:, 1]
+    results['background'] = fit.x[0]
+    for name, value in fixed_values.items():
+        results[name] = value
+    for i, name in enumerate(free):
+        results[name] = stars[:, 2+i]
+    results['chi2'], results['npix'], results['nfev'] = reduced_chi2, len(data), nfev
+
+    _fill_flux(results, psf_type, names, size, star_errors[:, 2+free.index('max')] if 'max' in free else None)
+    return results
@@ -1,10 +1,13 @@
 from typing import Callable
 import numpy as np
-from scipy import integrate
+from scipy import integrate, special
 from abc import ABC, abstractmethod
 
 coord = tuple[float, float]
 
+# Default number of sub-pixel samples (per axis) used to integrate each pixel in `PSF.render`
+OVERSAMPLE = 3
+
 class PSF(ABC):
     """
     Abstract Class of Point Spread Function. 
@@ -15,6 +18,11 @@ class PSF(ABC):
     def function(self):
         pass
 
+    @property
+    def parameters(self) -> dict:
+        """ Parameters the PSF was made with, e.g. `{'std': 2.0, 'max': 1.0}` """
+        return dict(vars(self))
+
     def counts_pixel(self, center: coord, pixel: coord, pixel_size: tuple=(1,1)):
         """
         Function to get the counts that a pixel on the CCD would have.
@@ -38,6 +46,43 @@ class PSF(ABC):
 
         return integral
 
+    def render(self, center: coord, shape: tuple[int, int], oversample: int=None) -> np.ndarray:
+        """
+        Function to get the counts of every pixel of a grid, for one point light source.
+        Pixel `[y, x]` of the result spans `x..x+1` and `y..y+1`, the same as
+        `counts_pixel(center, (x, y))`.
+         - `center`: tuple of the point light source, `(x, y)`.
+         - `shape`: shape of the grid, `(size_y, size_x)`.
+         - `oversample`: number of sub-pixel samples per axis used to integrate each pixel.
+           The samples are Gauss-Legendre nodes, so 3 samples are already accurate to
+           ~1e-4 of the peak for a Moffat of alpha=2. If none specified, uses `OVERSAMPLE`
+           (or an exact integral, if the PSF has one).
+        """
+        return self.render_batch([center], shape, oversample)[0]
+
+    def render_batch(self, centers, shape: tuple[int, int], oversample: int=None) -> np.ndarray:
+        """
+        Same as `render`, for many point light sources at once.
+         - `centers`: `(N, 2)` array of the point light sources, `(x, y)`.
+
+        Returns: array of shape `(N, size_y, size_x)`, one grid per source.
+        """
+        oversample = oversample if oversample is not None else OVERSAMPLE
+        centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        size_y, size_x = shape
+
+        # Gauss-Legendre nodes and weights over a pixel (0..1), relative to each center
+        nodes, weights = np.polynomial.legendre.leggauss(oversample)
+        nodes, weights = (nodes + 1) / 2, weights / 2
+        x = (np.arange(size_x)[:, np.newaxis] + nodes).ravel() - centers[:, 0, np.newaxis]
+        y = (np.arange(size_y)[:, np.newaxis] + nodes).ravel() - centers[:, 1, np.newaxis]
+
+        values = self.function(np.sqrt(y[:, :, np.newaxis]**2 + x[:, np.newaxis, :]**2))
+        values = values.reshape(len(centers), size_y, oversample, size_x, oversample)
+
+        # Weighted sum of the samples, times the area of a pixel (1)
+        return np.einsum('nyixj,i,j->nyx', values, weights, weights)
+
 
 
 # GAUSSIAN FUNCTION
@@ -63,7 +108,28 @@ class GaussianPSF(PSF):
 
     @property
     def function(self):
-        return lambda r: moffat(r, self.std, self.max)
+        return lambda r: gaussian(r, self.std, self.max)
+
+    def render_batch(self, centers, shape: tuple[int, int], oversample: int=None) -> np.ndarray:
+        """
+        Same as `PSF.render_batch`. Unless `oversample` is given, each pixel is
+        integrated exactly: the gaussian is separable, so the integral over a pixel
+        is the product of two 1-D integrals, which are differences of `erf`.
+        """
+        if oversample is not None:
+            return super().render_batch(centers, shape, oversample)
+
+        centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        size_y, size_x = shape
+
+        # Integral of exp(-u^2 / 2std^2) between pixel edges, per axis
+        scale = self.std * np.sqrt(2)
+        edges_x = special.erf((np.arange(size_x+1) - centers[:, 0, np.newaxis]) / scale)
+        edges_y = special.erf((np.arange(size_y+1) - centers[:, 1, np.newaxis]) / scale)
+        integral_x = np.diff(edges_x, axis=1) * scale * np.sqrt(np.pi) / 2
+        integral_y = np.diff(edges_y, axis=1) * scale * np.sqrt(np.pi) / 2
+
+        return self.max * integral_y[:, :, np.newaxis] * integral_x[:, np.newaxis, :]
 
 
 
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import ndimage
+
+from .grid import Grid
+from .instrumentation import instrument
+
+class BackgroundMesh:
+    """
+    Smooth 2-D background and noise of an image, estimated on a mesh of tiles.
+    The background and noise of each tile are their sigma-clipped median and
+    standard deviation. Only the low-resolution mesh is stored: it is
+    interpolated (bilinearly) to pixel resolution on demand.
+
+    Parameters:
+     - `array`: 2-D numpy array or `Grid` of the image. May be memory-mapped, as it
+        is read one row of tiles at a time (through `Grid.cutout` for a `Grid`).
+     - `tile_size`: Size of the square tiles, in pixels.
+     - `filter_size`: Size of the median filter applied to the mesh, which
+        removes tiles dominated by bright stars. 1 for no filtering.
+     - `sigma`, `maxiters`: Sigma-clipping parameters for each tile.
+     - `workers`: Number of threads used to process the rows of tiles.
+        If none specified, uses the default of `ThreadPoolExecutor`.
+    """
+    @instrument()
+    def __init__(self, array: np.ndarray, tile_size: int=64, filter_size: int=3, sigma: float=3.0, maxiters: int=5, workers: int=None):
+        if isinstance(array, Grid):
+            self.size_y, self.size_x = array.size_y, array.size_x
+            read = lambda y_min, y_max: array.cutout(y_min, y_max, 0, self.size_x)
+        else:
+            if not isinstance(array, np.ndarray): raise TypeError("'array' must be a numpy array or a Grid")
+            if array.ndim != 2: raise ValueError("'array' must be 2-dimensional")
+            self.size_y, self.size_x = array.shape
+            read = lambda y_min, y_max: array[y_min:y_max]
+        if tile_size < 1: raise ValueError("'tile_size' must be positive")
+
+        self.tile_size = tile_size
+        self.sigma = sigma
+        self.maxiters = maxiters
+
+        ### MESH
+        n_rows = -(-self.size_y // tile_size)
+        with ThreadPoolExecutor(workers) as executor:
+            rows = list(executor.map(lambda i: self._tile_row(read(i*tile_size, (i+1)*tile_size)), range(n_rows)))
+
+        background, noise = (np.array(mesh, dtype=np.float32) for mesh in zip(*rows))
+
+        # Tiles without any valid pixel take the value of their neighbours
+        if np.isnan(background).any():
+            nearest = ndimage.distance_transform_edt(np.isnan(background), return_distances=False, return_indices=True)
+            background, noise = background[tuple(nearest)], noise[tuple(nearest)]
+
+        if filter_size > 1:
+            background = ndimage.median_filter(background, filter_size, mode='nearest')
+            noise = ndimage.median_filter(noise, filter_size, mode='nearest')
+
+        # Indexed as (tile y, tile x)
+        self.background_mesh: np.ndarray = background
+        self.noise_mesh: np.ndarray = noise
+
+    def _tile_row(self, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """ Sigma-clipped median and std of each tile in a row of tiles, given its pixel `rows`. """
+        rows = np.array(rows, dtype=float)
+
+        # Pad the last column of tiles, so each tile is one row of `tiles`
+        n_tiles = -(-self.size_x // self.tile_size)
+        padded = np.full((rows.shape[0], n_tiles*self.tile_size), np.nan)
+        padded[:, :self.size_x] = rows
+        tiles = padded.reshape(rows.shape[0], n_tiles, self.tile_size).transpose(1, 0, 2).reshape(n_tiles, -1)
+
+        # Sigma-clip all the tiles at once. Once each tile is sorted, the pixels kept
+        # by the clipping are always a contiguous range `[lo, hi)` of the sorted tile,
+        # so the median and std of that range are read off directly.
+        tiles = np.sort(tiles, axis=1)
+        index = np.arange(n_tiles)
+        lo, hi = np.zeros(n_tiles, dtype=int), np.count_nonzero(~np.isnan(tiles), axis=1)
+
+        # Cumulative sums (relative to the middle value, for precision) give the std of any range
+        reference = tiles[index, np.maximum(hi - 1, 0) // 2, np.newaxis]
+        centered = np.nan_to_num(tiles - reference)
+        sums = np.concatenate([np.zeros((n_tiles, 1)), np.cumsum(centered, axis=1)], axis=1)
+        squares = np.concatenate([np.zeros((n_tiles, 1)), np.cumsum(centered**2, axis=1)], axis=1)
+
+        for _ in range(self.maxiters + 1):
+            n = np.maximum(hi - lo, 1)
+            middle_lo = np.clip((lo + hi - 1) // 2, 0, tiles.shape[1] - 1)
+            middle_hi = np.clip((lo + hi) // 2, 0, tiles.shape[1] - 1)
+            median = (tiles[index, middle_lo] + tiles[index, middle_hi]) / 2
+            mean = (sums[index, hi] - sums[index, lo]) / n
+            std = np.sqrt(np.maximum((squares[index, hi] - squares[index, lo]) / n - mean**2, 0))
+            std[hi == lo] = np.nan
+
+            # Range of the pixels within `sigma` standard deviations of the median
+            with np.errstate(invalid='ignore'):
+                new_lo = np.count_nonzero(tiles < (median - self.sigma * std)[:, np.newaxis], axis=1)
+                new_hi = np.count_nonzero(tiles <= (median + self.sigma * std)[:, np.newaxis], axis=1)
+
+            if np.array_equal(new_lo, lo) and np.array_equal(new_hi, hi):
+                break
+            lo, hi = new_lo, np.maximum(new_hi, new_lo)
+
+        return np.where(hi > lo, median, np.nan), std
+
+    def _interpolate(self, mesh: np.ndarray, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """ Bilinear interpolation of `mesh` at pixel coordinates `y`, `x`. """
+        # Tile centers are at pixel (i + 0.5) * tile_size - 0.5
+        y, x = np.broadcast_arrays(np.asarray(y, dtype=float), np.asarray(x, dtype=float))
+        mesh_y = (y + 0.5) / self.tile_size - 0.5
+        mesh_x = (x + 0.5) / self.tile_size - 0.5
+
+        return ndimage.map_coordinates(mesh, [mesh_y, mesh_x], order=1, mode='nearest')
+
+    def at(self, y, x) -> np.ndarray:
+        """ Background at the pixel coordinates `y`, `x` (floats or arrays). """
+        return self._interpolate(self.background_mesh, np.atleast_1d(y), np.atleast_1d(x))
+
+    def noise_at(self, y, x) -> np.ndarray:
+        """ Noise (standard deviation) at the pixel coordinates `y`, `x` (floats or arrays). """
+        return self._interpolate(self.noise_mesh, np.atleast_1d(y), np.atleast_1d(x))
+
+    def error_at(self, y, x) -> np.ndarray:
+        """
+        Uncertainty of the background at the pixel coordinates `y`, `x` (floats or arrays):
+        the standard error of the median of a tile, `sqrt(pi / 2) * noise / tile_size`.
+        """
+        return np.sqrt(np.pi / 2) * self.noise_at(y, x) / self.tile_size
+
+    def cutout(self, y_min: int, y_max: int, x_min: int, x_max: int) -> np.ndarray:
+        """ Background map of the section `[y_min:y_max, x_min:x_max]` of the image, clipped to its bounds. """
+        y, x = np.mgrid[max(y_min, 0):min(y_max, self.size_y), max(x_min, 0):min(x_max, self.size_x)]
+        return self._interpolate(self.background_mesh, y, x)
+
+    def noise_cutout(self, y_min: int, y_max: int, x_min: int, x_max: int) -> np.ndarray:
+        """ Noise map of the section `[y_min:y_max, x_min:x_max]` of the image, clipped to its bounds. """
+        y, x = np.mgrid[max(y_min, 0):min(y_max, self.size_y), max(x_min, 0):min(x_max, self.size_x)]
+        return self._interpolate(self.noise_mesh, y, x)
+
+    @property
+    def background(self) -> np.ndarray:
+        """ Full resolution background map. """
+        return self.cutout(0, self.size_y, 0, self.size_x)
+
+    @property
+    def noise(self) -> np.ndarray:
+        """ Full resolution noise map. """
+        return self.noise_cutout(0, self.size_y, 0, self.size_x)
@@ -0,0 +1,110 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .images.wcs import WCS
+
+def unit_vectors(ra, dec) -> np.ndarray:
+    """ Unit vectors `(N, 3)` on the celestial sphere of (RA, DEC) in degrees. """
+    ra, dec = np.radians(np.asarray(ra, dtype=float)).ravel(), np.radians(np.asarray(dec, dtype=float)).ravel()
+    cos_dec = np.cos(dec)
+    return np.column_stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)])
+
+def _chord(separation: float) -> float:
+    """ Straight-line distance between unit vectors `separation` (arcseconds) apart. """
+    return 2 * np.sin(np.radians(separation / 3600) / 2)
+
+def _separation(chord: np.ndarray) -> np.ndarray:
+    """ Angular separation (arcseconds) of unit vectors a straight-line distance `chord` apart. """
+    return np.degrees(2 * np.arcsin(np.clip(chord / 2, 0, 1))) * 3600
+
+class Catalogue:
+    """
+    Catalogue of sky positions indexed for fast matching. Positions are stored
+    as unit vectors in a KD-tree, so distances are exact at any declination
+    (including the poles and RA = 0/360). Build it once, and match many frames
+    against it.
+
+    Parameters:
+     - `ra`, `dec`: arrays of the positions of the catalogue, in degrees.
+    """
+    def __init__(self, ra, dec):
+        ra, dec = np.asarray(ra, dtype=float).ravel(), np.asarray(dec, dtype=float).ravel()
+        if ra.shape != dec.shape: raise ValueError("'ra' and 'dec' must have the same length")
+
+        self.ra, self.dec = ra, dec
+        # Unbalanced, non-compact trees build several times faster for large catalogues
+        self.tree = cKDTree(unit_vectors(ra, dec), balanced_tree=False, compact_nodes=False)
+
+    def __len__(self) -> int:
+        return len(self.ra)
+
+    def __repr__(self) -> str:
+        return f'Catalogue of {len(self)} positions'
+
+    def match(self, ra, dec, radius: float, unique: bool=False, workers: int=1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest entry of the catalogue to each position, within `radius`.
+
+        Parameters:
+         - `ra`, `dec`: arrays of the positions to match, in degrees.
+         - `radius`: maximum separation of a match, in arcseconds.
+         - `unique`: if `True`, each entry of the catalogue is matched at most once
+            (to the nearest position), and the other positions are left unmatched.
+         - `workers`: number of threads used for the queries (-1 for all the cores).
+
+        Returns: index of the matched entry of the catalogue (-1 if none), and the
+        separation in arcseconds (infinite if none), one per position.
+        """
+        distance, index = self.tree.query(unit_vectors(ra, dec), distance_upper_bound=_chord(radius), workers=workers)
+
+        matched = np.isfinite(distance)
+        index = np.where(matched, index, -1)
+        separation = np.where(matched, _separation(np.where(matched, distance, 0)), np.inf)
+
+        if unique and matched.any():
+            # Keep the nearest position for each entry of the catalogue
+            order = np.flatnonzero(matched)
+            order = order[np.argsort(separation[order], kind='stable')]
+            _, first = np.unique(index[order], return_index=True)
+            duplicate = np.ones(len(order), dtype=bool)
+            duplicate[first] = False
+
+            index[order[duplicate]] = -1
+            separation[order[duplicate]] = np.inf
+
+        return index, separation
+
+    def within(self, ra, dec, radius: float) -> list[np.ndarray]:
+        """
+        All the entries of the catalogue within `radius` (arcseconds) of each position.
+        Returns: one array of indices of the catalogue per position.
+        """
+        return [np.asarray(indices, dtype=int) for indices in self.tree.query_ball_point(unit_vectors(ra, dec), _chord(radius))]
+
+def crossmatch(ra1, dec1, ra2, dec2, radius: float, unique: bool=False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Matches each position `(ra1, dec1)` to the nearest position `(ra2, dec2)` within
+    `radius` (arcseconds). For repeated matches against the same positions, build a
+    `Catalogue` once instead.
+
+    Returns: see `Catalogue.match`.
+    """
+    return Catalogue(ra2, dec2).match(ra1, dec1, radius, unique)
+
+def match_pixels(wcs: WCS, centers, catalogue: Catalogue, radius: float, unique: bool=True) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Matches stars detected in an image (e.g. from `get_star_coords` or `detect_stars`)
+    to a catalogue.
+
+    Parameters:
+     - `wcs`: `WCS` of the image.
+     - `centers`: `(N, 2)` array of the `(y, x)` coordinates of the stars.
+     - `catalogue`: `Catalogue` to match against.
+     - `radius`: maximum separation of a match, in arcseconds.
+     - `unique`: see `Catalogue.match`.
+
+    Returns: see `Catalogue.match`.
+    """
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    coords = wcs.pixel_to_world(centers[:, 0], centers[:, 1])
+    return catalogue.match(coords[:, 0], coords[:, 1], radius, unique)
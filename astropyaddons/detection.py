@@ -0,0 +1,163 @@
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import ndimage
+
+from .background import BackgroundMesh
+from .grid import Grid
+from .instrumentation import instrument
+
+# Columns of the table returned by `detect_stars`. Coordinates are in pixels, (y, x).
+#  - `y`, `x`: sub-pixel centroid of the star.
+#  - `y_peak`, `x_peak`: pixel of the local maximum.
+#  - `peak`: background-subtracted value at the peak.
+#  - `flux`: background-subtracted sum over the centroid box.
+#  - `sigma_y`, `sigma_x`: second moments (widths) over the centroid box.
+#  - `ellipticity`: 1 - (minor width / major width).
+#  - `npix`: number of pixels of the local maximum (more than 1 for flat peaks).
+DETECTION_DTYPE = np.dtype([
+    ('y', float), ('x', float),
+    ('y_peak', int), ('x_peak', int),
+    ('peak', float), ('flux', float),
+    ('sigma_y', float), ('sigma_x', float),
+    ('ellipticity', float), ('npix', int),
+])
+
+@instrument()
+def detect_stars(array, threshold: float, reference, tile_size: int=1024, filter_size: int=5, box: int=3, workers: int=None) -> np.ndarray:
+    """
+    Detects stars as the local maxima above a threshold, splitting the image
+    into overlapping tiles which are processed in parallel.
+
+    Parameters:
+     - `array`: 2-D numpy array or `Grid` of the image.
+     - `threshold`: multiple of `reference` for the minimum value for a star.
+     - `reference`: background level, either a `float` (e.g. the median of the
+        image) or a `BackgroundMesh` for a background varying across the image.
+     - `tile_size`: size of the square tiles processed in parallel.
+     - `filter_size`: size of the neighbourhood a local maximum is brightest in.
+     - `box`: half-size of the box the centroid and shape are measured in.
+     - `workers`: number of threads. If none specified, uses the default of
+        `ThreadPoolExecutor`.
+
+    Returns: structured numpy array with one row per star (see `DETECTION_DTYPE`),
+    sorted by `(y_peak, x_peak)`.
+    """
+    if isinstance(array, Grid):
+        size_y, size_x = array.size_y, array.size_x
+        read = array.cutout
+    elif isinstance(array, np.ndarray) and array.ndim == 2:
+        size_y, size_x = array.shape
+        read = lambda y_min, y_max, x_min, x_max: array[y_min:y_max, x_min:x_max]
+    else:
+        raise TypeError("'array' must be a 2-dimensional numpy array or a Grid")
+
+    if tile_size < 1: raise ValueError("'tile_size' must be positive")
+
+    # Each tile is read with a halo around it, so that the maxima and centroids of the
+    # pixels it owns are the same as on the full image (the halo is grown for flat peaks
+    # wider than it, see `_detect_tile`). Each star is only kept by the
+    # tile owning its peak, which removes duplicates along the seams.
+    halo = max(filter_size // 2, box) + 2
+    tiles = [(y, min(y+tile_size, size_y), x, min(x+tile_size, size_x))
+             for y in range(0, size_y, tile_size) for x in range(0, size_x, tile_size)]
+
+    def detect_tile(tile):
+        return _detect_tile(read, (size_y, size_x), tile, halo, threshold, reference, filter_size, box)
+
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(detect_tile, tiles))
+
+    stars = np.concatenate([stars for stars, _ in results]) if results else np.zeros(0, dtype=DETECTION_DTYPE)
+    stars = stars[np.lexsort((stars['x_peak'], stars['y_peak']))]
+
+    n_flat = sum(n for _, n in results)
+    if n_flat:
+        warnings.warn(f"{n_flat} stars were not identified as a single point.", stacklevel=3)
+
+    return stars
+
+def _detect_tile(read, shape: tuple, tile: tuple, halo: int, threshold: float, reference, filter_size: int, box: int) -> tuple[np.ndarray, int]:
+    """
+    Detects the stars owned by one tile `(y_min, y_max, x_min, x_max)`.
+    Returns: the stars, and the number of them which were not a single point.
+    """
+    size_y, size_x = shape
+    y_min, y_max, x_min, x_max = tile
+
+    # Reads the tile with its halo, which is grown until no maximum reaching into the
+    # tile is cut by an inner edge of the section (e.g. flat peaks wider than the halo),
+    # so that every tile sees the whole of the maxima it may own.
+    while True:
+        section_y, section_x = max(y_min - halo, 0), max(x_min - halo, 0)
+        section_y_max, section_x_max = min(y_max + halo, size_y), min(x_max + halo, size_x)
+        data = np.asarray(read(section_y, section_y_max, section_x, section_x_max), dtype=float)
+
+        if isinstance(reference, BackgroundMesh):
+            sky = reference.cutout(section_y, section_y_max, section_x, section_x_max)
+        else:
+            sky = reference
+
+        ### LOCAL MAXIMA
+        data_max = ndimage.maximum_filter(data, filter_size) #Sets each pixel value to the brightest pixel value nearby
+        maxima = (data > threshold*sky) & (data == data_max) #`True` for the local maxima
+
+        labeled, _ = ndimage.label(maxima) #Assigns different values for each local maxima
+        slices = ndimage.find_objects(labeled) #Gets positions of labels
+
+        if not slices:
+            return np.zeros(0, dtype=DETECTION_DTYPE), 0
+
+        starts_y, stops_y, starts_x, stops_x = np.array([(dy.start, dy.stop, dx.start, dx.stop) for dy, dx in slices]).T
+        cut = ((starts_y == 0) & (section_y > 0)) | ((stops_y == data.shape[0]) & (section_y_max < size_y)) \
+            | ((starts_x == 0) & (section_x > 0)) | ((stops_x == data.shape[1]) & (section_x_max < size_x))
+        in_tile = (starts_y + section_y < y_max) & (stops_y + section_y > y_min) \
+            & (starts_x + section_x < x_max) & (stops_x + section_x > x_min)
+        if not np.any(cut & in_tile):
+            break
+        halo *= 2
+
+    peak_y = (starts_y + stops_y - 1) // 2
+    peak_x = (starts_x + stops_x - 1) // 2
+    flat = (stops_y - starts_y != 1) | (stops_x - starts_x != 1)
+    npix = np.bincount(labeled.ravel(), minlength=len(slices)+1)[1:]
+
+    # Only keep the stars owned by this tile
+    owned = (y_min <= peak_y + section_y) & (peak_y + section_y < y_max) \
+        & (x_min <= peak_x + section_x) & (peak_x + section_x < x_max)
+    peak_y, peak_x, flat, npix = peak_y[owned], peak_x[owned], flat[owned], npix[owned]
+
+    ### CENTROIDS AND SHAPES
+    # Background-subtracted boxes around each peak, shape (stars, 2*box+1, 2*box+1).
+    # Pixels of the box outside of the image have no weight.
+    steps = np.arange(-box, box+1)
+    box_y = peak_y[:, np.newaxis, np.newaxis] + steps[np.newaxis, :, np.newaxis]
+    box_x = peak_x[:, np.newaxis, np.newaxis] + steps[np.newaxis, np.newaxis, :]
+    box_y, box_x = np.broadcast_arrays(box_y, box_x)
+    inside = (box_y >= 0) & (box_y < data.shape[0]) & (box_x >= 0) & (box_x < data.shape[1])
+
+    signal = data - sky
+    weights = np.where(inside, np.maximum(signal[np.clip(box_y, 0, data.shape[0]-1), np.clip(box_x, 0, data.shape[1]-1)], 0), 0)
+    total = weights.sum(axis=(1, 2))
+    safe_total = np.where(total > 0, total, 1)
+
+    diff_y = box_y - peak_y[:, np.newaxis, np.newaxis]
+    diff_x = box_x - peak_x[:, np.newaxis, np.newaxis]
+    offset_y = (weights * diff_y).sum(axis=(1, 2)) / safe_total
+    offset_x = (weights * diff_x).sum(axis=(1, 2)) / safe_total
+
+    sigma_y = np.sqrt(np.maximum((weights * (diff_y - offset_y[:, np.newaxis, np.newaxis])**2).sum(axis=(1, 2)) / safe_total, 0))
+    sigma_x = np.sqrt(np.maximum((weights * (diff_x - offset_x[:, np.newaxis, np.newaxis])**2).sum(axis=(1, 2)) / safe_total, 0))
+
+    stars = np.zeros(len(peak_y), dtype=DETECTION_DTYPE)
+    stars['y_peak'], stars['x_peak'] = peak_y + section_y, peak_x + section_x
+    stars['y'], stars['x'] = stars['y_peak'] + offset_y, stars['x_peak'] + offset_x
+    stars['peak'] = signal[peak_y, peak_x]
+    stars['flux'] = total
+    stars['sigma_y'], stars['sigma_x'] = sigma_y, sigma_x
+    with np.errstate(invalid='ignore'):
+        stars['ellipticity'] = 1 - np.minimum(sigma_y, sigma_x) / np.maximum(sigma_y, sigma_x)
+    stars['npix'] = npix
+
+    return stars, np.count_nonzero(flat)
@@ -1,5 +1,40 @@
 import numpy as np
 
+from .statistics import MAX_SAMPLES, StatisticsCache, subsample
+
+READ_ONLY_MESSAGE = ("the pixels of a Grid are read-only, so that its cached statistics stay valid. "
+                     "Write pixels with `grid[y, x] = value` (`image.grid[y, x] = value`), "
+                     "or assign a new array with `grid.grid = array` (`image.data = array`)")
+
+class ReadOnlyArray(np.ndarray):
+    """
+    Read-only view of the pixels of a `Grid`. Writing to it raises a `ValueError`
+    explaining how to modify the grid, instead of the generic error of numpy.
+    The results of operations on it are plain numpy arrays.
+    """
+    def __setitem__(self, key, value):
+        if not self.flags.writeable: raise ValueError(READ_ONLY_MESSAGE)
+        super().__setitem__(key, value)
+
+    def __array_wrap__(self, array, context=None, return_scalar=False):
+        array = array.view(np.ndarray)
+        return array[()] if return_scalar else array
+
+def _in_place(name: str):
+    """ In-place operator `name` of numpy arrays, raising `READ_ONLY_MESSAGE` on read-only arrays """
+    operator = getattr(np.ndarray, name)
+
+    def method(self, other):
+        if not self.flags.writeable: raise ValueError(READ_ONLY_MESSAGE)
+        return operator(self, other)
+
+    method.__name__ = name
+    return method
+
+for _name in ('__iadd__', '__isub__', '__imul__', '__itruediv__', '__ifloordiv__', '__imod__',
+              '__ipow__', '__imatmul__', '__iand__', '__ior__', '__ixor__', '__ilshift__', '__irshift__'):
+    setattr(ReadOnlyArray, _name, _in_place(_name))
+
 class Grid:
     """
     Grid of pixels made from a 2-D numpy array. This grid contains
@@ -8,26 +43,142 @@ class Grid:
 
     Parameters:
      - `array`: A 2-D numpy array to make a Grid object from.
+        May be memory-mapped, in which case it is never fully read
+        unless a full-frame quantity is requested.
+     - `scale`: Optional. Scale applied to the stored values (`BSCALE`).
+     - `offset`: Optional. Offset applied to the stored values (`BZERO`).
+     - `statistics_mode`: Optional. How `median`, `std`, etc. are computed:
+        `'exact'`, `'approximate'` (subsampled) or `'clipped'` (subsampled
+        and sigma-clipped). See `astropyaddons.statistics.MODES`.
+
+    Statistics are computed once and cached. The cache is cleared when the
+    grid is replaced (`grid.grid = array`) or written to (`grid[y, x] = value`),
+    which also increments `grid.generation` for caches kept outside of the grid.
+    `grid.grid` is a read-only view, so it cannot be modified in place behind the
+    cache, and `cutout` and `take` return copies. After modifying the array given
+    to the grid directly, call `grid.invalidate()`.
     """
-    def __init__(self, array: np.ndarray):
+    def __init__(self, array: np.ndarray, scale: float=1.0, offset: float=0.0, statistics_mode: str='exact'):
         if not isinstance(array, np.ndarray): raise TypeError("'array' must be a numpy array")
         if array.ndim != 2: raise ValueError("'array' must be 2-dimensional")
 
         # Data is indexed as (y, x)
-        self.grid: np.ndarray = array
-        self.size_y, self.size_x = np.shape(self.grid)
+        self.raw: np.ndarray = array
+        self.scale: float = float(scale)
+        self.offset: float = float(offset)
+        self.size_y, self.size_x = np.shape(self.raw)
+
+        # Scaled values, only computed when needed
+        self._grid: np.ndarray = None
+
+        # Statistics of the grid, only computed when needed
+        self._statistics = StatisticsCache(lambda: self.grid, statistics_mode, self.sample)
+
+        # Number of times the pixel values changed
+        self.generation: int = 0
+
+    def _values(self) -> np.ndarray:
+        """ Array holding the pixel values. Scaled data is promoted to floating point on first access. """
+        if self.scale == 1 and self.offset == 0:
+            return self.raw
+
+        if self._grid is None:
+            self._grid = self.raw * self.scale + self.offset
+        return self._grid
+
+    @property
+    def grid(self) -> np.ndarray:
+        """ Pixel values of the grid, as a read-only view. Write with `grid[y, x] = value`. """
+        view = self._values().view(ReadOnlyArray)
+        view.flags.writeable = False
+        return view
+
+    @grid.setter
+    def grid(self, array: np.ndarray):
+        if not isinstance(array, np.ndarray): raise TypeError("'array' must be a numpy array")
+        if array.shape != (self.size_y, self.size_x): raise ValueError("'array' must have the same shape as the grid")
+
+        self.raw = array
+        self.scale, self.offset = 1.0, 0.0
+        self._grid = None
+        self.invalidate()
+
+    def __getitem__(self, key):
+        return self.grid[key]
+
+    def __setitem__(self, key, value):
+        self._values()[key] = value
+        self.invalidate()
+
+    @property
+    def statistics_mode(self) -> str:
+        return self._statistics.mode
+
+    @statistics_mode.setter
+    def statistics_mode(self, mode: str):
+        self._statistics.mode = mode
+
+    def invalidate(self) -> None:
+        """ Clears the cached statistics. Call after modifying the array given to the grid in place. """
+        self._statistics.invalidate()
+        self.generation += 1
+
+    def cutout(self, y_min: int, y_max: int, x_min: int, x_max: int) -> np.ndarray:
+        """
+        Copy of the pixel values of the section `[y_min:y_max, x_min:x_max]` as floating
+        point, clipped to the bounds of the grid. Only the section is read from `self.raw`.
+        """
+        y_min, x_min = max(y_min, 0), max(x_min, 0)
+
+        if self._grid is not None:
+            return self._grid[y_min:y_max, x_min:x_max].copy()
+
+        return self.raw[y_min:y_max, x_min:x_max] * self.scale + self.offset
+
+    def sample(self, max_samples: int=MAX_SAMPLES) -> np.ndarray:
+        """
+        Regular subsample of the pixel values as floating point (see `subsample`).
+        Only the sampled pixels of `self.raw` are read and scaled, so the subsampled
+        statistics of scaled (e.g. memory-mapped integer) data never promote the whole grid.
+        """
+        if self._grid is not None or (self.scale == 1 and self.offset == 0):
+            return subsample(self._values(), max_samples)
+
+        values = subsample(self.raw, max_samples)
+        values *= self.scale
+        values += self.offset
+        return values
+
+    def take(self, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """
+        Copy of the pixel values at the index arrays `y`, `x` as floating point.
+        Only those pixels are read from `self.raw`.
+        """
+        if self._grid is not None:
+            return self._grid[y, x]
+
+        return self.raw[y, x] * self.scale + self.offset
 
     @property
     def std(self) -> float:
-        return np.std(self.grid)
+        return self._statistics['std']
 
     @property
     def mean(self) -> float:
-        return np.mean(self.grid)
+        return self._statistics['mean']
 
     @property
     def median(self) -> float:
-        return np.median(self.grid)
+        return self._statistics['median']
+
+    @property
+    def mad(self) -> float:
+        """ Median absolute deviation """
+        return self._statistics['mad']
+
+    def percentile(self, q: float) -> float:
+        """ `q`-th percentile of the grid (0 <= q <= 100) """
+        return self._statistics.percentile(q)
 
 
 
@@ -43,5 +194,5 @@ class EmptyGrid(Grid):
         if not isinstance(size_y, int): raise TypeError("size_y must be an integer")
         if not isinstance(size_x, int): raise TypeError("size_x must be an integer")
 
-        # y then x, as it will be transposed in `Grid.__init__()`
-        super().__init__(self, np.empty((size_y, size_x)))
\ No newline at end of file
+        # Indexed as (y, x), filled with zeros so that it can be drawn on
+        super().__init__(np.zeros((size_y, size_x)))
\ No newline at end of file
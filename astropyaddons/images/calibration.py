@@ -0,0 +1,204 @@
+import os
+
+from astropy.io import fits
+import numpy as np
+
+from ..grid import Grid
+from ..instrumentation import instrument
+from ..stacking import stack
+from ..statistics import subsample
+from .fitsimage import FITSImage
+from .header import Header
+
+# Kinds of master frames
+MASTERS = ('bias', 'dark', 'flat')
+
+# Rows calibrated at once, which bounds the size of the temporaries
+CHUNK_ROWS = 256
+
+class Calibration:
+    """
+    CCD calibration with master bias, dark and flat frames. Masters are built
+    out-of-core from the raw frames (see `astropyaddons.stacking.stack`) and
+    cached as FITS files in `directory`, keyed by the header values they depend on:
+     - bias: `CCD-TEMP`.
+     - dark: `CCD-TEMP`. Stored as the dark current per second, so it applies to any `EXPTIME`.
+     - flat: `FILTER` and `CCD-TEMP`. Normalised to a median of 1.
+
+    Masters are looked up by the header of each frame to calibrate, so a single
+    `Calibration` serves a whole night with several filters:
+
+        calibration = Calibration('masters/')
+        calibration.build('bias', bias_files)
+        calibration.build('dark', dark_files)
+        calibration.build('flat', flat_files)
+        calibration.apply(image) # image.grid is now calibrated
+
+    Parameters:
+     - `directory`: directory the masters are saved to and loaded from.
+     - `temperature_step`: `CCD-TEMP` is rounded to this step (degrees) when
+        matching frames to masters. Frames without `CCD-TEMP` match masters without it.
+     - `workers`: number of threads used to build the masters.
+    """
+    def __init__(self, directory: str, temperature_step: float=1.0, workers: int=None):
+        if temperature_step <= 0: raise ValueError("'temperature_step' must be positive")
+
+        self.directory = directory
+        self.temperature_step = temperature_step
+        self.workers = workers
+        os.makedirs(directory, exist_ok=True)
+
+        # Masters loaded in memory, by key
+        self._masters: dict = {}
+
+    def _key(self, kind: str, header: Header) -> tuple:
+        if kind not in MASTERS: raise ValueError(f"Master {kind} does not exist.")
+
+        temperature = None
+        if header.ccdtemp is not None:
+            temperature = float(np.round(float(header.ccdtemp) / self.temperature_step) * self.temperature_step)
+        return (kind, header.filter if kind == 'flat' else None, temperature)
+
+    def _path(self, key: tuple) -> str:
+        kind, filter, temperature = key
+        name = kind
+        if filter is not None:
+            name += f'_{filter}'
+        if temperature is not None:
+            name += f'_T{temperature:+g}'
+        return os.path.join(self.directory, name + '.fits')
+
+    def master(self, kind: str, header: Header) -> np.ndarray:
+        """
+        Master `kind` (`'bias'`, `'dark'` or `'flat'`) matching a frame with `header`,
+        as a float32 array. Returns `None` if it has not been built.
+        """
+        key = self._key(kind, header)
+        if key not in self._masters:
+            path = self._path(key)
+            if not os.path.exists(path):
+                return None
+            self._masters[key] = fits.getdata(path).astype(np.float32)
+        return self._masters[key]
+
+    @instrument()
+    def build(self, kind: str, filepaths: list[str], method: str='median', rebuild: bool=False) -> np.ndarray:
+        """
+        Builds a master from raw frames, and caches it. The frames must share the
+        header values of the master (see `Calibration`), which are taken from the first one.
+        Darks and flats are calibrated with the masters already built: build the bias
+        first, then the dark, then the flats.
+
+        Parameters:
+         - `kind`: `'bias'`, `'dark'` or `'flat'`.
+         - `filepaths`: FITS files of the raw frames.
+         - `method`: how the frames are combined (see `astropyaddons.stacking.METHODS`).
+         - `rebuild`: if `True`, rebuilds the master even if it is cached.
+
+        Returns: the master, as a float32 array.
+        """
+        header = Header(fits.getheader(filepaths[0]))
+        key = self._key(kind, header)
+        path = self._path(key)
+        if not rebuild and self.master(kind, header) is not None:
+            return self._masters[key]
+
+        bias = self.master('bias', header) if kind != 'bias' else None
+        dark = self.master('dark', header) if kind == 'flat' else None
+        if kind != 'bias' and bias is None:
+            print(f"Warning: no master bias for {path}. The {kind} is not bias-subtracted.")
+
+        scales = None
+        if kind == 'dark':
+            # Dark current per second
+            scales = [1 / float(fits.getheader(filepath).get('EXPTIME', 1.0) or 1.0) for filepath in filepaths]
+        elif kind == 'flat':
+            # Each flat is normalised by its (approximate) median level before combining
+            scales = [1 / self._level(filepath, bias, dark) for filepath in filepaths]
+
+        master = stack(filepaths, method=method, scales=scales, bias=bias, dark=dark, workers=self.workers)
+        data = master.grid.grid
+
+        if kind == 'flat':
+            data = data / np.nanmedian(subsample(data))
+            # Dead pixels give NaN rather than infinite values once divided
+            data[~(data > 0)] = np.nan
+
+        for name, value in zip(('MASTER', 'FILTER', 'CCD-TEMP'), key):
+            if value is not None:
+                master.header.header[name] = value
+        fits.PrimaryHDU(data.astype(np.float32), header=master.header.header).writeto(path, overwrite=True)
+
+        self._masters[key] = data.astype(np.float32)
+        return self._masters[key]
+
+    @staticmethod
+    def _level(filepath: str, bias: np.ndarray, dark: np.ndarray) -> float:
+        """ Approximate median of a flat, after bias and dark subtraction. """
+        with fits.open(filepath, memmap=True, do_not_scale_image_data=True) as images:
+            header = images[0].header
+            level = np.median(subsample(images[0].data)) * float(header.get('BSCALE', 1.0)) + float(header.get('BZERO', 0.0))
+            exptime = float(header.get('EXPTIME', 0.0))
+
+        if bias is not None:
+            level -= np.median(subsample(bias))
+        if dark is not None:
+            level -= np.median(subsample(dark)) * exptime
+        if level <= 0: raise ValueError(f"Flat {filepath} has no signal above the bias and dark")
+        return level
+
+    @instrument()
+    def apply(self, image, header: Header=None, bias: bool=True, dark: bool=True, flat: bool=True) -> Grid:
+        """
+        Calibrates an image in place: `(data - bias - dark * EXPTIME) / flat`.
+        The data is converted to float32 once if needed (e.g. for integer or
+        memory-mapped data), and then calibrated a few rows at a time, without
+        full-frame temporaries. The statistics of the grid are invalidated.
+
+        Parameters:
+         - `image`: `FITSImage` or `Grid` to calibrate.
+         - `header`: `Header` of the image. Only needed for a `Grid`.
+         - `bias`, `dark`, `flat`: which corrections to apply. Corrections without a
+            matching master are skipped with a warning.
+
+        Returns: the calibrated `Grid`.
+        """
+        if isinstance(image, FITSImage):
+            grid, header = image.grid, header if header is not None else image.header
+        elif isinstance(image, Grid):
+            grid = image
+        else:
+            raise TypeError("'image' must be a FITSImage or a Grid")
+        if header is None: raise ValueError("The header of a Grid must be given")
+
+        masters = {}
+        for kind, wanted in zip(MASTERS, (bias, dark, flat)):
+            if wanted:
+                masters[kind] = self.master(kind, header)
+                if masters[kind] is None:
+                    print(f"Warning: no master {kind} matches {header.filter}, CCD-TEMP {header.ccdtemp}. It is skipped.")
+                elif masters[kind].shape != (grid.size_y, grid.size_x):
+                    raise ValueError(f"The master {kind} does not have the same shape as the image")
+        exptime = np.float32(header.exptime or 0.0)
+
+        # Writable float32 data, converted (once) only if needed. The rows are read through
+        # the grid, so that pixels already written to a scaled grid are kept.
+        data = grid.raw
+        if data.dtype != np.float32 or not data.flags.writeable or grid.scale != 1 or grid.offset != 0:
+            data = np.empty(grid.raw.shape, dtype=np.float32)
+            for y in range(0, grid.size_y, CHUNK_ROWS):
+                data[y:y+CHUNK_ROWS] = grid.cutout(y, y+CHUNK_ROWS, 0, grid.size_x)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for y in range(0, grid.size_y, CHUNK_ROWS):
+                rows = data[y:y+CHUNK_ROWS]
+                if masters.get('bias') is not None:
+                    rows -= masters['bias'][y:y+CHUNK_ROWS]
+                if masters.get('dark') is not None:
+                    rows -= masters['dark'][y:y+CHUNK_ROWS] * exptime
+                if masters.get('flat') is not None:
+                    rows /= masters['flat'][y:y+CHUNK_ROWS]
+
+        # Replaces the data (and clears the cached statistics)
+        grid.grid = data
+        return grid
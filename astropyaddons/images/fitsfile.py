@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from astropy.io import fits
+
+from .fitsimage import FITSImage
+from .header import Header
+
+class FITSFile:
+    """
+    FITS file with one or many images (e.g. the extensions of a mosaic camera).
+    The file is opened once, and each image is only loaded as a `FITSImage`
+    (with its own `Header`, `Grid` and `WCS`) when it is first accessed.
+
+    Use as a context manager, or call `close()` when done:
+
+        with FITSFile(filepath) as file:
+            for image in file:
+                ...
+
+    Parameters:
+     - `filepath`: filepath of FITS file to open.
+     - `memmap`: if `True` (default), the pixel data is memory-mapped, so that
+        images (or sections of them) are only read when needed.
+     - `statistics_mode`: how the statistics of each grid are computed (see `Grid`).
+    """
+    def __init__(self, filepath, memmap: bool=True, statistics_mode: str='exact'):
+        self.filepath = filepath
+        self.memmap = memmap
+        self.statistics_mode = statistics_mode
+
+        # When memory-mapping, scaling is left to the `Grid` (see `FITSImage`)
+        self.hdus: fits.HDUList = fits.open(filepath, memmap=memmap, do_not_scale_image_data=memmap)
+
+        # Indices of the HDUs holding an image. Only the headers are read.
+        self.ids: list[int] = [id for id, hdu in enumerate(self.hdus)
+                               if hdu.is_image and hdu.header.get('NAXIS', 0) >= 2]
+
+        # Loaded images, by index in `self.ids`
+        self._images: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> FITSImage:
+        """ `index`-th image of the file (the HDUs without an image are skipped). """
+        id = self.ids[index]
+        if id not in self._images:
+            self._images[id] = FITSImage.from_hdu(self.hdus[id], self.memmap, self.statistics_mode)
+        return self._images[id]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return f'FITSFile {self.filepath} with {len(self)} images'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+        return False
+
+    @property
+    def headers(self) -> list[Header]:
+        """ Headers of the images, without loading their data. """
+        return [Header(self.hdus[id].header) for id in self.ids]
+
+    def map(self, function, workers: int=None) -> list:
+        """
+        Applies `function` to every image of the file in parallel threads,
+        e.g. `file.map(lambda image: detect_stars(image.grid, 2.5, image.grid.median))`.
+
+        The images are loaded in this thread first (the HDUs of a file cannot be
+        loaded concurrently), so the threads only share the memory-mapped data.
+
+        Parameters:
+         - `function`: function taking a `FITSImage`.
+         - `workers`: number of threads. If none specified, uses the default of
+            `ThreadPoolExecutor`.
+
+        Returns: list of the results, in the order of the images.
+        """
+        images = list(self)
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(function, images))
+
+    def close(self) -> None:
+        """ Closes the file. Memory-mapped images should not be used afterwards. """
+        self.hdus.close()
+        self._images.clear()
@@ -1,7 +1,7 @@
 from astropy.io import fits
-import matplotlib.pyplot as plt
 
 from ..grid import Grid
+from ..instrumentation import instrument
 from .header import Header
 from .wcs import WCS
 
@@ -10,16 +10,23 @@ class FITSImage:
     Class to handle FITS images. Load with `FITSImage(filepath)`.
     """
 
-    def __init__(self, filepath, id: int=None):
+    @instrument()
+    def __init__(self, filepath, id: int=None, memmap: bool=False, statistics_mode: str='exact'):
         """
         Parameters:
          - `filepath`: filepath of FITS image to load.
          - `id`: which image to load of the file (index).
             If none specified, will load the first image.
+         - `memmap`: if `True`, the pixel data is memory-mapped and kept
+            in its stored type. Sections are read with `self.grid.cutout`.
+         - `statistics_mode`: how the statistics of the grid are computed
+            (see `Grid`). The subsampled modes are much faster for large images.
         """
 
         # LOAD FITS FILE
-        with fits.open(filepath) as images:
+        # When memory-mapping, scaling is left to the `Grid` so that
+        # the data is not copied into memory when the file is opened.
+        with fits.open(filepath, memmap=memmap, do_not_scale_image_data=memmap) as images:
             # A .fits file can contain many images.
             # By default, we will load the first image.
             if id is None:
@@ -28,9 +35,35 @@ class FITSImage:
                     print(f"No image id specified for FITS image {filepath}."\
                         "Only the first one will be loaded.")
             
-            # Extract useful information from the fits image.
-            self.header: Header = Header(images[id].header)
-            self.grid: Grid = Grid(images[id].data)
+            self._load(images[id], memmap, statistics_mode)
+
+    @classmethod
+    def from_hdu(cls, hdu: fits.ImageHDU, memmap: bool=False, statistics_mode: str='exact') -> 'FITSImage':
+        """
+        Makes a FITS image from an HDU of a file which is already open (see `FITSFile`).
+
+        Parameters:
+         - `hdu`: image HDU to load. Its file must stay open while the data is read.
+         - `memmap`: `True` if the file was opened with `memmap=True` and
+            `do_not_scale_image_data=True`, so that scaling is left to the `Grid`.
+         - `statistics_mode`: see `FITSImage.__init__`.
+        """
+        image = cls.__new__(cls)
+        image._load(hdu, memmap, statistics_mode)
+        return image
+
+    def _load(self, hdu: fits.ImageHDU, memmap: bool, statistics_mode: str) -> None:
+        # Extract useful information from the fits image.
+        self.header: Header = Header(hdu.header)
+        if memmap:
+            self.grid: Grid = Grid(
+                hdu.data,
+                scale=hdu.header.get('BSCALE', 1.0),
+                offset=hdu.header.get('BZERO', 0.0),
+                statistics_mode=statistics_mode
+            )
+        else:
+            self.grid: Grid = Grid(hdu.data, statistics_mode=statistics_mode)
 
         # Establish the WCS.
         self.wcs: WCS = WCS(self.header)
@@ -41,17 +74,12 @@ class FITSImage:
     
     def quickplot(self, phi_lo: float=-1, phi_hi: float=3) -> None:
         """
-        Displays a simple grayscale plot of the data. 
-        
+        Displays a simple grayscale plot of the data, downsampled to about screen
+        resolution. See `astropyaddons.images.quickplot.quickplot`.
+
         Parameters:
-          - `lo_phi`: standard deviations from median to assign to black
-          - `hi_phi`: standard deviations from median to assign to white
+          - `phi_lo`: standard deviations from median to assign to black
+          - `phi_hi`: standard deviations from median to assign to white
         """
-        assert phi_lo < phi_hi, "lo_phi must be lower than hi_phi"
-
-        lo = self.grid.median + phi_lo*self.grid.std
-        hi = self.grid.median + phi_hi*self.grid.std
-
-        plt.figure(figsize=(10,10))
-        plt.title(self.__repr__())
-        plt.imshow(self.grid.grid, cmap='gray', origin='lower', vmin=lo, vmax=hi)
\ No newline at end of file
+        from .quickplot import quickplot
+        quickplot(self, phi_lo, phi_hi)
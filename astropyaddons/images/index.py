@@ -0,0 +1,218 @@
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+
+from astropy.coordinates import Angle
+from astropy.io import fits
+from astropy.time import Time
+import astropy.units as u
+import numpy as np
+
+from .header import Header
+
+# Columns of the index taken from `Header`, and their types.
+# Missing numeric values are NaN, missing strings are empty.
+NUMERIC_COLUMNS = ('exptime', 'JD', 'ccdtemp', 'size_y', 'size_x', 'latitude', 'longitude',
+                   'altitude', 'focal_length', 'airmass', 'RA', 'DEC')
+STRING_COLUMNS = ('datetime', 'filter', 'color_band')
+
+def _angle(value, unit) -> float:
+    """ Angle in degrees from a header value, either a number or a sexagesimal string in `unit`. """
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        return Angle(value, unit=unit).degree
+    return float(value)
+
+def _read_header(filepath: str, id: int) -> dict:
+    """ Values of the columns of the index for one file. Only the header is read. """
+    try:
+        header = Header(fits.getheader(filepath, id))
+    except Exception:
+        print(f"Warning: could not read the header of {filepath}.")
+        return None
+
+    row = {name: getattr(header, name) for name in NUMERIC_COLUMNS + STRING_COLUMNS}
+    try:
+        # RA is given in hours when sexagesimal, in degrees otherwise
+        row['RA'], row['DEC'] = _angle(row['RA'], u.hourangle), _angle(row['DEC'], u.deg)
+    except (ValueError, TypeError):
+        row['RA'], row['DEC'] = np.nan, np.nan
+
+    for name in NUMERIC_COLUMNS:
+        try:
+            row[name] = float(row[name]) if row[name] is not None else np.nan
+        except (ValueError, TypeError):
+            row[name] = np.nan
+    for name in STRING_COLUMNS:
+        row[name] = str(row[name]) if row[name] is not None else ''
+
+    return row
+
+class HeaderIndex:
+    """
+    Index of the headers of an archive of FITS images, to select frames
+    (by filter, exposure time, date, airmass, position...) without opening them.
+    Only the header blocks are read, in parallel threads.
+
+    The index is columnar: `index['filter']` is a numpy array with one value per file.
+    It is saved to (and loaded from) a `.npz` file, and `refresh` only reads the
+    headers of files which are new or changed (by modification time or size).
+
+    Parameters:
+     - `path`: Optional. `.npz` file the index is saved to. Loaded if it exists.
+     - `id`: which image of each file to read the header of (index).
+     - `workers`: number of threads reading headers. If none specified,
+        uses the default of `ThreadPoolExecutor`.
+    """
+    def __init__(self, path: str=None, id: int=0, workers: int=None):
+        self.path = path
+        self.id = id
+        self.workers = workers
+
+        self.columns: dict = self._empty()
+        if path is not None and os.path.exists(path):
+            with np.load(path, allow_pickle=False) as saved:
+                self.columns = {name: saved[name] for name in saved.files}
+
+    @staticmethod
+    def _empty() -> dict:
+        columns = {'filepath': np.zeros(0, dtype=str), 'mtime': np.zeros(0), 'filesize': np.zeros(0, dtype=np.int64)}
+        columns.update({name: np.zeros(0) for name in NUMERIC_COLUMNS})
+        columns.update({name: np.zeros(0, dtype=str) for name in STRING_COLUMNS})
+        return columns
+
+    def __len__(self) -> int:
+        return len(self.columns['filepath'])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __repr__(self) -> str:
+        return f'HeaderIndex of {len(self)} files'
+
+    def refresh(self, pattern: str, recursive: bool=True) -> tuple[int, int]:
+        """
+        Brings the index up to date with the files matching `pattern` (e.g. `'archive/**/*.fits'`).
+        Files no longer matching, or whose header cannot be read, are removed from the index
+        (and files whose header cannot be read are not added). Saves the index if it has a `path`.
+
+        Returns: number of headers read, and number of files removed from the index (no longer
+        matching, or whose header can no longer be read).
+        """
+        filepaths = np.array(sorted(glob.glob(pattern, recursive=recursive)), dtype=str)
+        stats = [os.stat(filepath) for filepath in filepaths]
+        mtimes = np.array([stat.st_mtime for stat in stats], dtype=float)
+        sizes = np.array([stat.st_size for stat in stats], dtype=np.int64)
+
+        # Rows of the index which are still valid
+        known = {filepath: i for i, filepath in enumerate(self.columns['filepath'])}
+        rows = np.array([known.get(filepath, -1) for filepath in filepaths], dtype=int)
+        unchanged = rows >= 0
+        unchanged[unchanged] = (self.columns['mtime'][rows[unchanged]] == mtimes[unchanged]) \
+            & (self.columns['filesize'][rows[unchanged]] == sizes[unchanged])
+        removed = int(np.count_nonzero(~np.isin(self.columns['filepath'], filepaths)))
+
+        # Read the new and changed headers
+        changed = np.flatnonzero(~unchanged)
+        with ThreadPoolExecutor(self.workers) as executor:
+            headers = list(executor.map(lambda filepath: _read_header(filepath, self.id), filepaths[changed]))
+        read = [i for i, header in zip(changed, headers) if header is not None]
+        unreadable = [i for i, header in zip(changed, headers) if header is None]
+        headers = [header for header in headers if header is not None]
+        # Unreadable files are only removed if they were indexed before
+        removed += int(np.count_nonzero(rows[unreadable] >= 0))
+
+        new = self._empty()
+        new['filepath'], new['mtime'], new['filesize'] = filepaths[read], mtimes[read], sizes[read]
+        for name in NUMERIC_COLUMNS:
+            new[name] = np.array([header[name] for header in headers], dtype=float)
+        for name in STRING_COLUMNS:
+            new[name] = np.array([header[name] for header in headers], dtype=str)
+        self._fill_JD(new)
+
+        kept = rows[unchanged]
+        self.columns = {name: np.concatenate([self.columns[name][kept], new[name]]) for name in self.columns}
+
+        # Keep the index sorted by filepath
+        order = np.argsort(self.columns['filepath'], kind='stable')
+        self.columns = {name: column[order] for name, column in self.columns.items()}
+
+        if self.path is not None:
+            self.save()
+
+        return len(read), removed
+
+    @staticmethod
+    def _fill_JD(columns: dict) -> None:
+        """ Computes the missing JDs from `DATE-OBS`, all at once. """
+        missing = np.flatnonzero(np.isnan(columns['JD']) & (columns['datetime'] != ''))
+        if not len(missing):
+            return
+
+        try:
+            columns['JD'][missing] = Time(columns['datetime'][missing], format='isot').jd
+        except ValueError:
+            # Some dates are invalid: convert them one by one
+            for i in missing:
+                try:
+                    columns['JD'][i] = Time(columns['datetime'][i], format='isot').jd
+                except ValueError:
+                    pass
+
+    def save(self, path: str=None) -> None:
+        """ Saves the index to `path` (by default, `self.path`). """
+        path = path if path is not None else self.path
+        if path is None: raise ValueError("No path to save the index to")
+
+        np.savez(path, **self.columns)
+        # `np.savez` adds the extension if it is missing
+        if not path.endswith('.npz'):
+            os.replace(path + '.npz', path)
+
+    def mask(self, **conditions) -> np.ndarray:
+        """
+        Boolean mask of the files satisfying all the `conditions`, given as `column=value`:
+         - a single value selects equal values, e.g. `filter='V'`.
+         - a tuple `(min, max)` selects values in the inclusive range, e.g. `JD=(2460000, 2460001)`.
+           Either bound may be `None`.
+         - a list selects any of its values, e.g. `filter=['B', 'V']`.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in conditions.items():
+            if name not in self.columns: raise ValueError(f"The index has no column {name}")
+            column = self.columns[name]
+
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column <= high
+            elif isinstance(value, list):
+                mask &= np.isin(column, value)
+            else:
+                mask &= column == value
+
+        return mask
+
+    def select(self, **conditions) -> np.ndarray:
+        """ Filepaths of the files satisfying all the `conditions` (see `mask`), sorted by JD. """
+        rows = np.flatnonzero(self.mask(**conditions))
+        rows = rows[np.argsort(self.columns['JD'][rows], kind='stable')]
+        return self.columns['filepath'][rows]
+
+    def near(self, RA: float, DEC: float, radius: float, **conditions) -> np.ndarray:
+        """
+        Filepaths of the files pointing within `radius` (degrees) of `RA`, `DEC` (degrees),
+        and satisfying all the `conditions` (see `mask`), sorted by JD.
+        """
+        ra, dec, RA, DEC = np.radians(self.columns['RA']), np.radians(self.columns['DEC']), np.radians(RA), np.radians(DEC)
+
+        # Angular distance, with the haversine formula
+        with np.errstate(invalid='ignore'):
+            distance = 2 * np.arcsin(np.sqrt(np.sin((dec - DEC) / 2)**2 + np.cos(dec) * np.cos(DEC) * np.sin((ra - RA) / 2)**2))
+
+        rows = np.flatnonzero(self.mask(**conditions) & (np.degrees(distance) <= radius))
+        rows = rows[np.argsort(self.columns['JD'][rows], kind='stable')]
+        return self.columns['filepath'][rows]
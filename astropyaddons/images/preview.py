@@ -0,0 +1,135 @@
+import functools
+import glob
+import os
+import traceback
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import EllipseCollection
+from matplotlib.figure import Figure
+
+from ..detection import detect_stars
+from ..instrumentation import instrument
+from ..parallel import bounded_map
+from .fitsimage import FITSImage
+from .quickplot import downsample, stretch
+
+# Default longest side of the previews, in pixels
+PREVIEW_SIZE = 1024
+
+@instrument()
+def render_preview(img: FITSImage, output: str, phi_lo: float=-1, phi_hi: float=3, max_size: int=PREVIEW_SIZE,
+                   method: str='mean', stars=None, radius: float=None, label: bool=True) -> str:
+    """
+    Renders a PNG preview of an image, with the same stretch as `quickplot`
+    (`phi_lo` to `phi_hi` standard deviations from the median). The image is downsampled
+    to at most `max_size` pixels per side, and drawn with the Agg canvas directly, so
+    no interactive backend (or display) is needed and nothing is left in `pyplot`.
+
+    Parameters:
+     - `img`: `FITSImage` to render.
+     - `output`: filepath of the PNG file.
+     - `phi_lo`, `phi_hi`: standard deviations from median to assign to black and white.
+     - `max_size`: longest side of the preview, in pixels.
+     - `method`: how blocks of pixels are combined when downsampling (see `quickplot.DOWNSAMPLING`).
+     - `stars`: Optional. Stars to overlay, a table from `detect_stars` or an `(N, 2)` array of `(y, x)`.
+     - `radius`: Optional. Radius of the circles drawn around the stars, in pixels of the image
+        (e.g. the photometry aperture). If none specified, fixed-size markers are drawn.
+     - `label`: if `True`, the filter, date and exposure time are written on the preview.
+
+    Returns: `output`.
+    """
+    lo, hi = stretch(img.grid, phi_lo, phi_hi)
+    size_y, size_x = img.grid.size_y, img.grid.size_x
+
+    factor = max(1, int(np.ceil(max(size_y, size_x) / max_size)))
+    data = downsample(img.grid, factor, method)
+
+    # One pixel of the preview per pixel of the figure, with the axes filling it
+    figure = Figure(figsize=(data.shape[1] / 100, data.shape[0] / 100), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_axes((0, 0, 1, 1))
+    ax.set_axis_off()
+    ax.imshow(data, origin='lower', cmap='gray', vmin=lo, vmax=hi, interpolation='nearest',
+              extent=(-0.5, data.shape[1] * factor - 0.5, -0.5, data.shape[0] * factor - 0.5))
+    ax.set_xlim(-0.5, size_x - 0.5)
+    ax.set_ylim(-0.5, size_y - 0.5)
+
+    ### OVERLAYS
+    if stars is not None:
+        if isinstance(stars, np.ndarray) and stars.dtype.names is not None:
+            y, x = stars['y'], stars['x']
+        else:
+            y, x = np.asarray(stars, dtype=float).reshape(-1, 2).T
+
+        if radius is None:
+            ax.scatter(x, y, s=30, marker='o', facecolors='none', edgecolors='C1', linewidths=0.8)
+        else:
+            ax.add_collection(EllipseCollection(2 * radius, 2 * radius, 0, units='xy', offsets=np.column_stack([x, y]),
+                                                offset_transform=ax.transData, facecolors='none', edgecolors='C1', linewidths=0.8))
+
+    if label:
+        ax.text(0.01, 0.99, img.__repr__(), transform=ax.transAxes, va='top', ha='left', color='white', fontsize=8,
+                bbox={'facecolor': 'black', 'alpha': 0.5, 'linewidth': 0})
+
+    canvas.print_png(output)
+    return output
+
+def preview_frame(filepath: str, output: str, id: int=None, threshold: float=None, statistics_mode: str='approximate',
+                  **parameters) -> tuple[str, str, str]:
+    """
+    Loads one frame (memory-mapped), detects its stars if a `threshold` is given,
+    and renders its preview with `render_preview`. Errors are caught and returned.
+
+    Parameters:
+     - `filepath`: filepath of the FITS file.
+     - `output`: filepath of the PNG file.
+     - `id`: which image of the file to render (index). If none specified, the first image.
+     - `threshold`: Optional. Stars brighter than `threshold` times the median are detected
+        and overlaid (see `astropyaddons.detection.detect_stars`).
+     - `statistics_mode`: how the median and standard deviation are computed (see `Grid`).
+     - `parameters`: passed to `render_preview`.
+
+    Returns: `(filepath, output, error)`, with the traceback of the error if the preview failed, else `None`.
+    """
+    try:
+        img = FITSImage(filepath, id, memmap=True, statistics_mode=statistics_mode)
+        if threshold is not None:
+            parameters['stars'] = detect_stars(img.grid, threshold, img.grid.median, workers=1)
+        return filepath, render_preview(img, output, **parameters), None
+    except Exception:
+        return filepath, output, traceback.format_exc()
+
+def previews(pattern, directory: str, workers: int=None, max_in_flight: int=None, overwrite: bool=True, **parameters):
+    """
+    Renders the PNG previews of many frames over a pool of processes. Results are yielded
+    as soon as each preview is done, so they come in the order of completion. A frame which
+    cannot be rendered gives a result with its error, and the other frames are not affected.
+    If a worker process dies, the frames in flight give errors, and the remaining frames
+    are rendered by a new pool of processes.
+
+    Parameters:
+     - `pattern`: glob pattern of the frames (e.g. `'night/*.fits'`), or list of filepaths.
+     - `directory`: directory the previews are written to, as `<name of the frame>.png`.
+     - `workers`: number of processes. If none specified, uses `os.cpu_count()`.
+        If 1, the previews are rendered in this process.
+     - `max_in_flight`: maximum number of frames submitted at once. If none specified,
+        twice the number of workers (see `astropyaddons.parallel.bounded_map`).
+     - `overwrite`: if `False`, frames whose preview already exists are skipped.
+     - `parameters`: passed to `preview_frame` (e.g. `threshold`, `phi_lo`, `phi_hi`, `max_size`, `radius`).
+
+    Yields: `(filepath, output, error)` of each frame (see `preview_frame`).
+    """
+    filepaths = sorted(glob.glob(pattern)) if isinstance(pattern, str) else list(pattern)
+    os.makedirs(directory, exist_ok=True)
+
+    jobs = []
+    for filepath in filepaths:
+        output = os.path.join(directory, os.path.splitext(os.path.basename(filepath))[0] + '.png')
+        if overwrite or not os.path.exists(output):
+            jobs.append((filepath, output))
+
+    render = functools.partial(preview_frame, **parameters)
+    for (filepath, output), result, error in bounded_map(render, jobs, workers, max_in_flight):
+        # An error here means that the worker itself failed (e.g. it crashed), not the rendering
+        yield result if error is None else (filepath, output, error)
@@ -1,33 +1,138 @@
-from .fitsimage import FITSImage
+import numpy as np
 from matplotlib import pyplot as plt
+from matplotlib.axes import Axes
+
+from ..grid import Grid
+from ..instrumentation import instrument
+from .fitsimage import FITSImage
 
 coord = tuple[int, int]
 
-def quickplot(img: FITSImage, phi_lo: float=-1, phi_hi: float=3, corners: tuple[coord, coord]=None) -> None:
-    """ 
-    Displays a quick plot of given data.
-    
+# Longest side (pixels) images are downsampled to before being drawn, about screen resolution
+MAX_SIZE = 2048
+
+# Ways of combining each block of pixels when downsampling:
+#  - 'mean': mean of the block. Keeps the noise (and the stretch) close to the original.
+#  - 'max': maximum of the block. Keeps faint stars and hot pixels visible.
+DOWNSAMPLING = ('mean', 'max')
+
+# Rows of the image read at once (at least one block), which bounds the data read from memory-mapped images
+BAND_ROWS = 256
+
+def _size(source) -> tuple[int, int]:
+    if isinstance(source, Grid):
+        return source.size_y, source.size_x
+    return np.shape(source)
+
+@instrument()
+def downsample(source, factor: int, method: str='mean', window: tuple[int, int, int, int]=None) -> np.ndarray:
+    """
+    Downsamples an image by combining blocks of `factor` x `factor` pixels. The image is
+    read a band of rows at a time (through `cutout` when it has one), so memory-mapped
+    data is never fully loaded. Incomplete blocks at the edges are padded with their edge values.
+
+    Parameters:
+     - `source`: 2-D numpy array, `Grid`, or any object with a `cutout(y_min, y_max, x_min, x_max)`
+        method (in which case `window` must be given).
+     - `factor`: size of the blocks, in pixels.
+     - `method`: one of `DOWNSAMPLING`.
+     - `window`: Optional. Section `(y_min, y_max, x_min, x_max)` of the image to downsample.
+        If none specified, the whole image.
+
+    Returns: the downsampled image, as floating point.
+    """
+    if method not in DOWNSAMPLING: raise ValueError(f"Downsampling method {method} does not exist.")
+    if int(factor) != factor or factor < 1: raise ValueError("'factor' must be a positive integer")
+    factor = int(factor)
+
+    if hasattr(source, 'cutout'):
+        read = source.cutout
+    else:
+        read = lambda y_min, y_max, x_min, x_max: np.asarray(source[y_min:y_max, x_min:x_max], dtype=float)
+    y_min, y_max, x_min, x_max = window if window is not None else (0, _size(source)[0], 0, _size(source)[1])
+
+    if factor == 1:
+        return read(y_min, y_max, x_min, x_max)
+
+    size_y, size_x = -(-(y_max - y_min) // factor), -(-(x_max - x_min) // factor)
+    reduce = np.mean if method == 'mean' else np.max
+    output = np.empty((size_y, size_x))
+
+    band_rows = max(1, BAND_ROWS // factor)
+    for row in range(0, size_y, band_rows):
+        rows = min(band_rows, size_y - row)
+        y = y_min + row * factor
+        band = read(y, min(y + rows * factor, y_max), x_min, x_max)
+
+        padding = ((0, rows * factor - band.shape[0]), (0, size_x * factor - band.shape[1]))
+        if padding[0][1] or padding[1][1]:
+            band = np.pad(band, padding, mode='edge')
+        output[row:row + rows] = reduce(band.reshape(rows, factor, size_x, factor), axis=(1, 3))
+
+    return output
+
+def stretch(grid: Grid, phi_lo: float=-1, phi_hi: float=3) -> tuple[float, float]:
+    """
+    Values assigned to black and white: `phi_lo` and `phi_hi` standard deviations from
+    the median of `grid`. The statistics are cached by the grid.
+    """
+    if phi_lo >= phi_hi: raise ValueError("phi_lo must be smaller than phi_hi")
+    return grid.median + grid.std * phi_lo, grid.median + grid.std * phi_hi
+
+def show(ax: Axes, source, lo: float, hi: float, window: tuple[int, int, int, int]=None, max_size: int=MAX_SIZE,
+         method: str='mean') -> None:
+    """
+    Draws an image in grayscale on `ax`, downsampled to at most `max_size` pixels per side.
+    The axes are in pixel coordinates of the full image, whatever the window and downsampling.
+
+    Parameters:
+     - `ax`: matplotlib `Axes` to draw on.
+     - `source`: see `downsample`.
+     - `lo`, `hi`: values assigned to black and white.
+     - `window`: Optional. Section `(y_min, y_max, x_min, x_max)` of the image to draw (zoom).
+        Only this section is read. If none specified, the whole image.
+     - `max_size`: longest side of the drawn image, in pixels.
+     - `method`: see `downsample`.
+    """
+    y_min, y_max, x_min, x_max = window if window is not None else (0, _size(source)[0], 0, _size(source)[1])
+
+    factor = max(1, int(np.ceil(max(y_max - y_min, x_max - x_min) / max_size)))
+    data = downsample(source, factor, method, (y_min, y_max, x_min, x_max))
+
+    # Pixel [y, x] is centred on (x, y)
+    extent = (x_min - 0.5, x_min + data.shape[1] * factor - 0.5, y_min - 0.5, y_min + data.shape[0] * factor - 0.5)
+    ax.imshow(data, origin='lower', cmap='gray', vmin=lo, vmax=hi, extent=extent, interpolation='nearest')
+    ax.set_xlim(x_min - 0.5, x_max - 0.5)
+    ax.set_ylim(y_min - 0.5, y_max - 0.5)
+
+def quickplot(img: FITSImage, phi_lo: float=-1, phi_hi: float=3, corners: tuple[coord, coord]=None,
+              max_size: int=MAX_SIZE, method: str='mean') -> None:
+    """
+    Displays a quick plot of given data. Large images are downsampled to about screen
+    resolution, and only the pixels between `corners` are read (e.g. from a memory-mapped image).
+    The stretch uses the cached statistics of `img.grid`.
+
     Parameters:
       - `img`: `FITSImage` object to plot.
       - `phi_lo`: standard deviations from median to assign to black.
       - `phi_hi`: standard deviations from median to assign to white.
-      - `corners`: Optional. tuple containing 2 `coords`, each written as `(x, y)`.
-        Data between the two corners (inclusive) will be plotted. Ex. `((x1, y1), (x2, y2))`
+      - `corners`: Optional. tuple containing 2 `coords`, each written as `(y, x)`.
+        Data between the two corners (inclusive) will be plotted. Ex. `((y1, x1), (y2, x2))`
+      - `max_size`: Optional. Longest side of the plotted image, in pixels.
+      - `method`: Optional. How blocks of pixels are combined when downsampling (see `DOWNSAMPLING`).
     """
-    if phi_lo <= phi_hi: raise ValueError("phi_lo must be smaller than phi_hi")
-
     # Getting values for convenience
     size_y, size_x = img.grid.size_y, img.grid.size_x
-    median, std = img.grid.median, img.grid.std
+    lo, hi = stretch(img.grid, phi_lo, phi_hi)
 
     ### EXTRACTING `CORNERS` DATA
     # Extracting default
     ((y1, x1), (y2, x2)) = corners if corners is not None \
         else ((0, 0), (size_y-1, size_x-1))
-    
+
     # Check that corners given are ints
     for value in (y1, y2, x1, x2):
-        if not isinstance(value, int): 
+        if not isinstance(value, int):
             raise TypeError("Invalid values for 'corners' given. Are they all 'int's?")
 
     # Getting min/max x and y values
@@ -36,36 +141,10 @@ def quickplot(img: FITSImage, phi_lo: float=-1, phi_hi: float=3, corners: tuple[
 
     # Check that values are within bounds
     if y_min < 0 or x_min < 0 or y_max > size_y-1 or x_max > size_x-1:
-        raise IndexError(f"Corners given are out of range (MAX y={size_y-1}, x={size_y-1})")
+        raise IndexError(f"Corners given are out of range (MAX y={size_y-1}, x={size_x-1})")
 
     ### PLOTTING
-    # Get upper and lower bounds
-    lo = median + std * phi_lo
-    hi = median + std * phi_hi
-
-    # Plot data in grayscale
+    # Plot data in grayscale, in the pixel coordinates of the image
     plt.figure(figsize=(10,10))
     plt.title(img.__repr__())
-    plt.imshow(
-        img.grid.grid[y_min:y_max+1, x_min:x_max+1], 
-        origin='lower', 
-        cmap='gray',
-        vmin=lo,
-        vmax=hi
-        )
-    
-    # Adjust the axis for the corners provided
-    if y_min > 0 or x_min > 0:
-        # Get xticks and yticks from current graph
-        yticks, _ = plt.yticks()
-        xticks, _ = plt.xticks()
-
-        # Offset ticks by the x_min, y_min
-        plt.yticks(yticks[1:-1], yticks[1:-1] + y_min)
-        plt.xticks(xticks[1:-1], xticks[1:-1] + x_min)
-
-        # Set limits
-        plt.ylim(0, y_max-y_min)
-        plt.xlim(0, x_max-x_min)
-
-
+    show(plt.gca(), img.grid, lo, hi, (y_min, y_max+1, x_min, x_max+1), max_size, method)
@@ -0,0 +1,84 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from astropyaddons.images import calibration
+from astropyaddons.images.calibration import Calibration
+from astropyaddons.images.fitsimage import FITSImage
+
+SHAPE = (40, 50)
+
+@pytest.fixture(scope='module')
+def night(tmp_path_factory):
+    """ Raw bias, dark, flat and science frames with known bias, dark current, flat and sky. """
+    directory = tmp_path_factory.mktemp('night')
+    rng = np.random.default_rng(0)
+    truth = {'bias': rng.normal(500, 3, SHAPE), 'dark': rng.uniform(0.1, 0.5, SHAPE), 'flat': rng.uniform(0.8, 1.2, SHAPE), 'sky': 2000.0}
+
+    def write(name, data, exptime, temperature=-10.2):
+        header = fits.Header()
+        header['EXPTIME'], header['FILTER'], header['CCD-TEMP'], header['DATE-OBS'] = exptime, 'V', temperature, '2024-01-01T00:00:00'
+        hdu = fits.PrimaryHDU((np.round(data) - 32768).astype(np.int16), header=header)
+        hdu.header['BZERO'] = 32768
+        hdu.writeto(str(directory / f'{name}.fits'))
+
+    for i in range(5):
+        write(f'bias{i}', truth['bias'] + rng.normal(0, 1, SHAPE), 0.0)
+        write(f'dark{i}', truth['bias'] + truth['dark'] * 60 + rng.normal(0, 1, SHAPE), 60.0)
+        write(f'flat{i}', truth['bias'] + truth['dark'] * 5 + truth['flat'] * (20000 + 1000 * i), 5.0)
+    write('science', truth['bias'] + truth['dark'] * 30 + truth['flat'] * truth['sky'], 30.0, temperature=-9.8)
+
+    return directory, truth
+
+def _build(directory, masters):
+    calibration = Calibration(str(masters))
+    for kind in ('bias', 'dark', 'flat'):
+        calibration.build(kind, sorted(glob.glob(str(directory / f'{kind}*.fits'))))
+    return calibration
+
+def test_masters_are_cached(night, tmp_path, monkeypatch):
+    directory, truth = night
+    built = _build(directory, tmp_path)
+    assert sorted(os.listdir(tmp_path)) == ['bias_T-10.fits', 'dark_T-10.fits', 'flat_V_T-10.fits']
+    np.testing.assert_allclose(built.master('dark', FITSImage(str(directory / 'science.fits')).header), truth['dark'], atol=0.1)
+
+    # A new `Calibration` loads the masters from the files, without stacking the frames again
+    def no_stack(*arguments, **parameters):
+        raise AssertionError("The master was stacked again")
+    monkeypatch.setattr(calibration, 'stack', no_stack)
+
+    cached = _build(directory, tmp_path)
+    header = FITSImage(str(directory / 'science.fits')).header
+    for kind in ('bias', 'dark', 'flat'):
+        np.testing.assert_array_equal(cached.master(kind, header), built.master(kind, header))
+        assert cached.master(kind, header) is cached.master(kind, header)
+
+    with pytest.raises(AssertionError, match="stacked again"):
+        cached.build('bias', sorted(glob.glob(str(directory / 'bias*.fits'))), rebuild=True)
+
+@pytest.mark.parametrize('memmap', [False, True])
+def test_apply(night, tmp_path, memmap):
+    directory, truth = night
+    image = FITSImage(str(directory / 'science.fits'), memmap=memmap)
+    median = image.grid.median
+
+    grid = _build(directory, tmp_path).apply(image)
+    assert grid is image.grid and grid.grid.dtype == np.float32
+    # The master flat is normalised to a median of 1
+    np.testing.assert_allclose(grid.grid, truth['sky'] * np.median(truth['flat']), atol=5)
+    assert grid.median != median
+
+def test_apply_keeps_written_pixels(night, tmp_path):
+    directory, truth = night
+    image = FITSImage(str(directory / 'science.fits'), memmap=True)
+    calibration = _build(directory, tmp_path)
+    masters = [calibration.master(kind, image.header) for kind in ('bias', 'dark', 'flat')]
+
+    # Written to the scaled grid before calibrating
+    image.grid[0, :10] = 50000.0
+    grid = calibration.apply(image)
+    expected = (50000.0 - masters[0][0, :10] - masters[1][0, :10] * 30) / masters[2][0, :10]
+    np.testing.assert_allclose(grid.grid[0, :10], expected, rtol=1e-5)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from astropyaddons.images.fitsfile import FITSFile
+
+@pytest.fixture
+def filepath(tmp_path):
+    """ File with an empty primary HDU, two images and a table between them """
+    rng = np.random.default_rng(0)
+    first = fits.ImageHDU((rng.integers(0, 1000, (20, 30)) - 32768).astype(np.int16))
+    first.header['BZERO'], first.header['FILTER'] = 32768, 'V'
+    second = fits.ImageHDU(rng.normal(100, 5, (10, 15)))
+    second.header['FILTER'] = 'R'
+    table = fits.BinTableHDU.from_columns([fits.Column('a', 'E', array=np.arange(3.0))])
+
+    filepath = str(tmp_path / 'mosaic.fits')
+    fits.HDUList([fits.PrimaryHDU(), first, table, second]).writeto(filepath)
+    return filepath
+
+def test_images_are_loaded_lazily(filepath):
+    with FITSFile(filepath) as file:
+        assert len(file) == 2 and file.ids == [1, 3]
+        assert file._images == {}
+
+        image = file[1]
+        assert list(file._images) == [3]
+        assert file[1] is image and image.grid.size_y == 10
+        # Memory-mapped images are only scaled when needed
+        assert file[0].grid._grid is None and file[0].grid.offset == 32768
+        with fits.open(filepath) as images:
+            np.testing.assert_array_equal(file[0].grid.grid, images[1].data)
+            np.testing.assert_array_equal(image.grid.grid, images[3].data)
+
+def test_headers(filepath):
+    with FITSFile(filepath) as file:
+        assert [header.filter for header in file.headers] == ['V', 'R']
+        assert file._images == {}
+
+def test_map(filepath):
+    with FITSFile(filepath, memmap=False) as file:
+        medians = file.map(lambda image: image.grid.median, workers=2)
+        assert medians == [file[0].grid.median, file[1].grid.median]
+        assert [image.header.filter for image in file] == ['V', 'R']
+
+def test_closed_on_exit(filepath):
+    with FITSFile(filepath) as file:
+        file[0]
+    assert file.hdus.fileinfo(0)['file'].closed
+    assert file._images == {}
+
+    with pytest.raises(KeyError):
+        with FITSFile(filepath) as file:
+            raise KeyError("error while reading")
+    assert file.hdus.fileinfo(0)['file'].closed
@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+from astropy.io import fits
+
+from astropyaddons.images.index import HeaderIndex
+
+def _write(filepath, filter, date, exptime=10.0):
+    header = fits.Header()
+    header['FILTER'], header['DATE-OBS'], header['EXPTIME'] = filter, date, exptime
+    fits.PrimaryHDU(np.zeros((4, 4), dtype=np.float32), header=header).writeto(filepath, overwrite=True)
+
+def test_refresh(tmp_path):
+    for name, filter, date in (('a', 'V', '2024-01-02T00:00:00'), ('b', 'B', '2024-01-01T00:00:00'), ('c', 'V', '2024-01-03T00:00:00')):
+        _write(str(tmp_path / f'{name}.fits'), filter, date)
+    pattern, path = str(tmp_path / '*.fits'), str(tmp_path / 'index.npz')
+
+    index = HeaderIndex(path)
+    assert index.refresh(pattern) == (3, 0)
+    assert [os.path.basename(filepath) for filepath in index.select(filter='V')] == ['a.fits', 'c.fits']
+    assert index.refresh(pattern) == (0, 0)
+
+    # Saved, and only changed files are read again
+    _write(str(tmp_path / 'a.fits'), 'R', '2024-01-02T00:00:00', exptime=20.0)
+    index = HeaderIndex(path)
+    assert len(index) == 3
+    assert index.refresh(pattern) == (1, 0)
+    assert list(index['filter']) == ['R', 'B', 'V']
+
+    # Deleted and unreadable files are removed, and new unreadable files are not added
+    os.remove(tmp_path / 'b.fits')
+    with open(tmp_path / 'c.fits', 'wb') as file:
+        file.write(b'not a FITS file')
+    with open(tmp_path / 'd.fits', 'wb') as file:
+        file.write(b'not a FITS file either')
+    assert index.refresh(pattern) == (0, 2)
+    assert [os.path.basename(filepath) for filepath in index['filepath']] == ['a.fits']
+    # Unreadable files are not indexed, so they are never counted as removed again
+    assert index.refresh(pattern) == (0, 0)
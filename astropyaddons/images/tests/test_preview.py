@@ -0,0 +1,26 @@
+import os
+
+from astropyaddons.PSF.psf import GaussianPSF
+from astropyaddons.images import preview
+from astropyaddons.synthetic import SyntheticField
+
+def _render_or_crash(filepath, output, **parameters):
+    if 'crash' in filepath:
+        os._exit(1)
+    return filepath, output, None
+
+def test_previews_survive_a_dead_worker(monkeypatch, tmp_path):
+    monkeypatch.setattr(preview, 'preview_frame', _render_or_crash)
+    results = list(preview.previews(['a.fits', 'crash.fits', 'b.fits'], str(tmp_path), workers=2, max_in_flight=1))
+
+    assert [filepath for filepath, _, _ in results] == ['a.fits', 'crash.fits', 'b.fits']
+    assert [error is None for _, _, error in results] == [True, False, True]
+    assert results[2][1] == os.path.join(str(tmp_path), 'b.png')
+
+def test_preview_frame(tmp_path):
+    filepath, output = str(tmp_path / 'field.fits'), str(tmp_path / 'field.png')
+    SyntheticField(300, 200, 20, GaussianPSF(1.5, 1.0), seed=3).write(filepath)
+
+    assert preview.preview_frame(filepath, output, threshold=3, max_size=100) == (filepath, output, None)
+    with open(output, 'rb') as file:
+        assert file.read(8) == b'\x89PNG\r\n\x1a\n'
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+
+from astropyaddons.grid import Grid
+from astropyaddons.images import quickplot
+from astropyaddons.images.quickplot import downsample, show, stretch
+
+def _block_reduce(array, factor, reduce):
+    """ Blocks of the whole frame at once, with incomplete blocks padded with their edge values """
+    size_y, size_x = -(-array.shape[0] // factor), -(-array.shape[1] // factor)
+    padded = np.pad(array, ((0, size_y * factor - array.shape[0]), (0, size_x * factor - array.shape[1])), mode='edge')
+    return reduce(padded.reshape(size_y, factor, size_x, factor), axis=(1, 3))
+
+@pytest.mark.parametrize('shape', [(64, 48), (67, 50), (61, 47)])
+@pytest.mark.parametrize('factor', [1, 2, 3, 8])
+@pytest.mark.parametrize('method, reduce', [('mean', np.mean), ('max', np.max)])
+def test_downsample_matches_full_frame(monkeypatch, shape, factor, method, reduce):
+    # Several bands, the last of which is incomplete for most shapes
+    monkeypatch.setattr(quickplot, 'BAND_ROWS', 16)
+    raw = np.random.default_rng(factor).integers(0, 1000, shape).astype(np.int16)
+    grid = Grid(raw, scale=2.0, offset=5.0)
+    expected = _block_reduce(raw * 2.0 + 5.0, factor, reduce)
+
+    np.testing.assert_allclose(downsample(grid, factor, method), expected)
+    np.testing.assert_allclose(downsample(raw * 2.0 + 5.0, factor, method), expected)
+    # Only bands of the grid were read
+    assert grid._grid is None
+
+def test_downsample_window():
+    array = np.random.default_rng(0).normal(size=(70, 90))
+    window = (5, 50, 12, 80)
+    np.testing.assert_allclose(downsample(array, 4, 'mean', window), _block_reduce(array[5:50, 12:80], 4, np.mean))
+
+def test_downsample_checks():
+    with pytest.raises(ValueError, match="median does not exist"):
+        downsample(np.zeros((4, 4)), 2, 'median')
+    with pytest.raises(ValueError, match="positive integer"):
+        downsample(np.zeros((4, 4)), 1.5)
+
+def test_stretch():
+    grid = Grid(np.arange(100.0).reshape(10, 10))
+    assert stretch(grid, -1, 2) == (grid.median - grid.std, grid.median + 2 * grid.std)
+    for phi_lo, phi_hi in [(3, -1), (1, 1)]:
+        with pytest.raises(ValueError, match="phi_lo must be smaller than phi_hi"):
+            stretch(grid, phi_lo, phi_hi)
+
+def test_show_extent():
+    ax = Figure().add_subplot()
+    show(ax, np.zeros((100, 70)), 0, 1, window=(10, 95, 0, 70), max_size=20)
+
+    image, = ax.get_images()
+    # Blocks of 5 pixels, drawn in the pixel coordinates of the whole image
+    assert image.get_array().shape == (17, 14)
+    assert image.get_extent() == [-0.5, 69.5, 9.5, 94.5]
+    assert ax.get_xlim() == (-0.5, 69.5) and ax.get_ylim() == (9.5, 94.5)
@@ -0,0 +1,69 @@
+import astropy.wcs
+import numpy as np
+import pytest
+
+from astropyaddons.images.wcs import LazyCoordinates
+
+SIZE_Y, SIZE_X = 50, 70
+
+@pytest.fixture(scope='module')
+def wcs():
+    wcs = astropy.wcs.WCS(naxis=2)
+    wcs.wcs.ctype = ['RA---TAN', 'DEC--TAN']
+    wcs.wcs.crval = [150.0, 30.0]
+    wcs.wcs.crpix = [30.5, 20.5]
+    wcs.wcs.cd = [[-2e-4, 1e-5], [2e-5, 2e-4]]
+    return wcs
+
+@pytest.fixture(scope='module')
+def dense(wcs):
+    """ Coordinates of every pixel, `(size_y, size_x, 2)`, evaluated at once """
+    x, y = np.meshgrid(np.arange(SIZE_X), np.arange(SIZE_Y))
+    return np.stack(wcs.pixel_to_world_values(x, y), axis=-1)
+
+KEYS = [
+    (3, 5), (-1, -1), (np.int64(49), 0),
+    (slice(5, 20), slice(10, 40, 3)), (slice(None, None, -1), slice(None)), (slice(None), 7), 4,
+    (np.array([1, 2, 49, 2]), np.array([0, 5, 69, 5])), (np.array([[0, 1], [2, 3]]), slice(60, 70)),
+    (slice(0, 50, 7), slice(0, 70, 9), 1), (3, 5, 0),
+]
+
+@pytest.mark.parametrize('max_tiles', [0, 3, 100])
+@pytest.mark.parametrize('key', KEYS)
+def test_matches_dense_grid(wcs, dense, key, max_tiles):
+    coords = LazyCoordinates(wcs, SIZE_Y, SIZE_X, tile_size=16, max_tiles=max_tiles)
+    expected = dense[key]
+    result = coords[key]
+    assert np.shape(result) == np.shape(expected)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-12)
+
+def test_boolean_mask(wcs, dense):
+    mask = np.random.default_rng(0).random((SIZE_Y, SIZE_X)) < 0.1
+    coords = LazyCoordinates(wcs, SIZE_Y, SIZE_X, tile_size=16, max_tiles=4)
+    np.testing.assert_allclose(coords[mask], dense[mask], rtol=0, atol=1e-12)
+
+def test_cache_is_bounded(wcs, dense):
+    coords = LazyCoordinates(wcs, SIZE_Y, SIZE_X, tile_size=16, max_tiles=3)
+    assert len(coords) == SIZE_Y and coords.shape == (SIZE_Y, SIZE_X, 2)
+
+    # Every tile (4 x 5 of them) is evaluated, but only the last 3 used are kept
+    np.testing.assert_allclose(coords[:, :], dense, rtol=0, atol=1e-12)
+    assert len(coords._tiles) == 3
+
+    coords[0, 0]
+    coords[20, 20]
+    assert list(coords._tiles)[-2:] == [(0, 0), (1, 1)]
+    assert len(coords._tiles) == 3
+
+    coords.clear_cache()
+    assert len(coords._tiles) == 0
+
+def test_no_cache(wcs):
+    coords = LazyCoordinates(wcs, SIZE_Y, SIZE_X, max_tiles=0)
+    coords[:, :]
+    assert len(coords._tiles) == 0
+
+    with pytest.raises(ValueError, match="'max_tiles' must not be negative"):
+        LazyCoordinates(wcs, SIZE_Y, SIZE_X, max_tiles=-1)
+    with pytest.raises(ValueError, match="'tile_size' must be positive"):
+        LazyCoordinates(wcs, SIZE_Y, SIZE_X, tile_size=0)
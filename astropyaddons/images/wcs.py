@@ -1,49 +1,174 @@
+from collections import OrderedDict
+
+from ..instrumentation import instrument
 from .header import Header
 
 import astropy.wcs
 import numpy as np
 
+class LazyCoordinates:
+    """
+    Coordinate grid which evaluates the WCS only for the pixels requested.
+    Behaves like a `(size_y, size_x, 2)` array of (RA, DEC) in degrees,
+    indexed via `coords[y, x]`, but never builds the full grid.
+
+    Parameters:
+     - `wcs`: `astropy.wcs.WCS` object used to evaluate coordinates.
+     - `size_y`: Size of the image in the y-direction.
+     - `size_x`: Size of the image in the x-direction.
+     - `tile_size`: Size of the square tiles kept in the cache.
+     - `max_tiles`: Maximum number of evaluated tiles to keep. If 0, nothing
+        is cached and every request is evaluated directly.
+    """
+    def __init__(self, wcs: astropy.wcs.WCS, size_y: int, size_x: int, tile_size: int=256, max_tiles: int=0):
+        if tile_size < 1: raise ValueError("'tile_size' must be positive")
+        if max_tiles < 0: raise ValueError("'max_tiles' must not be negative")
+
+        self.wcs = wcs
+        self.shape = (size_y, size_x, 2)
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+
+        # Least recently used tiles are at the start of the dictionary
+        self._tiles: OrderedDict = OrderedDict()
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple): key = (key,)
+        pixel_key, component_key = key[:2], key[2:]
+
+        # Zero-copy (y, x) index grids. Indexing them follows the exact
+        # numpy rules for ints, slices, arrays and masks.
+        size_y, size_x, _ = self.shape
+        y_grid = np.broadcast_to(np.arange(size_y)[:, None], (size_y, size_x))
+        x_grid = np.broadcast_to(np.arange(size_x)[None, :], (size_y, size_x))
+        y, x = y_grid[pixel_key], x_grid[pixel_key]
+
+        coords = self.evaluate(y, x)
+        return coords[(Ellipsis,) + component_key] if component_key else coords
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @instrument()
+    def evaluate(self, y, x) -> np.ndarray:
+        """
+        Evaluates the coordinates for a batch of pixels.
+
+        Parameters:
+         - `y`: y-coordinates of the pixels (int or array)
+         - `x`: x-coordinates of the pixels (int or array)
+
+        Returns: array of shape `(*np.shape(y), 2)` with (RA, DEC) in degrees.
+        """
+        y, x = np.broadcast_arrays(np.asarray(y), np.asarray(x))
+
+        if self.max_tiles == 0:
+            ra, dec = self.wcs.pixel_to_world_values(x, y)
+            return np.stack([ra, dec], axis=-1)
+
+        # Gather each pixel from its (cached) tile
+        coords = np.empty(y.shape + (2,))
+        tile_y, tile_x = y // self.tile_size, x // self.tile_size
+        for ty, tx in set(zip(tile_y.ravel().tolist(), tile_x.ravel().tolist())):
+            in_tile = (tile_y == ty) & (tile_x == tx)
+            tile = self._tile(ty, tx)
+            coords[in_tile] = tile[y[in_tile] - ty*self.tile_size, x[in_tile] - tx*self.tile_size]
+
+        return coords
+
+    def _tile(self, ty: int, tx: int) -> np.ndarray:
+        """ Returns the coordinates of tile (ty, tx), evaluating it if needed. """
+        if (ty, tx) in self._tiles:
+            self._tiles.move_to_end((ty, tx))
+            return self._tiles[(ty, tx)]
+
+        size_y, size_x, _ = self.shape
+        y = np.arange(ty*self.tile_size, min((ty+1)*self.tile_size, size_y))
+        x = np.arange(tx*self.tile_size, min((tx+1)*self.tile_size, size_x))
+        ra, dec = self.wcs.pixel_to_world_values(*np.meshgrid(x, y))
+        tile = np.stack([ra, dec], axis=-1)
+
+        self._tiles[(ty, tx)] = tile
+        if len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+
+        return tile
+
+    def clear_cache(self) -> None:
+        """ Removes all the evaluated tiles from the cache. """
+        self._tiles.clear()
+
+
 class WCS:
     """
-    World coordinate system (WCS) obtained from a FITSImage. 
+    World coordinate system (WCS) obtained from a FITSImage.
     Extracts the WCS information and neatly keeps it in a class.
 
     Parameters:
      - `header`: `astropy.io.fits.header.Header` object to create
         a WCS from.
+     - `max_tiles`: Optional. Number of evaluated coordinate tiles
+        to keep cached (see `LazyCoordinates`).
 
-    Can be accessed easily from `self.coords[y, x]`, and the wcs object 
-    is stored into `self.wcs`
+    Can be accessed easily from `self.coords[y, x]`, and the wcs object
+    is stored into `self.wcs`. Coordinates are only evaluated for the
+    pixels which are requested. Batches of positions are converted with
+    `pixel_to_world` and `world_to_pixel`.
     """
 
-    def __init__(self, header: Header):
+    @instrument()
+    def __init__(self, header: Header, max_tiles: int=0):
 
         # Initialize WCS object
         wcs = astropy.wcs.WCS(header.header)
+        self.size_y, self.size_x = header.size_y, header.size_x
 
         # First, detect if the image is NOT plate-solved.
-        if all(wcs.pixel_to_world_values(([0,1], [0,1]))[0] == np.array([1,2])):
+        if all(wcs.pixel_to_world_values([0,1], [0,1])[0] == np.array([1,2])):
             # If it is not, we will set our WCS information to "None"
             self.wcs = None
             self.coords = None
             return
-        
 
-        # Otherwise, create a "coordinate grid" that can be indexed via self.coords[(x, y)]
+
+        # Otherwise, create a lazy "coordinate grid" that can be indexed via self.coords[y, x]
         self.wcs = wcs
-        
-        # Create an array of coordinates [(0, 0), (0, 1), (0, 2), ..., (1, 0), (1, 1), ...]
-        coordinates = \
-            np.array(np.meshgrid(
-                np.arange(0, header.size_y), np.arange(0, header.size_x)
-            )).T.reshape(-1, 2)
-        wcs_coords = self.wcs.pixel_to_world_values(coordinates)
-
-        # Reshape into an array indexed with `self.coords[y, x]`
-        self.coords = np.transpose(
-            np.array(wcs_coords).reshape(header.size_y, header.size_x, 2),
-            (1,0,2)
-        )
-        
+        self.coords: LazyCoordinates = LazyCoordinates(wcs, header.size_y, header.size_x, max_tiles=max_tiles)
+
+    def pixel_to_world(self, y, x) -> np.ndarray:
+        """
+        Coordinates of a batch of (possibly sub-pixel) pixel positions.
+
+        Parameters:
+         - `y`: y-coordinates of the pixels (float or array)
+         - `x`: x-coordinates of the pixels (float or array)
+
+        Returns: array of shape `(*np.shape(y), 2)` with (RA, DEC) in degrees.
+        """
+        if self.wcs is None: raise ValueError("The image is not plate-solved")
+
+        ra, dec = self.wcs.pixel_to_world_values(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        return np.stack([ra, dec], axis=-1)
+
+    def world_to_pixel(self, ra, dec, inside: bool=False) -> np.ndarray:
+        """
+        Pixel positions of a batch of sky coordinates (the inverse of `self.coords`).
+        Pixel centers are at integer positions, the same as `self.coords[y, x]`.
+
+        Parameters:
+         - `ra`: right ascension in degrees (float or array)
+         - `dec`: declination in degrees (float or array)
+         - `inside`: if `True`, positions outside of the image are NaN.
+
+        Returns: array of shape `(*np.shape(ra), 2)` with (y, x) in pixels.
+        """
+        if self.wcs is None: raise ValueError("The image is not plate-solved")
+
+        x, y = self.wcs.world_to_pixel_values(np.asarray(ra, dtype=float), np.asarray(dec, dtype=float))
+        pixels = np.stack([y, x], axis=-1)
 
+        if inside:
+            outside = (y < -0.5) | (y > self.size_y - 0.5) | (x < -0.5) | (x > self.size_x - 0.5)
+            pixels[outside] = np.nan
 
+        return pixels
@@ -0,0 +1,169 @@
+"""
+Opt-in instrumentation of the hot paths of `astrophys` and `astropyaddons`.
+
+Stages are timed with `stage(name)` (context manager) or `@instrument()`
+(decorator). Nothing is recorded until `enable()` is called, or the environment
+variable `ASTROPYADDONS_INSTRUMENT` is set to `1`: disabled, a stage costs one
+check of a flag.
+
+    from astropyaddons import instrumentation
+    instrumentation.enable(memory=True, trace=True)
+    ... # reduce a night
+    print(instrumentation.report())
+    instrumentation.write_trace('night.json') # open in chrome://tracing or Perfetto
+"""
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+_enabled: bool = os.environ.get('ASTROPYADDONS_INSTRUMENT') == '1'
+_memory: bool = False
+_trace: bool = False
+
+# Aggregated statistics per stage: name -> [count, total seconds, max seconds, peak bytes]
+_stages: dict = {}
+# Chrome trace events, only kept when tracing
+_events: list = []
+
+_lock = threading.Lock()
+_local = threading.local()
+_start = time.perf_counter()
+_disabled = nullcontext()
+
+def enable(memory: bool=False, trace: bool=False) -> None:
+    """
+    Starts recording the stages.
+
+    Parameters:
+     - `memory`: if `True`, also records the peak memory allocated by each stage,
+        with `tracemalloc`. This slows down allocation-heavy code noticeably.
+        With several threads, the memory of concurrent stages is mixed.
+     - `trace`: if `True`, keeps every call as an event for `write_trace`.
+    """
+    global _enabled, _memory, _trace
+    _enabled, _memory, _trace = True, memory, trace
+
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable() -> None:
+    """ Stops recording the stages. Recorded statistics are kept until `reset()`. """
+    global _enabled, _memory
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled, _memory = False, False
+
+def enabled() -> bool:
+    return _enabled
+
+def reset() -> None:
+    """ Forgets all the recorded statistics and events. """
+    with _lock:
+        _stages.clear()
+        _events.clear()
+
+class _Stage:
+    """ Context manager recording one call of a stage. See `stage`. """
+    __slots__ = ('name', 'start', 'memory', 'peak')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault('stack', [])
+
+        self.memory, self.peak = None, 0
+        if _memory and tracemalloc.is_tracing():
+            # The peak of tracemalloc is global, so the peak so far is handed to the
+            # enclosing stage before it is reset for this one.
+            current, peak = tracemalloc.get_traced_memory()
+            if stack and stack[-1].memory is not None:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.memory = current
+
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        duration = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+
+        allocated = 0
+        if self.memory is not None and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            allocated = max(self.peak - self.memory, 0)
+            if stack and stack[-1].memory is not None:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+
+        with _lock:
+            record = _stages.setdefault(self.name, [0, 0.0, 0.0, 0])
+            record[0] += 1
+            record[1] += duration
+            record[2] = max(record[2], duration)
+            record[3] = max(record[3], allocated)
+
+            if _trace:
+                _events.append({
+                    'name': self.name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                    'ts': (self.start - _start) * 1e6, 'dur': duration * 1e6, 'args': {'bytes': allocated},
+                })
+
+        return False
+
+def stage(name: str):
+    """
+    Context manager timing the code inside it as the stage `name`.
+    Does nothing unless instrumentation is enabled.
+    """
+    return _Stage(name) if _enabled else _disabled
+
+def instrument(name: str=None):
+    """
+    Decorator timing every call of a function as a stage.
+    If none specified, the name of the stage is the qualified name of the function.
+    """
+    def decorator(function):
+        label = name or f'{function.__module__}.{function.__qualname__}'
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Stage(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def statistics() -> dict:
+    """
+    Recorded statistics of each stage.
+
+    Returns: `dict` of stage name -> `dict` with the number of `'calls'`, the `'total'`,
+    `'mean'` and `'max'` wall time in seconds and the `'peak_bytes'` allocated by a call.
+    Times of nested stages are included in the stages enclosing them.
+    """
+    with _lock:
+        return {name: {'calls': count, 'total': total, 'mean': total / count, 'max': longest, 'peak_bytes': peak}
+                for name, (count, total, longest, peak) in _stages.items()}
+
+def report() -> str:
+    """ Table of the recorded stages, slowest (in total) first. """
+    lines = [f"{'stage':<55} {'calls':>7} {'total (s)':>10} {'mean (ms)':>10} {'max (ms)':>10} {'peak (MiB)':>11}"]
+    for name, stats in sorted(statistics().items(), key=lambda item: -item[1]['total']):
+        lines.append(f"{name:<55} {stats['calls']:>7} {stats['total']:>10.3f} {stats['mean']*1e3:>10.2f} "
+                     f"{stats['max']*1e3:>10.2f} {stats['peak_bytes']/2**20:>11.2f}")
+    return '\n'.join(lines)
+
+def write_trace(filepath: str) -> None:
+    """ Writes the recorded events (see `enable(trace=True)`) as a Chrome trace JSON file. """
+    with _lock:
+        events = list(_events)
+    with open(filepath, 'w') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
@@ -0,0 +1,70 @@
+import os
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+def bounded_map(function, jobs, workers: int=None, max_in_flight: int=None):
+    """
+    Calls `function(*job)` for each job over a pool of processes, keeping at most
+    `max_in_flight` jobs submitted at once, which bounds the memory used by pending
+    results. Results are yielded as soon as each job is done, so they come in the order
+    of completion. A job which fails gives its traceback, and the other jobs are not
+    affected. If a worker process dies, the jobs in flight fail, and the remaining jobs
+    are run by a new pool of processes.
+
+    Parameters:
+     - `function`: function to call, which must be picklable (defined at the top level of a module).
+     - `jobs`: iterable of tuples of arguments of `function`.
+     - `workers`: number of processes. If none specified, uses `os.cpu_count()`.
+        If 1, the jobs are run in this process.
+     - `max_in_flight`: maximum number of jobs submitted at once. If none specified,
+        twice the number of workers.
+
+    Yields: `(job, result, error)` of each job, with the traceback of the error if
+    the job failed (and `result` is `None`), else `None`.
+    """
+    if max_in_flight is not None and max_in_flight < 1: raise ValueError("'max_in_flight' must be positive")
+
+    if workers == 1:
+        for job in jobs:
+            try:
+                yield job, function(*job), None
+            except Exception:
+                yield job, None, traceback.format_exc()
+        return
+
+    workers = workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * workers
+
+    executor = ProcessPoolExecutor(workers)
+    try:
+        pending = {}
+        jobs = iter(jobs)
+        while True:
+            # Keep up to `max_in_flight` jobs submitted
+            while len(pending) < max_in_flight:
+                job = next(jobs, None)
+                if job is None:
+                    break
+                try:
+                    future = executor.submit(function, *job)
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed by the system), which breaks the whole pool
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(workers)
+                    future = executor.submit(function, *job)
+                pending[future] = job
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = pending.pop(future)
+                try:
+                    yield job, future.result(), None
+                except Exception:
+                    # The job failed, or its worker died
+                    yield job, None, traceback.format_exc()
+    finally:
+        executor.shutdown()
@@ -0,0 +1,218 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+import numpy as np
+from scipy import ndimage
+from scipy.spatial import cKDTree
+
+from .instrumentation import instrument
+
+def _points(stars, n_stars: int) -> np.ndarray:
+    """
+    `(y, x)` coordinates of the `n_stars` brightest stars. `stars` is either a table from
+    `astropyaddons.detection.detect_stars` (sorted by `flux`), or an `(N, 2)` array
+    of `(y, x)` coordinates already sorted from brightest to faintest.
+    """
+    if isinstance(stars, np.ndarray) and stars.dtype.names is not None:
+        order = np.argsort(-stars['flux'], kind='stable')
+        points = np.column_stack([stars['y'], stars['x']])[order]
+    else:
+        points = np.asarray(stars, dtype=float).reshape(-1, 2)
+    return points[:n_stars]
+
+def _triangles(points: np.ndarray, neighbours: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Triangles formed by each star and pairs of its nearest neighbours.
+
+    Returns: `(T, 3)` array of the indices of the vertices of each triangle, ordered by
+    the length of the opposite side (shortest first), and the `(T, 2)` invariants of each
+    triangle: the ratios of its two shortest sides to its longest one. The invariants do
+    not change with translation, rotation and scale.
+    """
+    k = min(neighbours + 1, len(points))
+    if k < 3:
+        return np.zeros((0, 3), dtype=int), np.zeros((0, 2))
+
+    _, nearest = cKDTree(points).query(points, k=k)
+    pairs = np.array(list(combinations(range(1, k), 2)))
+    triangles = np.stack([np.repeat(nearest[:, 0], len(pairs)), nearest[:, pairs[:, 0]].ravel(), nearest[:, pairs[:, 1]].ravel()], axis=1)
+    triangles = np.unique(np.sort(triangles, axis=1), axis=0)
+
+    # Length of the side opposite to each vertex
+    a, b, c = (points[triangles[:, i]] for i in range(3))
+    sides = np.stack([np.hypot(*(b - c).T), np.hypot(*(c - a).T), np.hypot(*(a - b).T)], axis=1)
+    order = np.argsort(sides, axis=1)
+    sides = np.take_along_axis(sides, order, axis=1)
+    triangles = np.take_along_axis(triangles, order, axis=1)
+
+    # Degenerate (flat or tiny) triangles are not reliable
+    valid = (sides[:, 2] > 0) & (sides[:, 0] + sides[:, 1] > 1.05 * sides[:, 2])
+    return triangles[valid], sides[valid, :2] / sides[valid, 2:]
+
+class AffineTransform:
+    """
+    Affine transform between the pixel coordinates of two frames, `(y, x)`:
+    `reference = matrix @ (y, x, 1)` for pixel `(y, x)` of the target frame.
+
+    Parameters:
+     - `matrix`: `(2, 3)` array of the transform.
+     - `matches`: Optional. `(M, 2)` array of the indices `(reference, target)` of the
+        stars it was solved from.
+     - `residual`: Optional. RMS distance of the matched stars after the transform, in pixels.
+    """
+    def __init__(self, matrix: np.ndarray, matches: np.ndarray=None, residual: float=None):
+        self.matrix = np.asarray(matrix, dtype=float).reshape(2, 3)
+        self.matches = matches
+        self.residual = residual
+
+    def __call__(self, points) -> np.ndarray:
+        """ Reference coordinates `(N, 2)` of target coordinates `points` `(N, 2)`, `(y, x)`. """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return points @ self.matrix[:, :2].T + self.matrix[:, 2]
+
+    @property
+    def inverse(self) -> 'AffineTransform':
+        """ Transform from the reference to the target frame. """
+        linear = np.linalg.inv(self.matrix[:, :2])
+        return AffineTransform(np.column_stack([linear, -linear @ self.matrix[:, 2]]))
+
+    def __repr__(self):
+        return f'AffineTransform {self.matrix.tolist()} from {0 if self.matches is None else len(self.matches)} stars'
+
+def _fit(reference: np.ndarray, target: np.ndarray, tolerance: float, maxiters: int=5) -> tuple[np.ndarray, np.ndarray]:
+    """ Least-squares affine fit of matched points, iteratively rejecting outliers. Returns the matrix and the kept matches. """
+    kept = np.ones(len(reference), dtype=bool)
+    for _ in range(maxiters):
+        design = np.column_stack([target[kept], np.ones(np.count_nonzero(kept))])
+        solution, *_ = np.linalg.lstsq(design, reference[kept], rcond=None)
+        matrix = solution.T
+
+        distances = np.hypot(*(target @ matrix[:, :2].T + matrix[:, 2] - reference).T)
+        new_kept = distances <= max(3 * np.median(distances[kept]), tolerance)
+        if np.count_nonzero(new_kept) < 3 or np.array_equal(new_kept, kept):
+            break
+        kept = new_kept
+
+    return matrix, kept
+
+class AsterismIndex:
+    """
+    Index of the star triangles (asterisms) of a reference frame, to register many
+    frames to it. Triangles are matched by their shape in a KD-tree, each match votes
+    for the correspondence of its vertices, and the affine transform is solved from
+    the most voted correspondences.
+
+    Parameters:
+     - `stars`: stars of the reference frame, a table from `detect_stars` or an `(N, 2)`
+        array of `(y, x)` sorted from brightest to faintest (e.g. from `get_star_coords`
+        sorted by flux).
+     - `n_stars`: number of brightest stars used.
+     - `neighbours`: number of nearest neighbours each star forms triangles with.
+     - `tolerance`: maximum difference of the invariants of matched triangles.
+    """
+    def __init__(self, stars, n_stars: int=40, neighbours: int=6, tolerance: float=0.005):
+        self.n_stars = n_stars
+        self.neighbours = neighbours
+        self.tolerance = tolerance
+
+        self.points = _points(stars, n_stars)
+        self.triangles, invariants = _triangles(self.points, neighbours)
+        self.tree = cKDTree(invariants)
+
+    @instrument()
+    def register(self, stars, min_votes: int=2, max_distance: float=2.0) -> AffineTransform:
+        """
+        Transform from the frame of `stars` (same format as the reference) to the reference frame.
+
+        Parameters:
+         - `stars`: stars of the frame to register.
+         - `min_votes`: minimum number of matched triangles sharing a correspondence of stars.
+         - `max_distance`: matched stars further apart than this (pixels) after the
+            transform are rejected, unless the typical distance is larger.
+
+        Raises `ValueError` if the frame could not be registered.
+        """
+        points = _points(stars, self.n_stars)
+        triangles, invariants = _triangles(points, self.neighbours)
+        if not len(triangles) or not len(self.triangles):
+            raise ValueError("Not enough stars to register the frame")
+
+        # Pairs of triangles with the same shape
+        candidates = self.tree.query_ball_point(invariants, self.tolerance)
+        counts = np.array([len(candidate) for candidate in candidates])
+        if not counts.sum():
+            raise ValueError("No matching star triangles were found")
+        reference_triangles = self.triangles[np.concatenate(candidates).astype(int)]
+        target_triangles = np.repeat(triangles, counts, axis=0)
+
+        # Each pair of triangles votes for the correspondence of its vertices
+        votes = np.zeros((len(self.points), len(points)), dtype=int)
+        np.add.at(votes, (reference_triangles.ravel(), target_triangles.ravel()), 1)
+
+        # Correspondences which are the best for both stars
+        best_reference = votes.argmax(axis=0)
+        target_index = np.arange(len(points))
+        mutual = (votes.argmax(axis=1)[best_reference] == target_index) & (votes[best_reference, target_index] >= min_votes)
+        matches = np.column_stack([best_reference[mutual], target_index[mutual]])
+        if len(matches) < 3:
+            raise ValueError(f"Only {len(matches)} stars could be matched, at least 3 are needed")
+
+        matrix, kept = _fit(self.points[matches[:, 0]], points[matches[:, 1]], max_distance)
+        matches = matches[kept]
+        if len(matches) < 3:
+            raise ValueError("The matched stars do not agree on a transform")
+
+        transform = AffineTransform(matrix, matches)
+        transform.residual = float(np.sqrt(np.mean(np.sum((transform(points[matches[:, 1]]) - self.points[matches[:, 0]])**2, axis=1))))
+        return transform
+
+def register(reference, target, **parameters) -> AffineTransform:
+    """
+    Transform from the frame of the `target` stars to the frame of the `reference` stars.
+    To register many frames to the same reference, build an `AsterismIndex` once instead.
+    `parameters` are passed to `AsterismIndex`.
+    """
+    return AsterismIndex(reference, **parameters).register(target)
+
+@instrument()
+def resample(array: np.ndarray, transform: AffineTransform, shape: tuple[int, int]=None, order: int=1,
+             cval: float=np.nan, band_rows: int=256, workers: int=None) -> np.ndarray:
+    """
+    Resamples an image onto the reference frame of `transform`, i.e. aligns it.
+    The output is split into bands of rows, interpolated in parallel threads.
+
+    Parameters:
+     - `array`: 2-D numpy array of the image (the target frame of `transform`).
+     - `transform`: `AffineTransform` from the image to the reference frame.
+     - `shape`: shape of the output. If none specified, the shape of `array`.
+     - `order`: order of the spline interpolation (0 for nearest, 1 for bilinear, 3 for bicubic).
+        Above 1, the spline coefficients of the whole image are computed first, so NaN pixels of
+        the image spread over the whole output: replace them beforehand.
+     - `cval`: value of the output pixels which fall outside of the image.
+     - `band_rows`: number of output rows interpolated by each task.
+     - `workers`: number of threads. If none specified, uses the default of `ThreadPoolExecutor`.
+
+    Returns: the aligned image, as floating point.
+    """
+    shape = tuple(shape) if shape is not None else array.shape
+    array = np.asarray(array, dtype=float)
+
+    # Spline coefficients of the image, computed once rather than by every band
+    if order > 1:
+        array = ndimage.spline_filter(array, order, output=np.float64, mode='constant')
+
+    # `ndimage.affine_transform` maps output pixels to input pixels: the inverse transform
+    inverse = transform.inverse.matrix
+    output = np.empty(shape)
+
+    def resample_band(y_min: int):
+        y_max = min(y_min + band_rows, shape[0])
+        # The band starts at row `y_min` of the output
+        offset = inverse[:, 2] + inverse[:, 0] * y_min
+        ndimage.affine_transform(array, inverse[:, :2], offset=offset, output_shape=(y_max - y_min, shape[1]),
+                                 output=output[y_min:y_max], order=order, mode='constant', cval=cval, prefilter=False)
+
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(resample_band, range(0, shape[0], band_rows)))
+
+    return output
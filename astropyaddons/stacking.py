@@ -0,0 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from astropy.io import fits
+from astropy.time import Time
+import numpy as np
+
+from .images.fitsimage import FITSImage
+from .instrumentation import instrument
+
+# Ways of combining the frames, pixel by pixel:
+#  - 'mean': mean of the frames.
+#  - 'median': median of the frames.
+#  - 'clipped': mean of the frames after iteratively removing the values further than
+#    `sigma` standard deviations from the median (see `astropyaddons.statistics.sigma_clip`).
+METHODS = ('mean', 'median', 'clipped')
+
+# Default memory budget of the chunks being combined at once
+MAX_BYTES = 256 * 2**20
+
+class _Frame:
+    """ Memory-mapped image of a file, read a few rows at a time. """
+    def __init__(self, filepath: str, id: int):
+        self.hdus = fits.open(filepath, memmap=True, do_not_scale_image_data=True)
+        self.header = self.hdus[id].header
+        self.data = self.hdus[id].data
+        if self.data is None or self.data.ndim != 2: raise ValueError(f"{filepath} has no 2-dimensional image at index {id}")
+
+        self.scale = float(self.header.get('BSCALE', 1.0))
+        self.offset = float(self.header.get('BZERO', 0.0))
+
+    def rows(self, y_min: int, y_max: int, x_min: int, x_max: int) -> np.ndarray:
+        """ Scaled values of the section `[y_min:y_max, x_min:x_max]`, as floating point. """
+        return self.data[y_min:y_max, x_min:x_max] * self.scale + self.offset
+
+def _combine(cube: np.ndarray, method: str, sigma: float, maxiters: int) -> np.ndarray:
+    """ Combines a `(frames, rows, columns)` cube along the frames. Missing values are NaN. """
+    missing = np.isnan(cube)
+    count = cube.shape[0] - missing.sum(axis=0)
+    empty = count == 0
+
+    # Pixels without any value give NaN, without the warnings of the `nan*` functions
+    if empty.any():
+        cube[:, empty] = 0
+
+    if method == 'clipped':
+        for _ in range(maxiters):
+            median = np.nanmedian(cube, axis=0)
+            std = np.sqrt(np.nansum((cube - np.nanmean(cube, axis=0))**2, axis=0) / np.maximum(count, 1))
+            with np.errstate(invalid='ignore'):
+                outliers = np.abs(cube - median) > sigma * std
+            if not outliers.any():
+                break
+            cube[outliers] = np.nan
+            count -= outliers.sum(axis=0)
+        method = 'mean'
+
+    if method == 'median':
+        combined = np.nanmedian(cube, axis=0)
+    else:
+        combined = np.nansum(cube, axis=0) / np.maximum(count, 1)
+
+    combined[empty] = np.nan
+    return combined
+
+def _merged_header(frames: list[_Frame], method: str, shape: tuple) -> fits.Header:
+    """ Header of the stack: the first frame's, with the combination details added. """
+    header = frames[0].header.copy()
+    for keyword in ('BSCALE', 'BZERO', 'BLANK', 'CHECKSUM', 'DATASUM'):
+        header.remove(keyword, ignore_missing=True)
+    header['BITPIX'] = -32
+    header['NAXIS2'], header['NAXIS1'] = shape
+
+    exptimes = [frame.header.get('EXPTIME') for frame in frames]
+    if all(exptime is not None for exptime in exptimes):
+        # Each pixel is an average of the frames: the effective exposure is the mean one
+        header['EXPTIME'] = (float(np.mean(exptimes)), 'Mean exposure time of the combined frames')
+        header['TOTEXP'] = (float(np.sum(exptimes)), 'Total exposure time of the combined frames')
+
+    dates = [frame.header.get('DATE-OBS') for frame in frames]
+    if all(date is not None for date in dates):
+        try:
+            times = Time(dates, format='isot')
+            header['DATE-OBS'] = (times.min().isot, 'Start of the first combined frame')
+            header['JD'] = (float(np.mean(times.jd)), 'Mean JD of the combined frames')
+        except ValueError:
+            pass
+
+    header['NCOMBINE'] = (len(frames), 'Number of combined frames')
+    header['STACKMTH'] = (method, 'Method used to combine the frames')
+    for frame in frames:
+        header.add_history(f'Combined {os.path.basename(frame.hdus.filename() or "")}')
+
+    return header
+
+@instrument()
+def stack(filepaths: list[str], output: str=None, method: str='median', offsets=None, scales=None, bias: np.ndarray=None,
+          dark: np.ndarray=None, sigma: float=3.0, maxiters: int=5, id: int=0, max_bytes: int=MAX_BYTES, workers: int=None,
+          overwrite: bool=False):
+    """
+    Combines many frames pixel by pixel, without loading them into memory. The frames
+    are memory-mapped and combined a chunk of rows at a time (in parallel threads),
+    so the memory used is bounded by `max_bytes`, whatever the number of frames.
+
+    Parameters:
+     - `filepaths`: FITS files of the frames to combine.
+     - `output`: Optional. FITS file to write the stack to, one chunk at a time.
+        If none specified, the stack is returned as a `FITSImage`.
+     - `method`: one of `METHODS`.
+     - `offsets`: Optional. `(N, 2)` integer `(dy, dx)` shifts aligning each frame to the
+        first one: pixel `[y, x]` of the stack is pixel `[y - dy, x - dx]` of the frame.
+        Pixels shifted out of a frame are ignored.
+     - `scales`: Optional. Factor each frame is multiplied by before combining
+        (e.g. to normalise flat fields).
+     - `bias`: Optional. Master bias subtracted from each frame before scaling.
+     - `dark`: Optional. Master dark current (per second) subtracted from each frame
+        before scaling, times the `EXPTIME` of the frame.
+     - `sigma`, `maxiters`: clipping parameters of the `'clipped'` method.
+     - `id`: which image of each file to combine (index).
+     - `max_bytes`: memory budget of the chunks being combined at once.
+     - `workers`: number of threads. If none specified, uses the default of `ThreadPoolExecutor`.
+     - `overwrite`: if `True`, overwrites `output` if it exists.
+
+    Returns: the stack as a `FITSImage`, or `output` if given. The header of the stack is the
+    header of the first frame, with `NCOMBINE`, `EXPTIME` (mean), `TOTEXP` (total),
+    `DATE-OBS` (first), `JD` (mean) and `STACKMTH`.
+    """
+    if method not in METHODS: raise ValueError(f"Stacking method {method} does not exist.")
+    if not filepaths: raise ValueError("No frames to stack")
+
+    offsets = np.zeros((len(filepaths), 2), dtype=int) if offsets is None else np.asarray(offsets, dtype=int).reshape(-1, 2)
+    scales = np.ones(len(filepaths)) if scales is None else np.asarray(scales, dtype=float).ravel()
+    if len(offsets) != len(filepaths) or len(scales) != len(filepaths): raise ValueError("'offsets' and 'scales' must have one value per frame")
+
+    frames, writer = [], None
+    try:
+        for filepath in filepaths:
+            frames.append(_Frame(filepath, id))
+        size_y, size_x = frames[0].data.shape
+        if not offsets.any() and any(frame.data.shape != (size_y, size_x) for frame in frames):
+            raise ValueError("All the frames must have the same shape, unless they are shifted with 'offsets'")
+        for master in (bias, dark):
+            if master is not None and any(frame.data.shape != np.shape(master) for frame in frames):
+                raise ValueError("'bias' and 'dark' must have the same shape as the frames")
+        exptimes = [float(frame.header.get('EXPTIME', 0.0)) for frame in frames]
+
+        # Rows per chunk, so that the chunks being combined (and their temporaries) fit in `max_bytes`
+        workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        chunk_rows = int(np.clip(max_bytes // (4 * 8 * len(frames) * size_x * workers), 1, size_y))
+        chunks = [(y, min(y + chunk_rows, size_y)) for y in range(0, size_y, chunk_rows)]
+
+        def combine_chunk(chunk: tuple[int, int]) -> np.ndarray:
+            y_min, y_max = chunk
+            cube = np.full((len(frames), y_max - y_min, size_x), np.nan)
+            for i, (frame, (dy, dx), scale, exptime) in enumerate(zip(frames, offsets, scales, exptimes)):
+                # Section of the frame which lands in the chunk
+                frame_y, frame_x = frame.data.shape
+                y0, y1 = max(y_min - dy, 0), min(y_max - dy, frame_y)
+                x0, x1 = max(-dx, 0), min(size_x - dx, frame_x)
+                if y0 < y1 and x0 < x1:
+                    section = frame.rows(y0, y1, x0, x1)
+                    if bias is not None:
+                        section -= bias[y0:y1, x0:x1]
+                    if dark is not None:
+                        section -= dark[y0:y1, x0:x1] * exptime
+                    cube[i, y0 + dy - y_min:y1 + dy - y_min, x0 + dx:x1 + dx] = section * scale
+            return _combine(cube, method, sigma, maxiters).astype(np.float32)
+
+        header = _merged_header(frames, method, (size_y, size_x))
+        if output is not None:
+            if os.path.exists(output) and not overwrite: raise FileExistsError(f"{output} already exists")
+            if os.path.exists(output):
+                os.remove(output)
+            writer = fits.StreamingHDU(output, header)
+        else:
+            stacked = np.empty((size_y, size_x), dtype=np.float32)
+
+        # Chunks are combined `workers` at a time and written in order
+        with ThreadPoolExecutor(workers) as executor:
+            for start in range(0, len(chunks), workers):
+                batch = chunks[start:start + workers]
+                for (y_min, y_max), combined in zip(batch, executor.map(combine_chunk, batch)):
+                    if output is not None:
+                        writer.write(combined)
+                    else:
+                        stacked[y_min:y_max] = combined
+
+        if output is not None:
+            writer.close()
+            writer = None
+            return output
+    finally:
+        for frame in frames:
+            frame.hdus.close()
+
+        # The stack failed while being written: remove the incomplete file
+        if writer is not None:
+            writer.close()
+            os.remove(output)
+
+    return FITSImage.from_hdu(fits.PrimaryHDU(stacked, header))
@@ -0,0 +1,144 @@
+import numpy as np
+
+from .instrumentation import instrument
+
+# Ways of computing the statistics of an image:
+#  - 'exact': over every pixel.
+#  - 'approximate': over a regular subsample of the pixels (see `subsample`).
+#  - 'clipped': iteratively sigma-clipped, over a regular subsample of the pixels
+#    (see `sigma_clip`). Robust against stars and hot pixels.
+MODES = ('exact', 'approximate', 'clipped')
+
+# Default number of pixels used by the subsampled modes
+MAX_SAMPLES = 1_000_000
+
+def subsample(array: np.ndarray, max_samples: int=MAX_SAMPLES) -> np.ndarray:
+    """
+    Regular subsample of an array, taking every n-th row and column so that
+    at most about `max_samples` values are kept. Skipped rows are not read,
+    which keeps the I/O of memory-mapped arrays low.
+
+    For `n` samples of roughly normal data, the standard error of the median
+    is about `1.25 * std / sqrt(n)`, i.e. ~0.1% of the std for the default.
+
+    Returns: flattened floating point copy of the sampled values.
+    """
+    if array.size <= max_samples:
+        return np.array(array, dtype=float).ravel()
+
+    step = int(np.ceil((array.size / max_samples) ** (1 / array.ndim)))
+    return np.array(array[(slice(None, None, step),) * array.ndim], dtype=float).ravel()
+
+def sigma_clip(values: np.ndarray, sigma: float=3.0, maxiters: int=5) -> np.ndarray:
+    """
+    Iteratively removes the values further than `sigma` standard deviations
+    from the median, until no values are removed or `maxiters` is reached.
+
+    Parameters:
+     - `values`: 1-D array of values to clip.
+     - `sigma`: number of standard deviations to clip at.
+     - `maxiters`: maximum number of clipping iterations.
+
+    Returns: the remaining values.
+    """
+    for _ in range(maxiters):
+        median, std = np.median(values), np.std(values)
+        kept = values[np.abs(values - median) <= sigma * std]
+
+        if kept.size == values.size or kept.size == 0:
+            break
+        values = kept
+
+    return values
+
+@instrument()
+def image_statistics(array: np.ndarray, mode: str='exact', max_samples: int=MAX_SAMPLES, sigma: float=3.0, maxiters: int=5) -> dict:
+    """
+    Computes the statistics of an array in one combined pass,
+    sharing a single working copy of the data.
+
+    Parameters:
+     - `array`: numpy array to compute the statistics of.
+     - `mode`: one of `MODES`.
+     - `max_samples`: number of pixels used by the subsampled modes.
+     - `sigma`, `maxiters`: clipping parameters of the `'clipped'` mode.
+
+    Returns: `dict` with the `'mean'`, `'std'`, `'median'` and
+    `'mad'` (median absolute deviation) of the array.
+    """
+    if mode not in MODES: raise ValueError(f"Statistics mode {mode} does not exist.")
+
+    # Working copy, which is partitioned and overwritten in place
+    if mode == 'exact':
+        values = np.array(array, dtype=float).ravel()
+    else:
+        values = subsample(array, max_samples)
+
+    if mode == 'clipped':
+        values = sigma_clip(values, sigma, maxiters)
+
+    mean = values.mean()
+    std = values.std()
+    median = np.median(values, overwrite_input=True)
+
+    # Absolute deviations, reusing the working copy
+    np.subtract(values, median, out=values)
+    np.abs(values, out=values)
+    mad = np.median(values, overwrite_input=True)
+
+    return {'mean': mean, 'std': std, 'median': median, 'mad': mad}
+
+
+class StatisticsCache:
+    """
+    Memoised statistics of an array. The statistics are computed
+    on first access and kept until `invalidate()` is called.
+
+    Parameters:
+     - `source`: function returning the array to compute the
+        statistics of. Only called when a statistic is computed.
+     - `mode`: Optional. How the statistics are computed, one of `MODES`.
+     - `sample`: Optional. Function returning a regular subsample of the array
+        (as floating point) given the maximum number of samples, used by the
+        subsampled modes instead of `source`. If none specified, `source()` is subsampled.
+    """
+    def __init__(self, source, mode: str='exact', sample=None):
+        if mode not in MODES: raise ValueError(f"Statistics mode {mode} does not exist.")
+
+        self.source = source
+        self.sample = sample if sample is not None else lambda max_samples: subsample(self.source(), max_samples)
+        self._mode: str = mode
+
+        self._statistics: dict = None
+        self._percentiles: dict = {}
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode: str):
+        if mode not in MODES: raise ValueError(f"Statistics mode {mode} does not exist.")
+
+        if mode != self._mode:
+            self._mode = mode
+            self.invalidate()
+
+    def __getitem__(self, name: str) -> float:
+        if self._statistics is None:
+            array = self.source() if self.mode == 'exact' else self.sample(MAX_SAMPLES)
+            self._statistics = image_statistics(array, self.mode)
+        return self._statistics[name]
+
+    @instrument()
+    def percentile(self, q: float) -> float:
+        """ `q`-th percentile of the array (0 <= q <= 100). Subsampled unless the mode is `'exact'`. """
+        if q not in self._percentiles:
+            values = self.source() if self.mode == 'exact' else self.sample(MAX_SAMPLES)
+            self._percentiles[q] = np.percentile(values, q)
+        return self._percentiles[q]
+
+    def invalidate(self) -> None:
+        """ Forgets all the computed statistics. """
+        self._statistics = None
+        self._percentiles = {}
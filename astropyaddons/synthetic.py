@@ -0,0 +1,124 @@
+import numpy as np
+from astropy.io import fits
+
+from .grid import Grid
+from .PSF.cache import PSFCache
+from .PSF.psf import PSF
+
+# Columns of the table of the stars of a `SyntheticField` (the known truth).
+# Coordinates are in pixels, (y, x), with pixel centers at integers, the same
+# as `astropyaddons.detection.detect_stars`.
+#  - `y`, `x`: center of the star.
+#  - `flux`: total counts of the star (sum of its stamp).
+#  - `peak`: brightest pixel of the star, without background.
+TRUTH_DTYPE = np.dtype([
+    ('y', float), ('x', float),
+    ('flux', float), ('peak', float),
+])
+
+# Number of stars rendered at once, which bounds the memory used for the stamps
+CHUNK_SIZE = 4096
+
+class SyntheticField:
+    """
+    Synthetic star field with a known truth, to test and benchmark detection
+    and photometry. Stars are rendered from interpolated PSF stamps (see
+    `PSFCache`), on a background plane with Poisson and read noise.
+
+    Parameters:
+     - `size_y`, `size_x`: size of the image, in pixels.
+     - `n_stars`: number of stars, placed uniformly at random.
+     - `psf`: `PSF` of the stars. Its amplitude does not matter, as each stamp
+        is normalised to the flux of its star.
+     - `flux_range`: `(min, max)` total counts of the stars, drawn from a
+        log-uniform distribution (many faint stars, few bright stars).
+     - `background`: background level at the center of the image, in counts.
+     - `gradient`: `(per y, per x)` change of the background per pixel.
+     - `read_noise`: standard deviation of the gaussian read noise.
+     - `poisson`: if `True`, adds Poisson (photon) noise to the counts.
+     - `wcs`: Optional. `(RA, DEC, pixel scale)` in degrees, for a tangent
+        plane projection centered on the image, written to the header.
+     - `margin`: minimum distance of the stars from the edges, in pixels.
+     - `seed`: seed of the random number generator, for reproducible fields.
+     - `cache`: Optional. `PSFCache` to take the stamps from. Its shape sets the
+        size of the stamps. If none specified, uses 25x25 stamps.
+    """
+    def __init__(self, size_y: int, size_x: int, n_stars: int, psf: PSF, flux_range: tuple[float, float]=(1e3, 1e5),
+                 background: float=100.0, gradient: tuple[float, float]=(0.0, 0.0), read_noise: float=5.0,
+                 poisson: bool=True, wcs: tuple[float, float, float]=None, margin: int=0, seed: int=None, cache: PSFCache=None):
+        if not isinstance(psf, PSF): raise TypeError("'psf' must be a PSF")
+        if n_stars < 0: raise ValueError("'n_stars' must not be negative")
+        if flux_range[0] <= 0 or flux_range[1] < flux_range[0]: raise ValueError("'flux_range' must be positive and increasing")
+
+        self.psf = psf
+        self.header = self._header(size_y, size_x, wcs)
+        self.cache = cache if cache is not None else PSFCache()
+        rng = np.random.default_rng(seed)
+
+        ### STARS
+        self.stars = np.zeros(n_stars, dtype=TRUTH_DTYPE)
+        self.stars['y'] = rng.uniform(margin - 0.5, size_y - margin - 0.5, n_stars)
+        self.stars['x'] = rng.uniform(margin - 0.5, size_x - margin - 0.5, n_stars)
+        self.stars['flux'] = np.exp(rng.uniform(*np.log(flux_range), n_stars))
+
+        ### IMAGE
+        image = np.zeros((size_y, size_x))
+
+        # Background plane, relative to the center of the image
+        y, x = np.arange(size_y)[:, np.newaxis], np.arange(size_x)[np.newaxis, :]
+        image += background + gradient[0] * (y - (size_y - 1) / 2) + gradient[1] * (x - (size_x - 1) / 2)
+
+        for start in range(0, n_stars, CHUNK_SIZE):
+            self._add_stars(image, slice(start, start + CHUNK_SIZE))
+
+        if poisson:
+            image[:] = rng.poisson(np.maximum(image, 0))
+        if read_noise > 0:
+            image += rng.normal(0, read_noise, image.shape)
+
+        self.grid: Grid = Grid(image)
+
+    def _add_stars(self, image: np.ndarray, rows: slice) -> None:
+        """ Adds the stars `rows` of `self.stars` to `image`, and fills their `peak`. """
+        stars = self.stars[rows]
+
+        # Pixel [y, x] of a `PSF` stamp spans x..x+1, so pixel centers are at +0.5
+        stamps, origins = self.cache.stamps(self.psf, np.column_stack([stars['x'] + 0.5, stars['y'] + 0.5]))
+        stamps *= (stars['flux'] / stamps.sum(axis=(1, 2)))[:, np.newaxis, np.newaxis]
+        self.stars['peak'][rows] = stamps.max(axis=(1, 2))
+
+        # Pixels of every stamp, without those outside of the image
+        size_y, size_x = self.cache.shape
+        y = origins[:, 0, np.newaxis, np.newaxis] + np.arange(size_y)[np.newaxis, :, np.newaxis]
+        x = origins[:, 1, np.newaxis, np.newaxis] + np.arange(size_x)[np.newaxis, np.newaxis, :]
+        y, x = np.broadcast_arrays(y, x)
+        inside = (y >= 0) & (y < image.shape[0]) & (x >= 0) & (x < image.shape[1])
+
+        # Stamps overlap, so they are summed by pixel with `bincount`
+        index = y[inside] * image.shape[1] + x[inside]
+        image += np.bincount(index, weights=stamps[inside], minlength=image.size).reshape(image.shape)
+
+    @staticmethod
+    def _header(size_y: int, size_x: int, wcs: tuple[float, float, float]) -> fits.Header:
+        header = fits.Header()
+        header['DATE-OBS'] = '2000-01-01T00:00:00'
+        header['EXPTIME'] = 1.0
+        header['FILTER'] = 'SYNTHETIC'
+
+        if wcs is not None:
+            ra, dec, pixel_scale = wcs
+            header['CTYPE1'], header['CTYPE2'] = 'RA---TAN', 'DEC--TAN'
+            header['CRVAL1'], header['CRVAL2'] = float(ra), float(dec)
+            # FITS pixels are 1-based
+            header['CRPIX1'], header['CRPIX2'] = (size_x + 1) / 2, (size_y + 1) / 2
+            header['CDELT1'], header['CDELT2'] = -float(pixel_scale), float(pixel_scale)
+            header['CUNIT1'], header['CUNIT2'] = 'deg', 'deg'
+
+        return header
+
+    def write(self, filepath: str, dtype=np.float32, overwrite: bool=False) -> None:
+        """
+        Writes the field to a FITS file, which can be loaded with `FITSImage`.
+        The truth is not written: keep `self.stars`, or regenerate with the same seed.
+        """
+        fits.PrimaryHDU(self.grid.grid.astype(dtype), header=self.header).writeto(filepath, overwrite=overwrite)
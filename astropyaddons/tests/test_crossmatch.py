@@ -0,0 +1,46 @@
+import numpy as np
+from astropy.coordinates import SkyCoord
+import astropy.units as u
+
+from astropyaddons.PSF.psf import GaussianPSF
+from astropyaddons.crossmatch import Catalogue, crossmatch, match_pixels
+from astropyaddons.images.header import Header
+from astropyaddons.images.wcs import WCS
+from astropyaddons.synthetic import SyntheticField
+
+def test_match_separations():
+    rng = np.random.default_rng(0)
+    ra, dec = rng.uniform(0, 360, 2000), np.degrees(np.arcsin(rng.uniform(-1, 1, 2000)))
+    chosen = rng.choice(2000, 200, replace=False)
+    query_ra, query_dec = ra[chosen] + rng.normal(0, 1 / 3600, 200), dec[chosen] + rng.normal(0, 1 / 3600, 200)
+
+    index, separation = Catalogue(ra, dec).match(query_ra, query_dec, 10)
+    np.testing.assert_array_equal(index, chosen)
+
+    expected = SkyCoord(query_ra * u.deg, query_dec * u.deg).separation(SkyCoord(ra[index] * u.deg, dec[index] * u.deg)).arcsec
+    np.testing.assert_allclose(separation, expected, atol=1e-6)
+
+def test_match_across_ra_zero_and_poles():
+    index, separation = crossmatch([0.0001, 10.0, 45.0], [0.0, 89.9999, 20.0], [359.9999, 190.0], [0.0, 89.9999], 3)
+    np.testing.assert_array_equal(index, [0, 1, -1])
+    np.testing.assert_allclose(separation[:2], [0.72, 0.72], atol=1e-3)
+    assert separation[2] == np.inf
+
+def test_unique_keeps_the_nearest():
+    catalogue = Catalogue([10.0], [20.0])
+    index, separation = catalogue.match([10.0, 10.0], [20.0 + 2 / 3600, 20.0 + 1 / 3600], 5, unique=True)
+    np.testing.assert_array_equal(index, [-1, 0])
+    assert separation[0] == np.inf
+
+    assert [list(indices) for indices in catalogue.within([10.0, 11.0], [20.0, 20.0], 5)] == [[0], []]
+
+def test_match_pixels():
+    field = SyntheticField(100, 120, 0, GaussianPSF(1.5, 1.0), wcs=(150.0, 20.0, 1e-4))
+    wcs = WCS(Header(field.header))
+    centers = np.array([[10.0, 20.0], [50.0, 60.0], [90.0, 100.0]])
+    world = wcs.pixel_to_world(centers[:, 0], centers[:, 1])
+
+    catalogue = Catalogue(world[::-1, 0], world[::-1, 1])
+    index, separation = match_pixels(wcs, centers + 0.1, catalogue, 1)
+    np.testing.assert_array_equal(index, [2, 1, 0])
+    np.testing.assert_allclose(separation, np.hypot(0.1, 0.1) * 0.36, rtol=1e-2)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from astropyaddons.detection import detect_stars
+from astropyaddons.grid import Grid
+
+def _image(centers, size=(40, 50)):
+    y, x = np.mgrid[:size[0], :size[1]]
+    image = np.ones(size)
+    for center_y, center_x in centers:
+        image += 100 * np.exp(-((y - center_y)**2 + (x - center_x)**2) / 2)
+    return image
+
+def test_centroids():
+    stars = detect_stars(Grid(_image([(10.2, 12.7), (30.0, 35.4)])), 5, 1.0, tile_size=16)
+    np.testing.assert_allclose(stars['y'], [10.2, 30.0], atol=0.02)
+    np.testing.assert_allclose(stars['x'], [12.7, 35.4], atol=0.02)
+
+def test_edge_pixels_are_counted_once():
+    image = _image([(0.0, 20.0)])
+    star, = detect_stars(image, 5, 1.0, box=3)
+
+    # Only the rows of the box inside the image contribute
+    assert star['flux'] == pytest.approx(np.sum(image[:4, 17:24] - 1.0))
+    assert star['x'] == pytest.approx(20.0)
+
+def test_flat_peaks_warn():
+    image = np.ones((20, 20))
+    image[10, 10:12] = 50
+    with pytest.warns(UserWarning, match="1 stars were not identified as a single point"):
+        star, = detect_stars(image, 5, 1.0)
+    assert star['npix'] == 2
+
+def test_flat_peak_across_seams():
+    # Saturated core much wider than the halo, straddling the seams of the tiles
+    image = _image([(15.5, 31.5)], size=(64, 64))
+    image[10:22, 26:38] = 1000
+
+    with pytest.warns(UserWarning):
+        untiled = detect_stars(image, 5, 1.0, tile_size=1024)
+    for tile_size in (32, 16, 8):
+        with pytest.warns(UserWarning, match="1 stars"):
+            tiled = detect_stars(Grid(image), 5, 1.0, tile_size=tile_size)
+        np.testing.assert_array_equal(tiled, untiled)
+    assert untiled['npix'] == [144]
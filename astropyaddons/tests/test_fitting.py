@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from astropyaddons.grid import Grid
+from astropyaddons.PSF.fitting import FIT_COLUMNS, fit_psf
+from astropyaddons.PSF.psf import GaussianPSF
+
+TRUTH_DTYPE = np.dtype([('y', float), ('x', float), ('flux', float)])
+
+@pytest.fixture(scope='module')
+def field():
+    """ Bright stars, some of them close enough to be fitted in groups, on a noisy background of 100 counts """
+    rng = np.random.default_rng(2)
+    stars = np.zeros(12, dtype=TRUTH_DTYPE)
+    stars['y'], stars['x'] = rng.uniform(7.5, 87.5, 12), rng.uniform(7.5, 119.5, 12)
+    stars['flux'] = rng.uniform(2e4, 5e4, 12)
+
+    # Pixel [y, x] of a rendered grid spans x..x+1, so pixel centers are at +0.5
+    images = GaussianPSF(1.5, 1.0).render_batch(np.column_stack([stars['x'] + 0.5, stars['y'] + 0.5]), (96, 128))
+    image = 100.0 + np.einsum('nyx,n->yx', images, stars['flux'] / images.sum(axis=(1, 2)))
+    image = rng.poisson(image) + rng.normal(0, 5.0, image.shape)
+
+    centers = np.round(np.column_stack([stars['y'], stars['x']]))
+    return Grid(image), stars, centers
+
+def _scaled_grid(grid):
+    """ Grid of the field stored as scaled integers, as a memory-mapped FITS image would be """
+    return Grid(np.round(grid.grid * 2).astype(np.int32), scale=0.5)
+
+def _assert_recovered(results, stars):
+    np.testing.assert_allclose(results['y'], stars['y'], atol=0.05)
+    np.testing.assert_allclose(results['x'], stars['x'], atol=0.05)
+    np.testing.assert_allclose(results['flux'], stars['flux'], rtol=0.03)
+    np.testing.assert_allclose(results['background'], 100.0, atol=5)
+
+def test_recovery(field):
+    grid, stars, centers = field
+    scaled = _scaled_grid(grid)
+    results = fit_psf(scaled, centers, GaussianPSF(1.5, 1.0))
+
+    # Isolated stars and groups of blended stars
+    group_sizes = np.bincount(results['group'])[results['group']]
+    assert np.any(group_sizes == 1) and np.any(group_sizes > 1)
+    _assert_recovered(results, stars)
+    assert np.all(results['nfev'] > 1)
+    # Only the boxes of the stars were read
+    assert scaled._grid is None
+
+def test_group_radius(field):
+    grid, _, centers = field
+    grouped = fit_psf(grid, centers, GaussianPSF(1.5, 1.0))
+    results = fit_psf(grid, centers, GaussianPSF(1.5, 1.0), group_radius=0)
+    assert len(np.unique(results['group'])) == len(centers)
+
+    # Stars are fitted independently of each other, so isolated stars are unchanged
+    isolated = np.bincount(grouped['group'])[grouped['group']] == 1
+    for name in ('y', 'x', 'flux', 'background', 'std', 'max', 'nfev'):
+        np.testing.assert_array_equal(results[name][isolated], grouped[name][isolated])
+
+def test_fixed(field):
+    grid, stars, centers = field
+    # Width of the gaussian integrated over the pixels
+    std = np.sqrt(1.5**2 + 1 / 12)
+    results = fit_psf(grid, centers, GaussianPSF(std, 1.0), fixed=('std',))
+    assert np.all(results['std'] == std)
+    _assert_recovered(results, stars)
+
+    with pytest.raises(ValueError, match="no parameter beta"):
+        fit_psf(grid, centers, GaussianPSF(std, 1.0), fixed=('beta',))
+
+def test_no_centers(field):
+    grid, _, _ = field
+    results = fit_psf(grid, np.zeros((0, 2)), GaussianPSF(1.5, 1.0))
+    assert len(results) == 0
+    assert results.dtype.names == tuple(name for name, _ in FIT_COLUMNS) + ('std', 'max')
+
+def test_workers(field):
+    grid, _, centers = field
+    expected = fit_psf(grid, centers, GaussianPSF(1.5, 1.0))
+    np.testing.assert_array_equal(fit_psf(grid, centers, GaussianPSF(1.5, 1.0), workers=2), expected)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from astropyaddons.grid import Grid
+from astropyaddons.statistics import image_statistics
+
+def test_grid_is_read_only():
+    grid = Grid(np.arange(12.0).reshape(3, 4))
+    with pytest.raises(ValueError, match="read-only"):
+        grid.grid[0, 0] = 100.0
+    with pytest.raises(ValueError, match="read-only"):
+        grid.grid[1:] *= 2.0
+
+@pytest.mark.parametrize('scale', [1.0, 2.0])
+def test_cutout_and_take_are_copies(scale):
+    grid = Grid(np.arange(12, dtype=np.int16).reshape(3, 4), scale, 1.0)
+    grid.grid #Promotes scaled values
+    median = grid.median
+
+    grid.cutout(0, 2, 0, 2)[:] = 100.0
+    grid.take(np.array([2]), np.array([3]))[:] = 100.0
+    assert grid.median == median == np.median(grid.grid)
+
+def test_setitem_invalidates_statistics():
+    grid = Grid(np.arange(12.0).reshape(3, 4))
+    assert grid.median == 5.5 and grid.generation == 0
+
+    grid[0, :] = 100.0
+    assert grid.median == np.median([100.0] * 4 + list(range(4, 12)))
+    assert grid.generation == 1
+
+def test_setitem_scaled():
+    raw = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    grid = Grid(raw, scale=2.0, offset=10.0)
+    assert grid.mean == 2 * 5.5 + 10
+
+    grid[2, :] = 0.0
+    assert grid.mean == (2 * np.arange(8).mean() + 10) * 8 / 12
+    assert grid.take(np.array([2]), np.array([0]))[0] == 0.0
+    # The stored values are left untouched
+    assert raw[2, 0] == 8
+
+def test_replace_invalidates_statistics():
+    grid = Grid(np.zeros((4, 4)))
+    assert grid.std == 0.0
+
+    grid.grid = np.arange(16.0).reshape(4, 4)
+    assert grid.std == np.arange(16.0).std()
+    assert grid.generation == 1
+
+def test_invalidate_after_writing_the_array():
+    array = np.ones((4, 4))
+    grid = Grid(array)
+    assert grid.percentile(100) == 1.0
+
+    array[0, 0] = 5.0
+    grid.invalidate()
+    assert grid.percentile(100) == 5.0
+
+@pytest.mark.parametrize('mode', ['approximate', 'clipped'])
+def test_subsampled_statistics_of_scaled_grid(mode):
+    raw = np.random.default_rng(0).integers(0, 1000, (1200, 1000)).astype(np.int16)
+    grid = Grid(raw, scale=2.0, offset=32768.0, statistics_mode=mode)
+    expected = image_statistics(raw * 2.0 + 32768.0, mode)
+
+    assert grid.median == expected['median'] and grid.std == expected['std']
+    # Only the sample was scaled
+    assert grid._grid is None
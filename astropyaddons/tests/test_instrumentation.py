@@ -0,0 +1,88 @@
+import json
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from astropyaddons import instrumentation
+from astropyaddons.instrumentation import instrument, stage
+
+@pytest.fixture(autouse=True)
+def clean():
+    """ Every test starts disabled and without records, and the initial state is restored after it """
+    was_enabled = instrumentation.enabled()
+    instrumentation.disable()
+    instrumentation.reset()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+    if was_enabled:
+        instrumentation.enable()
+
+@instrument()
+def _square(value):
+    return value**2
+
+def test_disabled_records_nothing():
+    with stage('stage'):
+        assert _square(3) == 9
+    assert instrumentation.statistics() == {}
+    assert not tracemalloc.is_tracing()
+
+def test_stages():
+    instrumentation.enable()
+    for value in range(3):
+        with stage('loop'):
+            _square(value)
+
+    statistics = instrumentation.statistics()
+    assert statistics['loop']['calls'] == 3
+    assert statistics[f'{__name__}._square']['calls'] == 3
+    assert statistics['loop']['total'] >= statistics[f'{__name__}._square']['total']
+    assert 'loop' in instrumentation.report().splitlines()[1]
+
+def test_nested_peaks():
+    instrumentation.enable(memory=True)
+    with stage('outer'):
+        allocated = np.ones(30 * 2**20, dtype=np.uint8)
+        del allocated
+        with stage('inner'):
+            allocated = np.ones(5 * 2**20, dtype=np.uint8)
+            del allocated
+
+    statistics = instrumentation.statistics()
+    # The peak of the outer stage before the inner one is kept when the peak is reset for the inner stage
+    assert statistics['outer']['peak_bytes'] >= 30 * 2**20
+    assert 5 * 2**20 <= statistics['inner']['peak_bytes'] < 10 * 2**20
+
+    instrumentation.disable()
+    assert not tracemalloc.is_tracing()
+
+def test_reset():
+    instrumentation.enable(trace=True)
+    with stage('stage'):
+        pass
+    assert instrumentation.statistics() and instrumentation._events
+
+    instrumentation.reset()
+    assert instrumentation.statistics() == {} and instrumentation._events == []
+
+def test_write_trace(tmp_path):
+    instrumentation.enable(trace=True)
+    with stage('outer'):
+        with stage('inner'):
+            pass
+
+    filepath = str(tmp_path / 'trace.json')
+    instrumentation.write_trace(filepath)
+    with open(filepath) as file:
+        trace = json.load(file)
+
+    assert trace['displayTimeUnit'] == 'ms'
+    inner, outer = trace['traceEvents']
+    for event, name in [(inner, 'inner'), (outer, 'outer')]:
+        assert set(event) == {'name', 'ph', 'pid', 'tid', 'ts', 'dur', 'args'}
+        assert (event['name'], event['ph'], event['pid'], event['args']) == (name, 'X', os.getpid(), {'bytes': 0})
+    # Complete events, in microseconds: the inner stage lies within the outer one
+    assert outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
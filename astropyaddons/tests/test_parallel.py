@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from astropyaddons.parallel import bounded_map
+
+def _divide(a, b):
+    if b == -1:
+        os._exit(1)
+    return a / b
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_errors_are_returned(workers):
+    results = list(bounded_map(_divide, [(1, 2), (1, 0), (3, 4)], workers, max_in_flight=1))
+
+    assert [(job, result) for job, result, _ in results] == [((1, 2), 0.5), ((1, 0), None), ((3, 4), 0.75)]
+    assert [error is None for _, _, error in results] == [True, False, True]
+    assert 'ZeroDivisionError' in results[1][2]
+
+def test_dead_worker():
+    results = list(bounded_map(_divide, [(1, 2), (1, -1), (3, 4), (5, 4)], workers=2, max_in_flight=1))
+
+    assert [result for _, result, _ in results] == [0.5, None, 0.75, 1.25]
+    assert 'BrokenProcessPool' in results[1][2]
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_max_in_flight_must_be_positive(workers):
+    with pytest.raises(ValueError, match="'max_in_flight' must be positive"):
+        list(bounded_map(_divide, [(1, 2)], workers, max_in_flight=0))
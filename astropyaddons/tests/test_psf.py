@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from astropyaddons.PSF.psf import GaussianPSF, MoffatPSF, gaussian
+
+def test_gaussian_function():
+    # Used to evaluate a moffat distribution with the parameters of the gaussian
+    psf = GaussianPSF(2.0, 3.0)
+    r = np.array([0.0, 1.0, 2.0, 5.0])
+    np.testing.assert_allclose(psf.function(r), gaussian(r, 2.0, 3.0))
+    np.testing.assert_allclose(psf.function(r), 3.0 * np.exp(-r**2 / 8))
+
+@pytest.mark.parametrize('oversample', [3, 5, 8])
+def test_gauss_legendre_matches_exact_gaussian(oversample):
+    psf = GaussianPSF(1.5, 2.0)
+    centers = [(7.3, 6.8), (0.5, 10.0), (12.0, 3.25)]
+    exact = psf.render_batch(centers, (13, 14))
+
+    tolerance = {3: 1e-3, 5: 1e-6, 8: 1e-10}[oversample] * psf.max
+    np.testing.assert_allclose(psf.render_batch(centers, (13, 14), oversample), exact, atol=tolerance)
+    # Nearly all the light of the centered source is on the grid
+    assert exact[0].sum() == pytest.approx(2 * np.pi * psf.std**2 * psf.max, rel=1e-4)
+
+@pytest.mark.parametrize('psf', [GaussianPSF(1.5, 2.0), MoffatPSF(2.0, 3.0, 1.0)], ids=['gaussian', 'moffat'])
+def test_render_matches_counts_pixel(psf):
+    center = (4.3, 3.6)
+    grid = psf.render(center, (8, 9))
+    for y, x in [(3, 4), (2, 6), (0, 0), (7, 8)]:
+        assert grid[y, x] == pytest.approx(psf.counts_pixel(center, (x, y)), rel=1e-4, abs=1e-4 * psf.max)
+
+def test_render_batch_matches_render():
+    psf = MoffatPSF(2.0, 3.0, 1.0)
+    centers = [(4.3, 3.6), (1.0, 7.9)]
+    batch = psf.render_batch(centers, (8, 9))
+    for center, grid in zip(centers, batch):
+        np.testing.assert_array_equal(grid, psf.render(center, (8, 9)))
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+from astropyaddons.PSF.cache import PSFCache
+from astropyaddons.PSF.psf import GaussianPSF, MoffatPSF
+
+def _rendered(psf, cache, center):
+    """ Stamp of `cache` for `center` (x, y), and the same stamp rendered directly """
+    stamp, (origin_y, origin_x) = cache.stamp(psf, center)
+    return stamp, psf.render((center[0] - origin_x, center[1] - origin_y), cache.shape)
+
+@pytest.mark.parametrize('psf', [GaussianPSF(1.5, 1.0), MoffatPSF(2.0, 3.0, 1.0)], ids=['gaussian', 'moffat'])
+def test_interpolated_stamps(psf):
+    cache = PSFCache((15, 17), phases=8)
+
+    # On the phases of the table, the stamps are exact
+    stamp, rendered = _rendered(psf, cache, (30.25, 12.625))
+    np.testing.assert_allclose(stamp, rendered, atol=1e-12)
+
+    # Between phases, bilinear interpolation errors are small, and decrease with more phases
+    errors = []
+    for phases in (8, 16):
+        cache = PSFCache((15, 17), phases=phases)
+        stamps = [_rendered(psf, cache, center) for center in [(30.3, 12.71), (-4.97, 8.06), (100.55, 0.99)]]
+        errors.append(max(np.abs(stamp - rendered).max() for stamp, rendered in stamps))
+    assert errors[0] < 5e-3 * psf.max
+    assert errors[1] < errors[0] / 3
+
+def test_stamps_match_stamp():
+    psf, cache = GaussianPSF(1.5, 1.0), PSFCache((9, 9))
+    centers = np.array([[3.2, 4.9], [10.0, -2.5]])
+    stamps, origins = cache.stamps(psf, centers)
+    for center, stamp, origin in zip(centers, stamps, origins):
+        single, single_origin = cache.stamp(psf, center)
+        np.testing.assert_array_equal(stamp, single)
+        assert single_origin == tuple(origin)
+    # The first pixel of the stamps, with the center in their middle pixel
+    np.testing.assert_array_equal(origins, [[0, -1], [-7, 6]])
+
+def test_least_recently_used_tables_are_removed():
+    psfs = [GaussianPSF(std, 1.0) for std in (1.0, 1.5, 2.0)]
+    table_bytes = PSFCache((9, 9), phases=4).table(psfs[0]).nbytes
+    cache = PSFCache((9, 9), phases=4, max_bytes=2 * table_bytes)
+
+    first = cache.table(psfs[0])
+    cache.table(psfs[1])
+    # Using the first table again makes the second the least recently used
+    assert cache.table(psfs[0]) is first
+    cache.table(psfs[2])
+
+    assert cache.nbytes == 2 * table_bytes
+    assert [key[1] for key in cache._tables] == [(('max', 1.0), ('std', 1.0)), (('max', 1.0), ('std', 2.0))]
+
+    # A table larger than the budget is still kept, alone
+    cache.max_bytes = table_bytes // 2
+    cache.table(psfs[1])
+    assert len(cache._tables) == 1 and cache.nbytes == table_bytes
+
+def test_tables_are_reloaded_from_disk(tmp_path, monkeypatch):
+    psf = MoffatPSF(2.0, 3.0, 1.0)
+    table = PSFCache((9, 11), phases=4, directory=str(tmp_path)).table(psf)
+    assert len(os.listdir(tmp_path)) == 1
+
+    def no_render(self, psf):
+        raise AssertionError("The table was rendered again")
+    monkeypatch.setattr(PSFCache, '_render_table', no_render)
+
+    cache = PSFCache((9, 11), phases=4, directory=str(tmp_path))
+    np.testing.assert_array_equal(cache.table(psf), table)
+
+    # Tables of other parameters, shapes or phases are not reused
+    with pytest.raises(AssertionError, match="rendered again"):
+        PSFCache((9, 11), phases=8, directory=str(tmp_path)).table(psf)
+    with pytest.raises(AssertionError, match="rendered again"):
+        cache.table(MoffatPSF(2.0, 2.5, 1.0))
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from astropyaddons.registration import AffineTransform, AsterismIndex, register, resample
+
+def _rotation(angle: float, shift: tuple[float, float], scale: float=1.0) -> AffineTransform:
+    cos, sin = scale * np.cos(angle), scale * np.sin(angle)
+    return AffineTransform([[cos, -sin, shift[0]], [sin, cos, shift[1]]])
+
+@pytest.fixture
+def stars():
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 1000, (60, 2))
+
+def test_inverse_round_trip(stars):
+    transform = _rotation(0.3, (12.5, -40.0), 1.02)
+    np.testing.assert_allclose(transform.inverse(transform(stars)), stars, atol=1e-9)
+
+def test_register_round_trip(stars):
+    truth = _rotation(0.2, (15.3, -22.7))
+    # The target frame sees the reference stars through the inverse transform, in another order, with a few missing
+    target = truth.inverse(stars)[::-1][5:]
+    transform = register(stars, target)
+
+    np.testing.assert_allclose(transform.matrix, truth.matrix, atol=1e-6)
+    assert transform.residual < 1e-6 and len(transform.matches) >= 10
+
+    # And back, with one index for many frames
+    back = AsterismIndex(target).register(stars)
+    np.testing.assert_allclose(back.matrix, truth.inverse.matrix, atol=1e-6)
+
+def test_register_unrelated_frames(stars):
+    with pytest.raises(ValueError):
+        register(stars, np.random.default_rng(1).uniform(0, 1000, (60, 2)))
+
+@pytest.mark.parametrize('order', [1, 3])
+def test_resample_round_trip(order):
+    y, x = np.mgrid[:120, :100]
+    image = np.exp(-((y - 60.0)**2 + (x - 45.0)**2) / 200) + 0.001 * x
+    transform = _rotation(0.1, (3.2, -2.6))
+
+    # Splines spread NaN over the whole image, so pixels moved out of it are 0 in between
+    moved = resample(image, transform.inverse, order=order, cval=0.0, band_rows=16)
+    aligned = resample(moved, transform, order=order, band_rows=16)
+
+    # Pixels which stayed in the image both ways, away from its edges
+    kept = resample(resample(np.ones(image.shape), transform.inverse, order=0, cval=0.0), transform, order=0, cval=0.0) > 0
+    kept = ndimage.binary_erosion(kept, iterations=4)
+    assert kept.mean() > 0.7
+    np.testing.assert_allclose(aligned[kept], image[kept], atol=0.02 if order == 1 else 2e-3)
@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from astropyaddons import stacking
+
+@pytest.fixture
+def frames(tmp_path):
+    rng = np.random.default_rng(0)
+    filepaths = []
+    for i in range(5):
+        header = fits.Header()
+        header['DATE-OBS'], header['EXPTIME'], header['FILTER'] = f'2024-01-0{i+1}T00:00:00', 10.0, 'V'
+        filepaths.append(str(tmp_path / f'frame{i}.fits'))
+        fits.PrimaryHDU(rng.normal(100, 5, (40, 30)).astype(np.float32), header=header).writeto(filepaths[-1])
+    return filepaths
+
+@pytest.mark.parametrize('method', ['mean', 'median'])
+def test_stack(frames, tmp_path, method):
+    cube = np.array([fits.getdata(filepath) for filepath in frames], dtype=float)
+    expected = np.mean(cube, axis=0) if method == 'mean' else np.median(cube, axis=0)
+
+    output = str(tmp_path / 'stack.fits')
+    assert stacking.stack(frames, output, method=method, max_bytes=1, workers=2) == output
+    with fits.open(output) as hdus:
+        np.testing.assert_allclose(hdus[0].data, expected, rtol=1e-6)
+        assert hdus[0].header['NCOMBINE'] == 5
+
+    image = stacking.stack(frames, method=method, max_bytes=1, workers=2)
+    np.testing.assert_allclose(image.grid.grid, expected, rtol=1e-6)
+
+def test_failed_stack_leaves_no_output(frames, tmp_path, monkeypatch):
+    calls = []
+    def failing_combine(*arguments):
+        calls.append(None)
+        if len(calls) > 3:
+            raise RuntimeError("combination failed")
+        return combine(*arguments)
+    combine = stacking._combine
+    monkeypatch.setattr(stacking, '_combine', failing_combine)
+
+    output = str(tmp_path / 'stack.fits')
+    with pytest.raises(RuntimeError):
+        stacking.stack(frames, output, max_bytes=1, workers=1)
+    assert not os.path.exists(output)
@@ -0,0 +1,131 @@
+"""
+Runs the benchmarks of `benchmarks/suite.py`, and compares them to a baseline.
+
+Usage (from the root of the repository):
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json --threshold 0.2
+"""
+import argparse
+import fnmatch
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from .suite import REGISTRY
+
+def measure(function, repeat: int=5) -> dict:
+    """
+    Times `function` `repeat` times, then measures its peak memory in one more call.
+    Memory is measured separately, as tracing allocations slows down the call.
+
+    Returns: `dict` with the `'min'` and `'median'` wall time in seconds,
+    the number of timed calls and the `'peak_bytes'` allocated during a call.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'min': min(times), 'median': float(np.median(times)), 'repeat': repeat, 'peak_bytes': peak}
+
+def run(pattern: str='*', repeat: int=5, sizes: tuple[int]=None, stars: tuple[int]=None) -> dict:
+    """
+    Runs the benchmarks whose name matches `pattern` (e.g. `'detection.*'`).
+    `sizes` and `stars` restrict the parameters each benchmark is run with.
+
+    Returns: `dict` of the results, keyed by `'name[size=...,stars=...]'`.
+    """
+    results = {}
+    for name, (setup, parameters) in REGISTRY.items():
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+
+        for size, n_stars in itertools.product(parameters['size'], parameters['stars']):
+            if (sizes and size not in sizes) or (stars and n_stars not in stars):
+                continue
+
+            key = f'{name}[size={size},stars={n_stars}]'
+            results[key] = measure(setup(size, n_stars), repeat)
+            print(f"{key:<55} {results[key]['min']*1e3:>10.2f} ms {results[key]['peak_bytes']/2**20:>10.2f} MiB", flush=True)
+
+    return results
+
+def metadata() -> dict:
+    """ Information about the run, to tell results apart. """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+    }
+
+def compare(results: dict, baseline: dict, threshold: float=0.2) -> list[str]:
+    """
+    Compares the minimum times and peak memory of `results` to `baseline`.
+    Prints a table of the ratios (current / baseline).
+
+    Returns: the keys of the benchmarks slower, or using more memory,
+    than the baseline by more than `threshold` (e.g. 0.2 for 20%).
+    """
+    regressions = []
+    print(f"\n{'benchmark':<55} {'time':>8} {'memory':>8}")
+    for key in sorted(results.keys() & baseline.keys()):
+        time_ratio = results[key]['min'] / max(baseline[key]['min'], 1e-12)
+        memory_ratio = results[key]['peak_bytes'] / max(baseline[key]['peak_bytes'], 1)
+
+        regressed = time_ratio > 1 + threshold or memory_ratio > 1 + threshold
+        if regressed:
+            regressions.append(key)
+        print(f"{key:<55} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+def main(argv: list[str]=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of astrophys and astropyaddons.")
+    parser.add_argument('pattern', nargs='?', default='*', help="benchmarks to run, e.g. 'detection.*'")
+    parser.add_argument('--repeat', type=int, default=5, help="number of timed calls of each benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', help="only run with these image sizes")
+    parser.add_argument('--stars', type=int, nargs='+', help="only run with these numbers of stars")
+    parser.add_argument('--output', help="JSON file to save the results to")
+    parser.add_argument('--compare', help="JSON file of baseline results to compare to")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, args.repeat, args.sizes, args.stars)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'metadata': metadata(), 'results': results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%} against {baseline['metadata'].get('commit')}.")
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Registered benchmarks: name -> (function, parameters). See `benchmark`.
+REGISTRY: dict = {}
+
+# Default parameters of the benchmarks
+SIZES = (512, 2048)
+STARS = (100, 1000)
+
+# Building a `Star` per star is slow, so only this many are timed
+STAR_LIMIT = 200
+
+# Aperture and annulus radii used by the region and photometry benchmarks
+APERTURE, R1, R2 = 5, 8, 12
+
+def benchmark(name: str, sizes: tuple[int]=SIZES, stars: tuple[int]=STARS):
+    """
+    Registers a benchmark, run for every combination of `sizes` and `stars`.
+
+    The decorated function takes `(size, stars)` and does all the setup (loading the
+    input field, etc.). It returns the function to time, which takes no arguments.
+    The returned function is called several times, so it must not rely on
+    anything cached by a previous call.
+    """
+    def register(function):
+        REGISTRY[name] = (function, {'size': sizes, 'stars': stars})
+        return function
+    return register
+
+### INPUTS
+_fields: dict = {}
+
+def field(size: int, stars: int) -> tuple[str, np.ndarray]:
+    """
+    Synthetic field of `size` x `size` pixels with `stars` stars, written to a
+    temporary FITS file once per run (removed on exit).
+
+    Returns: the filepath, and the `(y, x)` centers of the stars.
+    """
+    if (size, stars) not in _fields:
+        from astropyaddons.PSF.psf import GaussianPSF
+        from astropyaddons.synthetic import SyntheticField
+
+        synthetic = SyntheticField(size, size, stars, GaussianPSF(1.8, 1.0), wcs=(150.0, 20.0, 1e-4), margin=R2 + 1, seed=0)
+        directory = tempfile.mkdtemp(prefix='astropyaddons-bench-')
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        filepath = os.path.join(directory, f'field_{size}_{stars}.fits')
+        synthetic.write(filepath)
+        _fields[size, stars] = filepath, np.column_stack([synthetic.stars['y'], synthetic.stars['x']])
+
+    return _fields[size, stars]
+
+### LOADING
+@benchmark('load.astrophys')
+def load_astrophys(size, stars):
+    from astrophys.fitsimage import FITSImage
+    filepath, _ = field(size, stars)
+    return lambda: FITSImage(filepath)
+
+@benchmark('load.astropyaddons')
+def load_astropyaddons(size, stars):
+    from astropyaddons.images.fitsimage import FITSImage
+    filepath, _ = field(size, stars)
+    return lambda: FITSImage(filepath)
+
+### WCS
+@benchmark('wcs.construct', stars=STARS[:1])
+def wcs_construct(size, stars):
+    from astropyaddons.images.fitsimage import FITSImage
+    from astropyaddons.images.wcs import WCS
+    image = FITSImage(field(size, stars)[0])
+    return lambda: WCS(image.header)
+
+@benchmark('wcs.coordinates', stars=STARS[:1])
+def wcs_coordinates(size, stars):
+    from astrophys.fitsimage import FITSImage
+    image = FITSImage(field(size, stars)[0])
+    return lambda: image.coords[:, :]
+
+@benchmark('wcs.stars')
+def wcs_stars(size, stars):
+    from astrophys.fitsimage import FITSImage
+    filepath, centers = field(size, stars)
+    image = FITSImage(filepath)
+    y, x = np.round(centers).astype(int).T
+    return lambda: image.coords[y, x]
+
+### STATISTICS
+@benchmark('statistics.astrophys', stars=STARS[:1])
+def statistics_astrophys(size, stars):
+    from astrophys.fitsimage import FITSImage
+    image = FITSImage(field(size, stars)[0])
+
+    def run():
+        image.invalidate_statistics()
+        return image.median, image.std
+    return run
+
+@benchmark('statistics.astropyaddons', stars=STARS[:1])
+def statistics_astropyaddons(size, stars):
+    from astropyaddons.images.fitsimage import FITSImage
+    grid = FITSImage(field(size, stars)[0]).grid
+
+    def run():
+        grid.invalidate()
+        return grid.median, grid.std
+    return run
+
+### DETECTION
+@benchmark('detection.astrophys')
+def detection_astrophys(size, stars):
+    from astrophys.fitsimage import FITSImage
+    image = FITSImage(field(size, stars)[0])
+
+    def run():
+        image.invalidate_statistics()
+        return image.get_star_coords()
+    return run
+
+@benchmark('detection.astropyaddons')
+def detection_astropyaddons(size, stars):
+    from astropyaddons.detection import detect_stars
+    from astropyaddons.images.fitsimage import FITSImage
+    grid = FITSImage(field(size, stars)[0]).grid
+
+    def run():
+        grid.invalidate()
+        return detect_stars(grid, 2.5, grid.median)
+    return run
+
+### REGIONS AND PHOTOMETRY
+@benchmark('regions.astrophys')
+def regions_astrophys(size, stars):
+    from astrophys.fitsimage import FITSImage
+    from astrophys.region import AnnulusRegion, CircleRegion
+    filepath, centers = field(size, stars)
+    image = FITSImage(filepath)
+    return lambda: [(CircleRegion(image, center, APERTURE), AnnulusRegion(image, center, R1, R2)) for center in centers]
+
+@benchmark('photometry.star')
+def photometry_star(size, stars):
+    from astrophys.fitsimage import FITSImage
+    from astrophys.star import Star
+    filepath, centers = field(size, stars)
+    image = FITSImage(filepath)
+    return lambda: [Star(image, center, APERTURE, R1, R2) for center in centers[:STAR_LIMIT]]
+
+@benchmark('photometry.batch')
+def photometry_batch(size, stars):
+    from astrophys.fitsimage import FITSImage
+    from astrophys.photometry import photometry
+    filepath, centers = field(size, stars)
+    image = FITSImage(filepath)
+    return lambda: photometry(image, centers, APERTURE, R1, R2)
@@ -0,0 +1 @@
+""" Makes `astrophys` and `astropyaddons` importable from the root of the repository when running `pytest`. """